@@ -0,0 +1,344 @@
+# Archive-aware scanning for the Intelligent Defence System
+# Streams the members of zip, tar, gzip, bzip2 and xz files (and archives nested inside them) through the
+# same single-pass digest and pattern scan as ordinary files, without extracting them to disk
+# Nested tar, gzip, bzip2 and xz archives are opened on the member stream as it is hashed; only nested zips,
+# whose directory sits at the end and must be seeked to, are spooled (see SPOOL_MEMORY)
+# Depth, decompressed-byte, member-count and compression-ratio limits defuse zip bombs
+# Run "python archive_scan.py ARCHIVE..." to list the members and their SHA-256 digests
+# Developed for monitoring and threat response for the Indian Armed Forces
+
+import os  # Archive sizes and member names
+import sys  # Command-line exit status
+import bz2  # bzip2 decompression
+import gzip  # gzip decompression
+import lzma  # xz decompression
+import zlib  # Raised by corrupt deflate streams
+import json  # Command-line output
+import struct  # Raised by corrupt zip headers
+import tarfile  # Streaming tar reader
+import zipfile  # Zip reader
+import argparse  # Command-line options
+import tempfile  # Spools nested zip archives, which cannot be read front to back
+from collections import namedtuple  # Limits and report records
+from multiscan import ContentScan  # Single-pass digests and pattern matching over member data
+
+# Limits applied to one top-level archive
+#   max_depth: archive nesting levels opened (1 scans the members of the file itself but no nested archive);
+#              deeper archives are still hashed as members, and the report notes the limit
+#   max_bytes: decompressed bytes read across every member, nested ones included
+#   max_members: members scanned across every level
+#   max_ratio: decompressed bytes per compressed byte allowed for each archive once past RATIO_FLOOR
+ArchiveLimits = namedtuple('ArchiveLimits', ['max_depth', 'max_bytes', 'max_members', 'max_ratio'])
+
+DEFAULT_ARCHIVE_LIMITS = ArchiveLimits(max_depth=3, max_bytes=1 << 30, max_members=10000, max_ratio=100)
+
+# Decompressed bytes an archive may produce before its compression ratio is checked,
+# so small, highly compressible archives (text, padding) are not mistaken for bombs
+RATIO_FLOOR = 1 << 20
+
+# Size of the reads from member streams; memory use does not depend on member size
+CHUNK_SIZE = 256 * 1024
+
+# Nested zip archives are spooled in memory up to this size, then to a temporary file
+SPOOL_MEMORY = 8 << 20
+
+# File extensions always checked for archive content; other files are checked when their magic bytes match
+ARCHIVE_EXTENSIONS = ('.zip', '.jar', '.apk', '.tar', '.tgz', '.gz', '.tbz', '.tbz2', '.bz2', '.txz', '.xz')
+
+# Separator between an archive and a member in reported paths, e.g. bundle.zip!bin/tool.exe
+MEMBER_SEPARATOR = '!'
+
+# Outcome of scanning the members of one archive
+#   members / bytes: members scanned and decompressed bytes read
+#   detections: (member path, reason, sha256 digest) for every member the detect callback flagged
+#   limit: first limit reached ('nesting depth', 'decompressed size', 'member count', 'compression ratio'),
+#          or None; every limit but the nesting depth stops the scan
+#   errors: members or nested archives skipped because they were corrupt or encrypted
+ArchiveReport = namedtuple('ArchiveReport', ['members', 'bytes', 'detections', 'limit', 'errors'])
+
+# Exceptions raised by the readers on corrupt or truncated input
+CORRUPT_ERRORS = (zipfile.BadZipFile, zipfile.LargeZipFile, tarfile.TarError, EOFError, lzma.LZMAError,
+                  zlib.error, struct.error, NotImplementedError, RuntimeError, ValueError, OSError)
+
+
+# Raised inside a scan when one of the limits is reached
+class ArchiveLimitExceeded(Exception):
+    pass
+
+
+# Carries a read error of one member stream out through the nested archive reading it, so the error is counted
+# against the archive holding that member rather than the nested one
+class _MemberReadError(Exception):
+    def __init__(self, reader, error):
+        super().__init__(error)
+        self.reader = reader
+        self.error = error
+
+
+# Archive format of a file from its first bytes: 'zip', 'tar', 'gzip', 'bzip2', 'xz', or None
+def sniff_format(head):
+    if head[:4] in (b'PK\x03\x04', b'PK\x05\x06'):
+        return 'zip'
+    if head[:2] == b'\x1f\x8b':
+        return 'gzip'
+    if head[:3] == b'BZh':
+        return 'bzip2'
+    if head[:6] == b'\xfd7zXZ\x00':
+        return 'xz'
+    if head[257:262] == b'ustar':
+        return 'tar'
+    return None
+
+
+# True if a file name has one of the archive extensions
+def is_archive_name(file_path):
+    return file_path.lower().endswith(ARCHIVE_EXTENSIONS)
+
+
+# True if a file is an archive by its name or by its magic bytes, so a renamed archive is still opened
+# `head` is the start of the file when it was already read (see multiscan.SNIFF_BYTES); otherwise it is read here
+def is_archive(file_path, head=None):
+    if is_archive_name(file_path):
+        return True
+    if head is None:
+        try:
+            with open(file_path, 'rb') as f:
+                head = f.read(512)
+        except OSError:
+            return False
+    return sniff_format(head) is not None
+
+
+# Decompressing reader over a gzip, bzip2 or xz stream
+def _decompressor(fileobj, fmt):
+    if fmt == 'gzip':
+        return gzip.GzipFile(fileobj=fileobj, mode='rb')
+    if fmt == 'bzip2':
+        return bz2.BZ2File(fileobj, 'rb')
+    return lzma.LZMAFile(fileobj, 'rb')
+
+
+# Read-only stream that returns `head`, bytes already read from `stream`, before the rest of `stream`
+class _Prefixed:
+    def __init__(self, head, stream):
+        self._head = head
+        self._stream = stream
+
+    def read(self, size=-1):
+        head = self._head
+        if not head:
+            return self._stream.read(size)
+        if 0 <= size < len(head):
+            self._head = head[size:]
+            return head[:size]
+        self._head = b''
+        return head + self._stream.read(-1 if size < 0 else size - len(head))
+
+
+# Member stream that hashes, pattern-matches and counts every byte as it is read, whoever reads it: the member
+# scan itself or the reader of a nested archive opened on it
+#   ratio: [produced, compressed size] of the archive the member belongs to
+#   nested: [produced, compressed bytes read so far] of a nested archive streamed from the member, or None
+#   spool: file the bytes are copied to, or None
+class _MemberReader(_Prefixed):
+    def __init__(self, archive_scan, head, stream, content, ratio):
+        super().__init__(head, stream)
+        self._archive_scan = archive_scan
+        self._content = content
+        self._ratio = ratio
+        self.nested = None
+        self.spool = None
+
+    def read(self, size=-1):
+        try:
+            data = super().read(size)
+        except CORRUPT_ERRORS as e:
+            raise _MemberReadError(self, e)
+        if data:
+            archive_scan, limits, ratio = self._archive_scan, self._archive_scan.limits, self._ratio
+            archive_scan.bytes += len(data)
+            ratio[0] += len(data)
+            if archive_scan.bytes > limits.max_bytes:
+                raise ArchiveLimitExceeded('decompressed size')
+            if ratio[0] > RATIO_FLOOR and ratio[0] > limits.max_ratio * max(ratio[1], 1):
+                raise ArchiveLimitExceeded('compression ratio')
+            self._content.feed(data)
+            if self.nested is not None:
+                self.nested[1] += len(data)
+            if self.spool is not None:
+                self.spool.write(data)
+        return data
+
+    # Read whatever is left of the member
+    def drain(self):
+        while self.read(CHUNK_SIZE):
+            pass
+
+
+# Name of the single member of a compressed file: the file name without its compression suffix
+def _compressed_member_name(path):
+    name = os.path.basename(path.rsplit(MEMBER_SEPARATOR, 1)[-1])
+    stem, suffix = os.path.splitext(name)
+    return stem if suffix.lower() in ('.gz', '.bz2', '.xz') and stem else name
+
+
+# One archive scan; holds the running totals that the limits are checked against
+class _ArchiveScan:
+    def __init__(self, algorithms, matcher, detect, limits):
+        self.algorithms = algorithms
+        self.matcher = matcher
+        self.detect = detect
+        self.limits = limits
+        self.members = 0
+        self.bytes = 0
+        self.detections = []
+        self.errors = 0
+        self.limit = None
+
+    # Scan the archive in a file object, seekable for zip and read front to back otherwise
+    # `ratio` holds the decompressed bytes it produced and its compressed size; `depth` is its nesting level
+    def container(self, fileobj, fmt, path, ratio, depth):
+        try:
+            if fmt == 'zip':
+                with zipfile.ZipFile(fileobj) as archive:
+                    for info in archive.infolist():
+                        if info.is_dir():
+                            continue
+                        self._count_member()
+                        try:
+                            member = archive.open(info)
+                        except CORRUPT_ERRORS:
+                            # Encrypted or unsupported compression method
+                            self.errors += 1
+                            continue
+                        try:
+                            with member:
+                                self.member(member, f'{path}{MEMBER_SEPARATOR}{info.filename}', depth, ratio)
+                        except CORRUPT_ERRORS:
+                            # Bad CRC or truncated data; the other members can still be read
+                            self.errors += 1
+                return
+            if fmt in ('gzip', 'bzip2', 'xz'):
+                # A compressed tar is read as a tar; anything else is one compressed member
+                with _decompressor(fileobj, fmt) as stream:
+                    head = stream.read(512)
+                    if sniff_format(head) == 'tar':
+                        self._tar(_Prefixed(head, stream), path, depth, ratio)
+                    else:
+                        self._count_member()
+                        self.member(_Prefixed(head, stream),
+                                    f'{path}{MEMBER_SEPARATOR}{_compressed_member_name(path)}', depth, ratio)
+                return
+            self._tar(fileobj, path, depth, ratio)
+        except CORRUPT_ERRORS:
+            self.errors += 1
+
+    # Scan the members of an uncompressed tar stream
+    def _tar(self, fileobj, path, depth, ratio):
+        # Stream mode reads the tar front to back, one member at a time
+        with tarfile.open(fileobj=fileobj, mode='r|') as archive:
+            for info in archive:
+                # Forget the headers already seen so memory stays flat on tars with many members
+                archive.members = []
+                if not info.isfile():
+                    continue
+                self._count_member()
+                member = archive.extractfile(info)
+                self.member(member, f'{path}{MEMBER_SEPARATOR}{info.name}', depth, ratio)
+
+    # Count a member against max_members
+    def _count_member(self):
+        self.members += 1
+        if self.members > self.limits.max_members:
+            raise ArchiveLimitExceeded('member count')
+
+    # Scan one member stream, descending into it if it is itself an archive
+    # The member is read once: a nested archive is opened on the stream as it is hashed, except a zip, which is
+    # spooled while it is hashed and opened afterwards
+    # `ratio` is the [produced, compressed size] pair of the archive the member belongs to
+    def member(self, stream, path, depth, ratio):
+        scan = ContentScan(self.algorithms, self.matcher)
+        head = stream.read(CHUNK_SIZE)
+        fmt = sniff_format(head)
+        if fmt is not None and depth >= self.limits.max_depth:
+            self.limit = self.limit or 'nesting depth'
+            fmt = None
+        reader = _MemberReader(self, head, stream, scan, ratio)
+        try:
+            if fmt == 'zip':
+                with tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY) as spool:
+                    reader.spool = spool
+                    reader.drain()
+                    size = self._report(scan, path)
+                    spool.seek(0)
+                    self.container(spool, fmt, path, [0, size], depth + 1)
+                return
+            if fmt is not None:
+                reader.nested = [0, 0]
+                self.container(reader, fmt, path, reader.nested, depth + 1)
+            # Hash whatever the nested archive's reader left unread, such as padding after the end of a tar
+            reader.drain()
+            self._report(scan, path)
+        except _MemberReadError as e:
+            # A read error of this member is the enclosing archive's to count; one from further out passes on
+            if e.reader is not reader:
+                raise
+            raise e.error
+
+    # Record a detection for a fully read member; returns its size
+    def _report(self, scan, path):
+        result = scan.result()
+        reason = self.detect(result)
+        if reason is not None:
+            self.detections.append((path, reason, result.digests.get('sha256')))
+        return result.size
+
+
+# Scan the members of an archive file, nested archives included
+#   algorithms / matcher: digests and byte patterns computed for every member, as for files on disk
+#   detect: callable taking a member's ScanResult and returning a reason string, or None if it is clean
+# Returns an ArchiveReport, or None if the file is not an archive in a supported format
+def scan_archive(file_path, algorithms=('sha256',), matcher=None, detect=None, limits=DEFAULT_ARCHIVE_LIMITS):
+    detect = detect or (lambda result: None)
+    try:
+        with open(file_path, 'rb') as f:
+            fmt = sniff_format(f.read(512))
+            if fmt is None:
+                return None
+            f.seek(0)
+            scan = _ArchiveScan(algorithms, matcher, detect, limits)
+            try:
+                scan.container(f, fmt, file_path, [0, os.fstat(f.fileno()).st_size], 1)
+            except ArchiveLimitExceeded as e:
+                scan.limit = str(e)
+    except OSError:
+        return None
+    return ArchiveReport(scan.members, scan.bytes, scan.detections, scan.limit, scan.errors)
+
+
+# Command-line entry point: print one JSON object per archive with the digest of every member
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='List and hash archive members without extracting them')
+    parser.add_argument('archives', nargs='+', metavar='ARCHIVE')
+    parser.add_argument('--max-depth', type=int, default=DEFAULT_ARCHIVE_LIMITS.max_depth)
+    parser.add_argument('--max-bytes', type=int, default=DEFAULT_ARCHIVE_LIMITS.max_bytes)
+    parser.add_argument('--max-members', type=int, default=DEFAULT_ARCHIVE_LIMITS.max_members)
+    parser.add_argument('--max-ratio', type=float, default=DEFAULT_ARCHIVE_LIMITS.max_ratio)
+    args = parser.parse_args(argv)
+    limits = ArchiveLimits(args.max_depth, args.max_bytes, args.max_members, args.max_ratio)
+    status = 0
+    for path in args.archives:
+        # Report every member by flagging each one with its digest
+        report = scan_archive(path, detect=lambda result: result.digests['sha256'].hex(), limits=limits)
+        if report is None:
+            print(json.dumps({'archive': path, 'error': 'not a supported archive'}))
+            status = 1
+            continue
+        print(json.dumps({'archive': path, 'members': [{'path': member, 'sha256': reason}
+                                                       for member, reason, _ in report.detections],
+                          'bytes': report.bytes, 'limit': report.limit, 'errors': report.errors}))
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,421 @@
+# Reproducible benchmark suite for the Intelligent Defence System
+# Generates synthetic file trees with planted malware, then measures the scanner, the process monitor
+# and the network sentinel: throughput, p50/p99 per-item latency and peak RSS for every benchmark
+# Each benchmark runs in a child process of its own, so its peak RSS is not inflated by the ones before it
+# Results are written as JSON; a stored baseline turns regressions beyond a threshold into a failing exit code
+# A baseline taken with a different tree, CPU count or load is refused (exit code 2) rather than compared
+#   python benchmark_suite.py --files 5000 --save-baseline bench_baseline.json
+#   python benchmark_suite.py --files 5000 --baseline bench_baseline.json --threshold 0.15
+# Developed for monitoring and threat response for the Indian Armed Forces
+
+import os  # Tree layout, CPU count and process ids
+import sys  # Interpreter used for the benchmark child processes, exit status
+import json  # Results and baselines
+import time  # Timing
+import random  # Seeded generator, so the same options always produce the same tree
+import shutil  # Removes generated trees
+import asyncio  # Loopback load generator of the network benchmark
+import hashlib  # Digests of the planted malware
+import platform  # Machine description stored with each run
+import argparse  # Command-line options
+import tempfile  # Scratch directory for trees and signature stores
+import subprocess  # One child process per benchmark, and idle children seen by the process monitor
+from collections import namedtuple  # Tree specification record
+from hash_io import parse_size  # Size strings such as 64K or 16M
+import events  # Silent event pipeline for the scanners under test
+from signature_store import compile_signatures  # Signature store holding the planted malware
+
+try:
+    import resource  # Peak RSS (Unix only)
+except ImportError:
+    resource = None
+
+# Shape of a synthetic tree
+#   files: number of files; sizes: [(size in bytes, weight)]; depth / fanout: directory levels and
+#   subdirectories per level; malware: files whose digest is planted in the signature store;
+#   suspicious: files given a suspicious extension; seed: random seed for sizes, contents and layout
+TreeSpec = namedtuple('TreeSpec', ['files', 'sizes', 'depth', 'fanout', 'malware', 'suspicious', 'seed'])
+
+# Default size distribution: mostly small files with a long tail, like a typical home directory
+DEFAULT_SIZES = '1K:50,16K:30,256K:15,4M:5'
+
+# Benchmarks run by default, in order
+BENCHMARKS = ('calculate_hash', 'scan_file', 'scan_directory', 'scan_directory_parallel', 'scan_directory_warm',
+              'monitor_processes', 'network')
+
+# Metrics where a larger value is better; every other compared metric is better when smaller
+HIGHER_IS_BETTER = ('items_per_second', 'mb_per_second')
+
+# Metrics compared against a baseline
+COMPARED_METRICS = ('items_per_second', 'mb_per_second', 'p50_ms', 'p99_ms', 'peak_rss_mb')
+
+
+# Parse a size distribution such as '1K:50,16K:30,4M:5' into [(size, weight)]
+def parse_distribution(text):
+    sizes = []
+    for part in text.split(','):
+        if not part.strip():
+            continue
+        size, _, weight = part.partition(':')
+        sizes.append((parse_size(size), float(weight or 1)))
+    return sizes
+
+
+# Value at `percentile` (0-100) of a list of numbers
+def percentile(values, percent):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+# Peak resident set size of this process so far, in MB (None where it cannot be measured)
+# On Linux this is VmHWM of the current address space: ru_maxrss survives exec, so a benchmark child
+# would otherwise report the peak of the process that started it
+def peak_rss_mb():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1 << 20) if sys.platform == 'darwin' else peak / 1024, 1)
+
+
+# Write a synthetic tree under `root`; returns (list of (path, size), digests of the planted malware)
+def generate_tree(root, spec):
+    rng = random.Random(spec.seed)
+    directories = [root]
+    frontier = [root]
+    for level in range(spec.depth):
+        next_frontier = []
+        for parent in frontier:
+            for i in range(spec.fanout):
+                path = os.path.join(parent, f'd{level}_{i}')
+                os.makedirs(path, exist_ok=True)
+                next_frontier.append(path)
+        directories.extend(next_frontier)
+        frontier = next_frontier
+    sizes = [size for size, _ in spec.sizes]
+    weights = [weight for _, weight in spec.sizes]
+    picked = set(rng.sample(range(spec.files), min(spec.files, spec.malware + spec.suspicious)))
+    malware_files = set(sorted(picked)[:spec.malware])
+    files, planted = [], set()
+    for i in range(spec.files):
+        size = rng.choices(sizes, weights)[0]
+        suffix = '.exe' if i in picked and i not in malware_files else '.dat'
+        path = os.path.join(rng.choice(directories), f'f{i}{suffix}')
+        data = rng.randbytes(size)
+        with open(path, 'wb') as f:
+            f.write(data)
+        if i in malware_files:
+            planted.add(hashlib.sha256(data).hexdigest())
+        files.append((path, size))
+    return files, planted
+
+
+# Result record of one benchmark
+def result(items, seconds, total_bytes=0, latencies=(), **extra):
+    latencies = list(latencies)
+    record = {
+        'items': items,
+        'seconds': round(seconds, 6),
+        'items_per_second': round(items / seconds, 1) if seconds else 0.0,
+        'mb_per_second': round(total_bytes / 1e6 / seconds, 2) if seconds else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 4) if latencies else None,
+        'p99_ms': round(percentile(latencies, 99) * 1000, 4) if latencies else None,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+    record.update(extra)
+    return record
+
+
+# Benchmark runner over one generated tree
+#   jobs: hashing workers of the parallel directory benchmark
+#   processes: idle child processes present during the process-monitor benchmark
+#   connections / concurrency: loopback load of the network benchmark
+class BenchmarkSuite:
+    def __init__(self, spec, workdir, jobs=os.cpu_count() or 1, processes=20, connections=2000,
+                 concurrency=200):
+        self.spec = spec
+        self.workdir = workdir
+        self.tree = os.path.join(workdir, 'tree')
+        self.jobs = jobs
+        self.processes = processes
+        self.connections = connections
+        self.concurrency = concurrency
+        self.files = []
+        self.planted = set()
+        self.signature_path = os.path.join(workdir, 'signatures.sig')
+        self.manifest_path = os.path.join(workdir, 'tree.json')
+
+    # Generate the tree, a signature store holding the planted digests and the manifest read by load()
+    def prepare(self):
+        os.makedirs(self.tree, exist_ok=True)
+        self.files, self.planted = generate_tree(self.tree, self.spec)
+        feed = os.path.join(self.workdir, 'feed.txt')
+        with open(feed, 'w') as f:
+            f.write(''.join(digest + '\n' for digest in sorted(self.planted)))
+        compile_signatures([feed], self.signature_path)
+        with open(self.manifest_path, 'w') as f:
+            json.dump({'files': self.files, 'planted': sorted(self.planted)}, f)
+
+    # Pick up a tree generated by prepare(), in a benchmark child process
+    def load(self):
+        with open(self.manifest_path) as f:
+            manifest = json.load(f)
+        self.files = [(path, size) for path, size in manifest['files']]
+        self.planted = set(manifest['planted'])
+
+    # Fresh dry-run defender with an in-memory cache, so runs never delete the planted files
+    def defender(self):
+        from raj9 import SystemDefender
+        return SystemDefender(cache_path=None, signature_path=self.signature_path,
+                              event_pipeline=events.EventPipeline([]), dry_run=True)
+
+    # Wrap defender.inspect_file to collect the time spent on each file (works from worker threads too)
+    @staticmethod
+    def _timed_inspect(defender, latencies):
+        inspect = defender.inspect_file
+
+        def timed(path):
+            start = time.perf_counter()
+            try:
+                return inspect(path)
+            finally:
+                latencies.append(time.perf_counter() - start)
+        defender.inspect_file = timed
+
+    def bench_calculate_hash(self):
+        defender = self.defender()
+        latencies = []
+        start = time.perf_counter()
+        for path, _ in self.files:
+            t = time.perf_counter()
+            defender.calculate_hash(path)
+            latencies.append(time.perf_counter() - t)
+        elapsed = time.perf_counter() - start
+        defender.events.close()
+        return result(len(self.files), elapsed, sum(size for _, size in self.files), latencies)
+
+    def bench_scan_file(self):
+        defender = self.defender()
+        latencies = []
+        detections = 0
+        start = time.perf_counter()
+        for path, _ in self.files:
+            t = time.perf_counter()
+            if defender.scan_file(path) == 'malware':
+                detections += 1
+            latencies.append(time.perf_counter() - t)
+        elapsed = time.perf_counter() - start
+        defender.events.close()
+        return result(len(self.files), elapsed, sum(size for _, size in self.files), latencies,
+                      detections=detections)
+
+    # One scan_directory pass; warm runs a first pass to fill the verdict cache and times the second
+    # Warm passes report no per-file latency: almost every file is answered by the cache without being read
+    def _scan_directory(self, jobs, warm=False):
+        defender = self.defender()
+        latencies = []
+        if warm:
+            defender.scan_directory(self.tree, jobs=jobs)
+        else:
+            self._timed_inspect(defender, latencies)
+        stats = defender.scan_directory(self.tree, jobs=jobs)
+        defender.events.close()
+        return result(stats.files, stats.elapsed, stats.bytes, latencies, jobs=jobs, hashed=stats.hashed,
+                      detections=stats.detections)
+
+    def bench_scan_directory(self):
+        return self._scan_directory(1)
+
+    def bench_scan_directory_parallel(self):
+        return self._scan_directory(self.jobs)
+
+    def bench_scan_directory_warm(self):
+        return self._scan_directory(1, warm=True)
+
+    # First call sees every process as new; later calls only diff the process table
+    def bench_monitor_processes(self):
+        children = [subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(600)'])
+                    for _ in range(self.processes)]
+        try:
+            defender = self.defender()
+            latencies = []
+            start = time.perf_counter()
+            for _ in range(10):
+                t = time.perf_counter()
+                defender.monitor_processes()
+                latencies.append(time.perf_counter() - t)
+            elapsed = time.perf_counter() - start
+            defender.events.close()
+        finally:
+            for child in children:
+                child.kill()
+            for child in children:
+                child.wait()
+        return result(len(latencies), elapsed, 0, latencies, first_call_ms=round(latencies[0] * 1000, 4),
+                      processes=self.processes)
+
+    # Loopback clients against a sentinel on an ephemeral port; latency is accept-to-verdict
+    def bench_network(self):
+        from network_sentinel import NetworkSentinel, generate_load
+        sentinel = NetworkSentinel('127.0.0.1', [0], block_ttl=None)
+        sentinel.start()
+        try:
+            port = sentinel.bound_ports[0]
+            elapsed, errors = asyncio.run(generate_load('127.0.0.1', port, self.connections, self.concurrency,
+                                                        malicious_every=0))
+        finally:
+            sentinel.stop()
+        return result(sentinel.connections, elapsed, 0, sentinel.latencies, client_errors=errors)
+
+    # Run one benchmark in a fresh interpreter over the prepared tree and return its result
+    def run_isolated(self, name):
+        command = [sys.executable, os.path.abspath(__file__), '--run-benchmark', name, '--workdir', self.workdir,
+                   '--jobs', str(self.jobs), '--processes', str(self.processes),
+                   '--connections', str(self.connections), '--concurrency', str(self.concurrency)]
+        child = subprocess.run(command, capture_output=True, text=True)
+        if child.returncode != 0:
+            raise RuntimeError(f'benchmark {name} failed with exit code {child.returncode}: {child.stderr.strip()}')
+        return json.loads(child.stdout.splitlines()[-1])
+
+    # Run the named benchmarks, each in its own child process, and return {name: result}
+    def run(self, names=BENCHMARKS, progress=None):
+        results = {}
+        for name in names:
+            results[name] = self.run_isolated(name)
+            if progress is not None:
+                progress(name, results[name])
+        return results
+
+
+# Metadata that must match between a run and its baseline for the numbers to be comparable
+COMPARABLE_METADATA = ('spec', 'cpu_count', 'jobs', 'processes', 'connections', 'concurrency')
+
+
+# Keys of COMPARABLE_METADATA whose values differ between two run documents
+def metadata_mismatches(document, baseline):
+    # Round-trip through JSON so tuples in a fresh run compare equal to the lists of a stored baseline
+    meta, previous = (json.loads(json.dumps(d.get('meta', {}))) for d in (document, baseline))
+    return [key for key in COMPARABLE_METADATA if meta.get(key) != previous.get(key)]
+
+
+# Compare a run document with a baseline document; returns a list of (benchmark, metric, baseline, current,
+# change) for every metric that got worse by more than `threshold` (a fraction, 0.1 = 10 %)
+# Raises ValueError when the two runs used a different tree, machine size or load, since nothing then compares
+def find_regressions(document, baseline, threshold=0.1):
+    mismatches = metadata_mismatches(document, baseline)
+    if mismatches:
+        raise ValueError(f"baseline is not comparable: different {', '.join(mismatches)}")
+    regressions = []
+    for name, current in document['results'].items():
+        previous = baseline['results'].get(name)
+        if not previous:
+            continue
+        for metric in COMPARED_METRICS:
+            old, new = previous.get(metric), current.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = -change if metric in HIGHER_IS_BETTER else change
+            if worse > threshold:
+                regressions.append((name, metric, old, new, change))
+    return regressions
+
+
+# Description of the machine and options, stored with every run
+def run_metadata(spec, args):
+    return {
+        'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'spec': spec._asdict(),
+        'jobs': args.jobs,
+        'processes': args.processes,
+        'connections': args.connections,
+        'concurrency': args.concurrency,
+    }
+
+
+# Command-line entry point
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the scanner, process monitor and network sentinel')
+    parser.add_argument('--files', type=int, default=2000, help='files in the synthetic tree')
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help='size distribution as SIZE:WEIGHT,...')
+    parser.add_argument('--depth', type=int, default=3, help='directory levels')
+    parser.add_argument('--fanout', type=int, default=4, help='subdirectories per directory')
+    parser.add_argument('--malware', type=int, default=10, help='files planted in the signature store')
+    parser.add_argument('--suspicious', type=int, default=10, help='files given a suspicious extension')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help='workers of the parallel scan')
+    parser.add_argument('--processes', type=int, default=20, help='idle child processes while monitoring')
+    parser.add_argument('--connections', type=int, default=2000, help='loopback connections')
+    parser.add_argument('--concurrency', type=int, default=200, help='connections in flight')
+    parser.add_argument('--only', action='append', choices=BENCHMARKS, help='run only this benchmark (repeatable)')
+    parser.add_argument('--workdir', help='generate the tree here and keep it (default: a temporary directory)')
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    parser.add_argument('--baseline', help='compare with this baseline JSON file')
+    parser.add_argument('--save-baseline', metavar='PATH', help='store this run as the baseline')
+    parser.add_argument('--threshold', type=float, default=0.1, help='regression threshold (0.1 = 10%%)')
+    parser.add_argument('--run-benchmark', choices=BENCHMARKS, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    spec = TreeSpec(args.files, parse_distribution(args.sizes), args.depth, args.fanout, args.malware,
+                    args.suspicious, args.seed)
+    workdir = args.workdir or tempfile.mkdtemp(prefix='defence_bench-')
+    suite = BenchmarkSuite(spec, workdir, args.jobs, args.processes, args.connections, args.concurrency)
+
+    # Benchmark child started by run_isolated(): one benchmark over the prepared tree, result as JSON on stdout
+    if args.run_benchmark:
+        suite.load()
+        print(json.dumps(getattr(suite, f'bench_{args.run_benchmark}')()))
+        return 0
+
+    def report(name, record):
+        def show(value, unit):
+            return f'{value:>9.3f} {unit}' if value is not None else f"{'n/a':>9} {unit}"
+        print(f"{name:<26} {record['items_per_second']:>12,.1f}/s {record['mb_per_second']:>10.1f} MB/s "
+              f"p50 {show(record['p50_ms'], 'ms')}  p99 {show(record['p99_ms'], 'ms')}  "
+              f"rss {show(record['peak_rss_mb'], 'MB')}")
+
+    try:
+        start = time.perf_counter()
+        suite.prepare()
+        print(f"generated {len(suite.files)} files ({sum(size for _, size in suite.files) / 1e6:.1f} MB) "
+              f"in {time.perf_counter() - start:.1f}s under {workdir}")
+        results = suite.run(args.only or BENCHMARKS, report)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    document = {'meta': run_metadata(spec, args), 'results': results}
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, 'w') as f:
+                json.dump(document, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        try:
+            regressions = find_regressions(document, baseline, args.threshold)
+        except ValueError as e:
+            print(f"{args.baseline}: {e}")
+            return 2
+        for name, metric, old, new, change in regressions:
+            print(f"REGRESSION {name}.{metric}: {old} -> {new} ({change:+.1%})")
+        if regressions:
+            return 1
+        print(f"no regressions beyond {args.threshold:.0%} against {args.baseline}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,11 +1,24 @@
 # CLI Application for Intelligent Defence System
 # This app provides an interactive command-line interface to use the SystemDefender class
+# With a subcommand (scan, procs, watch, stats) it runs headless and prints JSON lines for scripts:
+#   python defence_app.py scan /srv /home --jobs 8 --dry-run
 # Developed for monitoring and threat response for the Indian Armed Forces
 
+import os
+import re
 import sys
+import json
 import time
-import logging
-from raj9 import SystemDefender  # Import the SystemDefender class from raj9.py
+import signal
+import argparse
+import threading
+import events  # Shared 'defender' logger and its background log writer
+# raj9 and log_index are imported inside the functions that need them, so --help and small scans start fast
+
+# Exit codes of the headless subcommands (argparse itself exits with 2 on bad arguments)
+EXIT_CLEAN = 0
+EXIT_DETECTED = 1
+EXIT_ERROR = 3
 
 # Function to display the main menu options
 def display_menu():
@@ -15,21 +28,53 @@ def display_menu():
     print("3. View defender log")
     print("4. Exit")
 
-# Function to read and display the defender log file
+# Number of log entries shown per page by view_log
+LOG_PAGE_SIZE = 40
+
+# Function to page through the defender log, newest entries first
+# Uses the sidecar index (log_index.py) so only the lines on screen are read from defender.log
 def view_log():
-    try:
-        with open('defender.log', 'r') as log_file:
-            print("\n--- Defender Log ---")
-            print(log_file.read())
-            print("--- End of Log ---\n")
-    except FileNotFoundError:
+    from log_index import LogIndex, LogQueryError
+    index = LogIndex(events.DEFAULT_LOG_PATH)
+    index.refresh()
+    if not os.path.exists(index.log_path):
         print("Log file not found. No logs available yet.")
+        return
+    page, filters = 0, {}
+    while True:
+        try:
+            entries = index.page(page, LOG_PAGE_SIZE, **filters)
+        except LogQueryError as e:
+            print(f"Invalid filter: {e}")
+            page, filters = 0, {}
+            continue
+        print(f"\n--- Defender Log (page {page + 1}, {len(index)} entries) ---")
+        for entry in entries:
+            print(entry.text)
+        print("--- End of Page ---")
+        command = input("[o]lder, [n]ewer, [l]evel NAME, [s]earch TEXT, [c]lear filters, [q]uit: ").strip()
+        action, _, argument = command.partition(' ')
+        if action == 'o' and len(entries) == LOG_PAGE_SIZE:
+            page += 1
+        elif action == 'n' and page > 0:
+            page -= 1
+        elif action == 'l' and argument:
+            page, filters['levels'] = 0, [argument.upper()]
+        elif action == 's' and argument:
+            page, filters['pattern'] = 0, re.compile(re.escape(argument), re.IGNORECASE)
+        elif action == 'c':
+            page, filters = 0, {}
+        elif action == 'q':
+            break
 
-# Main function to run the CLI app
-def main():
+# Interactive menu, used when no subcommand is given
+def interactive():
+    from raj9 import SystemDefender  # Import the SystemDefender class from raj9.py
+    # Write defender.log from a background listener thread
+    events.configure_logging()
     # Create an instance of the SystemDefender
     defender = SystemDefender()
-    logging.info("Defence App started")
+    events.logger.info("Defence App started")
 
     while True:
         # Display the menu options
@@ -41,17 +86,21 @@ def main():
             print("Starting full system scan...")
             # Scan the 'test' directory as example
             defender.scan_directory('test')
+            # Let queued alerts reach the console before the summary line
+            defender.events.flush()
             print("Scan completed.")
         elif choice == '2':
             print("Monitoring running processes...")
             # Monitor processes once
             defender.monitor_processes()
+            defender.events.flush()
             print("Process monitoring completed.")
         elif choice == '3':
             # Display the defender log
             view_log()
         elif choice == '4':
             print("Exiting the Defence System app. Stay safe!")
+            defender.events.close()
             break
         else:
             print("Invalid choice. Please enter a number between 1 and 4.")
@@ -59,5 +108,245 @@ def main():
         # Small delay before showing menu again
         time.sleep(1)
 
+# Sink counting events by kind, used for the summaries of the headless subcommands
+class CountingSink:
+    def __init__(self):
+        self.counts = {}
+
+    def write_batch(self, batch):
+        for event in batch:
+            self.counts[event.kind] = self.counts.get(event.kind, 0) + 1
+
+    def close(self):
+        pass
+
+
+# Print one JSON line on stdout
+def emit_json(record):
+    sys.stdout.write(json.dumps(record, default=str) + '\n')
+    sys.stdout.flush()
+
+
+# Create a defender whose events go to stdout as JSON lines and to defender.log
+# Rate limiting is off so scripts see every event; returns (defender, counting sink)
+def batch_defender(args, jobs=1):
+    from raj9 import SystemDefender
+    events.configure_logging()
+    counter = CountingSink()
+    pipeline = events.EventPipeline([events.JsonStreamSink(), events.LogSink(), counter], rate_limits=None)
+    cache_path = None if getattr(args, 'no_cache', False) else args.cache
+    options = {'archive_limits': None} if args.no_archives else {}
+    defender = SystemDefender(cache_path=cache_path, jobs=jobs, event_pipeline=pipeline, dry_run=args.dry_run,
+                              **options)
+    return defender, counter
+
+
+# Wall and CPU time (including child processes) since `start`, a (perf_counter, os.times) pair
+def elapsed_times(start):
+    wall = time.perf_counter() - start[0]
+    now = os.times()
+    cpu = sum(now[:4]) - sum(start[1][:4])
+    return wall, cpu
+
+
+# Common fields of every summary line
+def summary(command, args, start, counter, **fields):
+    wall, cpu = elapsed_times(start)
+    return dict({'kind': 'summary', 'command': command, 'dry_run': args.dry_run,
+                 'wall_seconds': round(wall, 6), 'cpu_seconds': round(cpu, 6),
+                 'events': dict(counter.counts)}, **fields)
+
+
+# Scan a directory in risk order, one budgeted cycle after another until the pass completes
+# Prints a 'cycle' line per cycle; returns (totals, seconds from `start` to the first detection or None)
+def prioritized_cycles(defender, path, args, start):
+    from scan_engine import ScanStats
+    total = ScanStats()
+    first_detection = None
+    while True:
+        cycle = defender.prioritized_scan(path, time_budget=args.time_budget, byte_budget=args.byte_budget,
+                                          io_rate=args.io_rate, exclude=args.exclude)
+        emit_json(dict({'kind': 'cycle', 'path': path}, **cycle.as_dict()))
+        total.files += cycle.files
+        total.hashed += cycle.hashed
+        total.bytes += cycle.bytes
+        total.detections += cycle.detections
+        total.suspicious += cycle.suspicious
+        if first_detection is None and cycle.first_detection is not None:
+            first_detection = round(cycle.started - start[0] + cycle.first_detection, 6)
+        if cycle.stopped in ('complete', 'cancelled'):
+            return total, first_detection
+
+
+# scan PATH...: scan files and directory trees once
+# With a time or byte budget (or an I/O rate) directories are scanned riskiest file first in budgeted cycles
+def command_scan(args):
+    from scan_engine import ScanStats
+    start = (time.perf_counter(), os.times())
+    defender, counter = batch_defender(args, args.jobs)
+    prioritized = args.time_budget is not None or args.byte_budget is not None or args.io_rate is not None
+    total = ScanStats()
+    errors = 0
+    first_detection = None
+
+    # Time of the first malware verdict of an ordinary scan, for comparison with the prioritized one
+    def first_seen(verdict):
+        nonlocal first_detection
+        if verdict == 'malware' and first_detection is None:
+            first_detection = round(time.perf_counter() - start[0], 6)
+
+    for path in args.paths:
+        if os.path.isdir(path):
+            if prioritized:
+                stats, first = prioritized_cycles(defender, path, args, start)
+                if first_detection is None:
+                    first_detection = first
+            else:
+                stats = defender.scan_directory(path, jobs=args.jobs, executor=args.executor, exclude=args.exclude,
+                                                progress=lambda _, verdict: first_seen(verdict))
+            total.files += stats.files
+            total.hashed += stats.hashed
+            total.bytes += stats.bytes
+            total.detections += stats.detections
+            total.suspicious += stats.suspicious
+        elif os.path.exists(path):
+            st = os.stat(path)
+            total.files += 1
+            verdict = defender.scan_file(path, st)
+            if verdict is not None:
+                total.add_result(st, verdict)
+        else:
+            errors += 1
+            emit_json({'kind': 'error', 'path': path, 'message': f"No such file or directory: {path}"})
+    defender.events.close()
+    wall, _ = elapsed_times(start)
+    emit_json(summary('scan', args, start, counter, paths=args.paths, files=total.files, hashed=total.hashed,
+                      bytes=total.bytes, detections=total.detections, suspicious=total.suspicious, errors=errors,
+                      first_detection_seconds=first_detection,
+                      files_per_second=round(total.files / wall, 1) if wall else 0.0,
+                      mb_per_second=round(total.bytes / 1e6 / wall, 3) if wall else 0.0))
+    if total.detections:
+        return EXIT_DETECTED
+    return EXIT_ERROR if errors else EXIT_CLEAN
+
+
+# procs: inspect the running processes once
+def command_procs(args):
+    start = (time.perf_counter(), os.times())
+    defender, counter = batch_defender(args)
+    offenders = defender.monitor_processes()
+    defender.events.close()
+    emit_json(summary('procs', args, start, counter, offenders=len(offenders)))
+    return EXIT_DETECTED if offenders else EXIT_CLEAN
+
+
+# watch PATH: scan changes in real time until --duration passes or SIGINT/SIGTERM arrives
+def command_watch(args):
+    start = (time.perf_counter(), os.times())
+    defender, counter = batch_defender(args)
+    stop_event = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: stop_event.set())
+    if args.duration is not None:
+        timer = threading.Timer(args.duration, stop_event.set)
+        timer.daemon = True
+        timer.start()
+    if args.metrics_port is not None:
+        try:
+            server = defender.serve_metrics(args.metrics_port, snapshot_path=None)
+        except OSError as e:
+            emit_json({'kind': 'error', 'message': f"Metrics endpoint unavailable on port {args.metrics_port}: {e}"})
+            defender.events.close()
+            return EXIT_ERROR
+        emit_json({'kind': 'metrics', 'url': f'http://127.0.0.1:{server.port}/metrics'})
+    try:
+        defender.watch(args.path, stop_event=stop_event, baseline=not args.no_baseline)
+    except OSError as e:
+        emit_json({'kind': 'error', 'path': args.path, 'message': f"Cannot watch {args.path}: {e}"})
+        defender.stop_metrics()
+        defender.events.close()
+        return EXIT_ERROR
+    defender.stop_metrics()
+    defender.events.close()
+    emit_json(summary('watch', args, start, counter, path=args.path))
+    return EXIT_DETECTED if counter.counts.get(events.MALWARE_DETECTED) else EXIT_CLEAN
+
+
+# stats: signature, cache and log statistics as one JSON object
+# Only reads: the cache is counted read-only, since opening it as a VerdictCache with another detection
+# fingerprint would empty it
+def command_stats(args):
+    from raj9 import load_signature_databases
+    from scan_cache import count_entries
+    from log_index import LogIndex, LogQueryError
+    record = {'kind': 'stats',
+              'signatures': {name: len(db) for name, db in load_signature_databases().items()},
+              'cache_entries': count_entries(args.cache)}
+    kinds = {}
+    try:
+        for counts in LogIndex(args.log).stats(start=args.since, kinds=None).values():
+            for kind, count in counts.items():
+                kinds[kind] = kinds.get(kind, 0) + count
+    except LogQueryError as e:
+        emit_json({'kind': 'error', 'message': str(e)})
+        return EXIT_ERROR
+    record['log'] = kinds
+    emit_json(record)
+    return EXIT_CLEAN
+
+
+# Size argument such as 64M or 1G (hash_io is only imported once a size is actually given)
+def size_argument(text):
+    from hash_io import parse_size
+    try:
+        return parse_size(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'invalid size: {text!r}')
+
+
+# Command-line parser for the headless subcommands
+def build_parser():
+    parser = argparse.ArgumentParser(description='Intelligent Defence System (interactive menu without a command)')
+    sub = parser.add_subparsers(dest='command')
+    parent = argparse.ArgumentParser(add_help=False)
+    parent.add_argument('--dry-run', action='store_true', help='report detections without deleting or killing')
+    parent.add_argument('--cache', default='defender_cache.db', help='verdict cache path (default: %(default)s)')
+    parent.add_argument('--no-archives', action='store_true', help='do not scan inside zip/tar/gzip/bzip2/xz files')
+    scan = sub.add_parser('scan', parents=[parent], help='scan files and directories once')
+    scan.add_argument('paths', nargs='+', metavar='PATH')
+    scan.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help='hashing workers')
+    scan.add_argument('--executor', choices=('thread', 'process'), default='thread')
+    scan.add_argument('--exclude', action='append', help='glob of paths to skip (repeatable)')
+    scan.add_argument('--no-cache', action='store_true', help='ignore and do not update the verdict cache')
+    scan.add_argument('--time-budget', type=float, metavar='SECONDS',
+                      help='scan directories riskiest file first, in cycles of at most this many seconds')
+    scan.add_argument('--byte-budget', type=size_argument, metavar='SIZE', help='bytes read per cycle, e.g. 256M')
+    scan.add_argument('--io-rate', type=size_argument, metavar='SIZE', help='read at most SIZE bytes per second')
+    sub.add_parser('procs', parents=[parent], help='inspect running processes once')
+    watch = sub.add_parser('watch', parents=[parent], help='scan changes in real time (inotify)')
+    watch.add_argument('path', metavar='PATH')
+    watch.add_argument('--duration', type=float, help='stop after this many seconds')
+    watch.add_argument('--no-baseline', action='store_true', help='skip the initial full scan')
+    watch.add_argument('--metrics-port', type=int, metavar='PORT',
+                       help='serve Prometheus metrics and the profiler on this loopback port (0 picks one)')
+    stats = sub.add_parser('stats', help='signature, cache and log statistics')
+    stats.add_argument('--cache', default='defender_cache.db', help='verdict cache path (default: %(default)s)')
+    stats.add_argument('--log', default=events.DEFAULT_LOG_PATH, help='log file (default: %(default)s)')
+    stats.add_argument('--since', help="only count log entries from this time, e.g. '2025-09-02 23:00'")
+    return parser
+
+
+# Subcommand handlers by name
+COMMANDS = {'scan': command_scan, 'procs': command_procs, 'watch': command_watch, 'stats': command_stats}
+
+
+# Main function to run the CLI app
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.command is None:
+        interactive()
+        return EXIT_CLEAN
+    return COMMANDS[args.command](args)
+
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -2,54 +2,344 @@
 # This app provides a graphical user interface to use the SystemDefender class
 # Developed for monitoring and threat response for the Indian Armed Forces
 
+import os
+import re
+import time
+import queue
+import threading
+from collections import deque
 import tkinter as tk
-from tkinter import messagebox, scrolledtext
-import logging
+from tkinter import messagebox, scrolledtext, ttk
+import events  # Shared 'defender' logger and its background log writer
 from raj9 import SystemDefender  # Import the SystemDefender class from raj9.py
+from scan_engine import ScanStats  # Live counters of a running scan
+from log_index import LogIndex  # Sidecar-indexed access to defender.log
 
-# Function to start full system scan
+# Directory scanned by the "Start Full Scan" button
+SCAN_DIRECTORY = 'test'
+
+# Milliseconds between polls of the background job queue
+POLL_INTERVAL = 50
+
+# Longest time one poll may spend draining queued results, in seconds; keeps every redraw well under 50 ms
+POLL_BUDGET = 0.015
+
+# Rows drawn by the results table; only these Treeview items ever exist, whatever the number of results
+TABLE_ROWS = 20
+
+# Results kept by the results table; older ones are dropped so a long scan cannot grow the GUI without bound
+MAX_RESULTS = 200_000
+
+# Results waiting in the job queue; a full queue blocks the scan thread until the GUI catches up
+JOB_QUEUE_SIZE = 10_000
+
+# Seconds a blocked scan thread waits before checking whether the scan was cancelled
+JOB_PUT_POLL = 0.1
+
+
+# Results table that only renders the visible window of rows
+# A Treeview holding a million items is unusable, so a fixed set of items is rewritten as the view scrolls
+class ResultsTable:
+    def __init__(self, parent, rows=TABLE_ROWS, limit=MAX_RESULTS):
+        self.visible = rows
+        self.limit = limit
+        # The newest results, and the subset with a malware or suspicious verdict, at most `limit` of each
+        self.results = deque(maxlen=limit)
+        self.detections = deque(maxlen=limit)
+        # Results and detections added since the last clear(), kept or not
+        self.seen = {'results': 0, 'detections': 0}
+        self.only_detections = False
+        # Index of the first visible row; follow keeps the newest results in view while scanning
+        self.first = 0
+        self.follow = True
+        frame = tk.Frame(parent)
+        frame.pack(fill=tk.BOTH, expand=True, padx=10)
+        self.tree = ttk.Treeview(frame, columns=('verdict', 'path'), show='headings', height=rows)
+        self.tree.heading('verdict', text='Verdict')
+        self.tree.heading('path', text='Path')
+        self.tree.column('verdict', width=90, stretch=False)
+        self.tree.column('path', width=600)
+        for i in range(rows):
+            self.tree.insert('', tk.END, iid=str(i), values=('', ''))
+        self.scrollbar = ttk.Scrollbar(frame, orient=tk.VERTICAL, command=self.scroll)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree.bind('<MouseWheel>', lambda e: self.scroll('scroll', -1 if e.delta > 0 else 1, 'units'))
+        self.tree.bind('<Button-4>', lambda e: self.scroll('scroll', -1, 'units'))
+        self.tree.bind('<Button-5>', lambda e: self.scroll('scroll', 1, 'units'))
+
+    # Rows currently selected by the detections-only switch
+    @property
+    def rows(self):
+        return self.detections if self.only_detections else self.results
+
+    # Drop every result
+    def clear(self):
+        self.results, self.detections = deque(maxlen=self.limit), deque(maxlen=self.limit)
+        self.seen = {'results': 0, 'detections': 0}
+        self.first, self.follow = 0, True
+        self.render()
+
+    # Add (path, verdict) results; the view is redrawn by the next render()
+    # Past `limit` the oldest results fall off, and a view scrolled back in history moves with its rows
+    def extend(self, items):
+        found = [item for item in items if item[1] in ('malware', 'suspicious')]
+        dropped = max(0, len(self.rows) + len(found if self.only_detections else items) - self.limit)
+        self.results.extend(items)
+        self.detections.extend(found)
+        self.seen['results'] += len(items)
+        self.seen['detections'] += len(found)
+        self.first = max(0, self.first - dropped)
+
+    # Switch between all results and detections only
+    def set_only_detections(self, only):
+        self.only_detections = only
+        self.first, self.follow = 0, True
+        self.render()
+
+    # Scrollbar and mouse-wheel commands: ('moveto', fraction) or ('scroll', count, 'units'|'pages')
+    def scroll(self, action, amount, unit=None):
+        total = len(self.rows)
+        if action == 'moveto':
+            self.first = int(float(amount) * total)
+        else:
+            step = self.visible if unit == 'pages' else 1
+            self.first += int(amount) * step
+        self.first = max(0, min(self.first, total - self.visible))
+        self.follow = self.first + self.visible >= total
+        self.render()
+
+    # Rewrite the visible items from the current window of rows
+    def render(self):
+        rows = self.rows
+        total = len(rows)
+        if self.follow:
+            self.first = max(0, total - self.visible)
+        for i in range(self.visible):
+            n = self.first + i
+            path, verdict = rows[n] if n < total else ('', '')
+            self.tree.item(str(i), values=(verdict or '', path))
+        dropped = self.seen['detections' if self.only_detections else 'results'] - total
+        self.tree.heading('path', text=f'Path (oldest {dropped:,} not kept)' if dropped else 'Path')
+        if total:
+            self.scrollbar.set(self.first / total, min(1.0, (self.first + self.visible) / total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+
+# Run `work` on a background thread; its outcome comes back through the job queue as ('done', title, text)
+# Only one job runs at a time, so the defender is never used by two GUI jobs at once
+def run_in_background(title, work, describe, cancellable=False):
+    for button in (scan_button, monitor_button):
+        button.config(state=tk.DISABLED)
+    cancel_button.config(state=tk.NORMAL if cancellable else tk.DISABLED)
+    cancel_event.clear()
+
+    def body():
+        try:
+            result = work()
+            # Make sure the detections are in defender.log before the user opens it
+            defender.events.flush()
+            jobs.put(('done', title, describe(result)))
+        except Exception as e:
+            jobs.put(('done', title, f"Failed: {e}"))
+
+    threading.Thread(target=body, name='gui-job', daemon=True).start()
+
+# Hand one scan result to the GUI, blocking while the job queue is full
+# A cancelled scan stops waiting and drops the result, so Cancel and Exit never hang behind a full queue
+def put_result(path, verdict):
+    while not cancel_event.is_set():
+        try:
+            jobs.put(('result', path, verdict), timeout=JOB_PUT_POLL)
+            return
+        except queue.Full:
+            continue
+
+# Function to start full system scan on a background thread with live progress
 def start_scan():
-    defender.scan_directory('test')
-    messagebox.showinfo("Scan Complete", "Full system scan completed.")
+    stats = ScanStats()
+    state['stats'] = stats
+    table.clear()
+    status_label.config(text=f"Scanning {SCAN_DIRECTORY}...")
 
-# Function to monitor processes
+    def describe(stats):
+        if stats.cancelled:
+            return f"Scan cancelled after {stats.files} files."
+        return (f"Full system scan completed: {stats.files} files, {stats.detections} detections, "
+                f"{stats.suspicious} suspicious in {stats.elapsed:.1f}s.")
+
+    # Results are handed over through the queue; the scan thread never touches a widget
+    run_in_background("Scan", lambda: defender.scan_directory(
+        SCAN_DIRECTORY, progress=put_result,
+        cancel=cancel_event, stats=stats), describe, cancellable=True)
+
+# Function to monitor processes on a background thread
 def monitor_processes():
-    defender.monitor_processes()
-    messagebox.showinfo("Monitoring Complete", "Process monitoring completed.")
+    state['stats'] = None
+    status_label.config(text="Monitoring processes...")
+    run_in_background("Monitoring", defender.monitor_processes,
+                      lambda offenders: f"Process monitoring completed: {len(offenders)} offending processes.")
+
+# Function to cancel the running scan; it stops at the next file
+def cancel_job():
+    cancel_event.set()
+    cancel_button.config(state=tk.DISABLED)
+    status_label.config(text="Cancelling...")
+
+# Refresh the progress panel from the live ScanStats of the running scan
+def update_progress():
+    stats = state['stats']
+    if stats is None:
+        return
+    elapsed = stats.elapsed or time.perf_counter() - stats.started
+    rate = stats.files / elapsed if elapsed else 0.0
+    throughput = stats.bytes / 1e6 / elapsed if elapsed else 0.0
+    progress_label.config(text=f"Files: {stats.files}   Scanned: {stats.hashed}   {rate:,.0f} files/s   "
+                               f"{throughput:,.1f} MB/s   Detections: {stats.detections}   "
+                               f"Suspicious: {stats.suspicious}")
+
+# Poll the job queue from the Tk main loop
+# Drains results for at most POLL_BUDGET seconds, redraws the visible rows once, then reschedules itself
+def poll_jobs():
+    deadline = time.perf_counter() + POLL_BUDGET
+    batch = []
+    try:
+        while time.perf_counter() < deadline:
+            item = jobs.get_nowait()
+            if item[0] == 'result':
+                batch.append(item[1:])
+            else:
+                _, title, text = item
+                status_label.config(text=text)
+                events.logger.info(f"{title} finished from GUI: {text}")
+                for button in (scan_button, monitor_button):
+                    button.config(state=tk.NORMAL)
+                cancel_button.config(state=tk.DISABLED)
+    except queue.Empty:
+        pass
+    if batch:
+        table.extend(batch)
+    table.render()
+    update_progress()
+    root.after(POLL_INTERVAL, poll_jobs)
+
+# Function to close the app, stopping a running scan first
+def exit_app():
+    cancel_event.set()
+    root.quit()
+
+# Number of log entries shown per page in the log window
+LOG_PAGE_SIZE = 200
 
 # Function to view defender log
+# Shows one page at a time through the sidecar index (log_index.py), so large logs never load whole
 def view_log():
-    try:
-        with open('defender.log', 'r') as log_file:
-            log_content = log_file.read()
-        log_window = tk.Toplevel(root)
-        log_window.title("Defender Log")
-        log_text = scrolledtext.ScrolledText(log_window, width=80, height=20)
-        log_text.insert(tk.END, log_content)
-        log_text.pack()
-    except FileNotFoundError:
+    index = LogIndex(events.DEFAULT_LOG_PATH)
+    index.refresh()
+    if not os.path.exists(index.log_path):
         messagebox.showerror("Error", "Log file not found.")
+        return
+    log_window = tk.Toplevel(root)
+    log_window.title("Defender Log")
+    state = {'page': 0}
+    level = tk.StringVar(value='ALL')
+    search = tk.StringVar()
+
+    controls = tk.Frame(log_window)
+    controls.pack(fill=tk.X)
+    tk.OptionMenu(controls, level, 'ALL', 'INFO', 'WARNING', 'ERROR').pack(side=tk.LEFT)
+    tk.Entry(controls, textvariable=search, width=30).pack(side=tk.LEFT, padx=5)
+    status = tk.Label(controls)
+    log_text = scrolledtext.ScrolledText(log_window, width=100, height=30)
+
+    # Render the current page with the chosen level and search text
+    def show():
+        filters = {}
+        if level.get() != 'ALL':
+            filters['levels'] = [level.get()]
+        if search.get():
+            filters['pattern'] = re.compile(re.escape(search.get()), re.IGNORECASE)
+        entries = index.page(state['page'], LOG_PAGE_SIZE, **filters)
+        log_text.delete('1.0', tk.END)
+        log_text.insert(tk.END, '\n'.join(entry.text for entry in entries))
+        log_text.see(tk.END)
+        status.config(text=f"Page {state['page'] + 1} - {len(index)} entries")
+        return entries
+
+    # Move between pages; page 0 is the newest
+    def turn(step):
+        state['page'] = max(0, state['page'] + step)
+        if not show() and step > 0:
+            state['page'] -= step
+            show()
+
+    # Apply new filters from the first page
+    def apply(*_):
+        state['page'] = 0
+        show()
+
+    tk.Button(controls, text="Filter", command=apply).pack(side=tk.LEFT)
+    tk.Button(controls, text="Older", command=lambda: turn(1)).pack(side=tk.LEFT)
+    tk.Button(controls, text="Newer", command=lambda: turn(-1)).pack(side=tk.LEFT)
+    status.pack(side=tk.LEFT, padx=10)
+    log_text.pack(fill=tk.BOTH, expand=True)
+    level.trace_add('write', apply)
+    show()
 
 # Main GUI setup
 root = tk.Tk()
 root.title("Intelligent Defence System")
 
+# Write defender.log from a background listener thread
+events.configure_logging()
 # Create an instance of the SystemDefender
 defender = SystemDefender()
-logging.info("Defence GUI App started")
+events.logger.info("Defence GUI App started")
+
+# Queue carrying results and job completions from background threads to the Tk main loop
+# Bounded, so a scan producing results faster than the GUI draws them is slowed down instead of filling memory
+jobs = queue.Queue(maxsize=JOB_QUEUE_SIZE)
+# Set to stop the running scan
+cancel_event = threading.Event()
+# ScanStats of the running scan, read by the progress panel
+state = {'stats': None}
 
 # Create buttons for actions
-scan_button = tk.Button(root, text="Start Full Scan", command=start_scan)
-scan_button.pack(pady=10)
+buttons = tk.Frame(root)
+buttons.pack(pady=10)
+
+scan_button = tk.Button(buttons, text="Start Full Scan", command=start_scan)
+scan_button.pack(side=tk.LEFT, padx=5)
+
+cancel_button = tk.Button(buttons, text="Cancel", command=cancel_job, state=tk.DISABLED)
+cancel_button.pack(side=tk.LEFT, padx=5)
+
+monitor_button = tk.Button(buttons, text="Monitor Processes", command=monitor_processes)
+monitor_button.pack(side=tk.LEFT, padx=5)
+
+log_button = tk.Button(buttons, text="View Log", command=view_log)
+log_button.pack(side=tk.LEFT, padx=5)
+
+exit_button = tk.Button(buttons, text="Exit", command=exit_app)
+exit_button.pack(side=tk.LEFT, padx=5)
 
-monitor_button = tk.Button(root, text="Monitor Processes", command=monitor_processes)
-monitor_button.pack(pady=10)
+# Progress panel: live rates and detection counts of the running scan
+progress_label = tk.Label(root, text="Files: 0", anchor=tk.W)
+progress_label.pack(fill=tk.X, padx=10)
+status_label = tk.Label(root, text="Idle", anchor=tk.W)
+status_label.pack(fill=tk.X, padx=10)
 
-log_button = tk.Button(root, text="View Log", command=view_log)
-log_button.pack(pady=10)
+# Switch between every scanned file and detections only
+only_detections = tk.BooleanVar(value=False)
+tk.Checkbutton(root, text="Show detections only", variable=only_detections,
+               command=lambda: table.set_only_detections(only_detections.get())).pack(anchor=tk.W, padx=10)
 
-exit_button = tk.Button(root, text="Exit", command=root.quit)
-exit_button.pack(pady=10)
+# Incremental results table
+table = ResultsTable(root)
 
-# Start the GUI event loop
+# Start polling the job queue, then the GUI event loop
+root.after(POLL_INTERVAL, poll_jobs)
 root.mainloop()
+# Write out every queued alert before exiting
+defender.events.close()
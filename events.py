@@ -0,0 +1,399 @@
+# Detection event pipeline for the Intelligent Defence System
+# Scanners emit typed event records into a queue without blocking; a background thread batches them
+# out to the console, to defender.log (through a QueueHandler/QueueListener) and to a JSON-lines file
+# Developed for monitoring and threat response for the Indian Armed Forces
+
+import os  # Log rotation and file sizes
+import sys  # Console output
+import json  # JSON-lines sink
+import time  # Event timestamps, rate limiting and emit timing
+import queue  # Bounded hand-off between scanner threads and the writer thread
+import atexit  # Drains pending events when the interpreter exits
+import logging  # Standard log records for defender.log
+import logging.handlers  # QueueHandler, QueueListener and RotatingFileHandler
+import threading  # Writer thread and counters lock
+import weakref  # Open pipelines closed at exit without being kept alive by the exit hook
+from collections import namedtuple  # Event record type
+
+# Name of the logger every module of the defence system writes to
+LOGGER_NAME = 'defender'
+
+# Shared logger; a NullHandler keeps library use silent until configure_logging() is called
+logger = logging.getLogger(LOGGER_NAME)
+logger.addHandler(logging.NullHandler())
+
+# Default log locations and rotation sizes
+DEFAULT_LOG_PATH = 'defender.log'
+DEFAULT_EVENTS_PATH = 'defender_events.jsonl'
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024
+DEFAULT_BACKUPS = 5
+
+# Same line format defender.log has always used
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+# Event kinds emitted by the scanners and monitors
+MALWARE_DETECTED = 'malware_detected'
+SUSPICIOUS_FILE = 'suspicious_file'
+FILE_DELETED = 'file_deleted'
+DELETE_FAILED = 'delete_failed'
+SUSPICIOUS_PROCESS = 'suspicious_process'
+PROCESS_TERMINATED = 'process_terminated'
+PROCESS_KILLED = 'process_killed'
+PROCESS_GONE = 'process_gone'
+TERMINATE_FAILED = 'terminate_failed'
+CONNECTION_BLOCKED = 'connection_blocked'
+SUSPICIOUS_CONNECTION = 'suspicious_connection'
+EVENTS_SUPPRESSED = 'events_suppressed'
+ACTION_SKIPPED = 'action_skipped'
+ARCHIVE_LIMIT = 'archive_limit'
+
+# Detections and the actions taken on them: never deduplicated, and not dropped when the queue is full (emit
+# waits up to CRITICAL_PUT_TIMEOUT for the writer instead); a repeated alert for a file whose deletion keeps
+# failing must be seen
+CRITICAL_KINDS = frozenset({
+    MALWARE_DETECTED, FILE_DELETED, DELETE_FAILED, SUSPICIOUS_PROCESS, PROCESS_TERMINATED, PROCESS_KILLED,
+    TERMINATE_FAILED, SUSPICIOUS_CONNECTION, ARCHIVE_LIMIT,
+})
+
+# Seconds between checks for a closed pipeline while a critical event waits for room in the queue
+CRITICAL_PUT_POLL = 0.5
+
+# Seconds a critical event waits for room before it is dropped and counted, so a stuck sink cannot stall the
+# scanners (or the response actions that emit these events) forever
+CRITICAL_PUT_TIMEOUT = 10.0
+
+# Seconds close() spends queueing its stop marker and waiting for the writer, however stuck a sink is
+CLOSE_TIMEOUT = 10.0
+
+# Default per-kind rate limits as (events per second, burst); high-severity kinds are never limited
+DEFAULT_RATE_LIMITS = {
+    SUSPICIOUS_FILE: (50.0, 500),
+    CONNECTION_BLOCKED: (20.0, 200),
+}
+
+# Marker queued by EventPipeline.close() to stop the writer thread
+_STOP = object()
+
+# One detection event: wall-clock time, kind, logging level, human-readable message and extra fields
+Event = namedtuple('Event', ['time', 'kind', 'level', 'message', 'fields'])
+
+
+# Route the shared logger to a rotating defender.log through a QueueHandler/QueueListener pair
+# Only the 'defender' logger is touched, so applications importing this module keep their own logging
+# Returns the started QueueListener (stopped automatically at exit)
+def configure_logging(path=DEFAULT_LOG_PATH, level=logging.INFO, max_bytes=DEFAULT_MAX_BYTES,
+                      backups=DEFAULT_BACKUPS):
+    global _listener
+    if _listener is not None:
+        return _listener
+    handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups,
+                                                   encoding='utf-8', delay=True)
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    records = queue.SimpleQueue()
+    logger.addHandler(logging.handlers.QueueHandler(records))
+    logger.setLevel(level)
+    # Records stop here; nothing reaches the root logger of the host application
+    logger.propagate = False
+    _listener = logging.handlers.QueueListener(records, handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+    return _listener
+
+
+# Listener started by configure_logging, if any
+_listener = None
+
+
+# Plain dictionary form of an event, as written by the JSON sinks
+def event_record(event):
+    return {'time': event.time, 'kind': event.kind, 'level': logging.getLevelName(event.level),
+            'message': event.message, **event.fields}
+
+
+# Sink printing alerts to the console, one write per batch
+class ConsoleSink:
+    def __init__(self, stream=None):
+        self.stream = stream
+
+    def write_batch(self, events):
+        stream = self.stream or sys.stdout
+        stream.write(''.join(event.message + '\n' for event in events))
+        stream.flush()
+
+    def close(self):
+        pass
+
+
+# Sink writing one JSON object per event to a stream (stdout by default), for machine consumers
+class JsonStreamSink(ConsoleSink):
+    def write_batch(self, events):
+        stream = self.stream or sys.stdout
+        stream.write(''.join(json.dumps(event_record(event), default=str) + '\n' for event in events))
+        stream.flush()
+
+
+# Sink forwarding events to the shared logger (and from there to defender.log)
+class LogSink:
+    def write_batch(self, events):
+        for event in events:
+            logger.log(event.level, event.message)
+
+    def close(self):
+        pass
+
+
+# Sink appending one JSON object per event, rotating by size like RotatingFileHandler
+class JsonLinesSink:
+    def __init__(self, path=DEFAULT_EVENTS_PATH, max_bytes=DEFAULT_MAX_BYTES, backups=DEFAULT_BACKUPS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._file = None
+
+    # Rename path -> path.1 -> path.2 ... dropping the oldest
+    def _rotate(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        for i in range(self.backups - 1, 0, -1):
+            source = f'{self.path}.{i}'
+            if os.path.exists(source):
+                os.replace(source, f'{self.path}.{i + 1}')
+        if self.backups > 0 and os.path.exists(self.path):
+            os.replace(self.path, f'{self.path}.1')
+
+    def write_batch(self, events):
+        data = ''.join(json.dumps(event_record(event), default=str) + '\n' for event in events).encode('utf-8')
+        if self._file is None:
+            self._file = open(self.path, 'ab')
+        if self.max_bytes and self._file.tell() + len(data) > self.max_bytes and self._file.tell() > 0:
+            self._rotate()
+            self._file = open(self.path, 'ab')
+        self._file.write(data)
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+# Token bucket used for per-kind rate limiting
+class _Bucket:
+    __slots__ = ('rate', 'burst', 'tokens', 'stamp', 'suppressed')
+
+    def __init__(self, rate, burst):
+        self.rate, self.burst = rate, burst
+        self.tokens, self.stamp, self.suppressed = float(burst), time.monotonic(), 0
+
+    # Take one token; returns False when the bucket is empty
+    def take(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        return False
+
+
+# Pipelines not closed yet, closed by _close_open_pipelines at exit; the weak set does not keep closed ones alive
+_open_pipelines = weakref.WeakSet()
+
+
+# Exit hook: drain and close every pipeline still open
+def _close_open_pipelines():
+    for pipeline in list(_open_pipelines):
+        pipeline.close()
+
+
+atexit.register(_close_open_pipelines)
+
+
+# Non-blocking event pipeline
+#   sinks: objects with write_batch(events) and close()
+#   capacity: queue size; events beyond it are dropped and counted rather than blocking the caller,
+#             except CRITICAL_KINDS, which wait up to CRITICAL_PUT_TIMEOUT for room
+#   batch_size: most events handed to the sinks in one write
+#   dedup_window: seconds during which an identical (kind, message) is suppressed (CRITICAL_KINDS never are)
+#   rate_limits: {kind: (events per second, burst)}
+class EventPipeline:
+    def __init__(self, sinks=None, capacity=100000, batch_size=512, dedup_window=5.0,
+                 rate_limits=DEFAULT_RATE_LIMITS):
+        self.sinks = list(sinks) if sinks is not None else [ConsoleSink(), LogSink()]
+        self.batch_size = batch_size
+        self.dedup_window = dedup_window
+        self._queue = queue.Queue(maxsize=capacity)
+        self._lock = threading.Lock()
+        self._recent = {}
+        self._buckets = {kind: _Bucket(rate, burst) for kind, (rate, burst) in (rate_limits or {}).items()}
+        # Counters exposed through stats()
+        self.emitted = 0
+        self.dropped = 0
+        # Critical events dropped after waiting CRITICAL_PUT_TIMEOUT (also counted in dropped)
+        self.critical_dropped = 0
+        self.duplicates = 0
+        self.rate_limited = 0
+        self.written = 0
+        self.max_emit_seconds = 0.0
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='event-writer', daemon=True)
+        self._thread.start()
+        _open_pipelines.add(self)
+
+    # Queue an event; never waits on the sinks except for a critical event meeting a full queue
+    # Returns True if the event was accepted
+    def emit(self, kind, level, message, **fields):
+        start = time.perf_counter()
+        if kind in CRITICAL_KINDS:
+            accepted = self._emit_critical(Event(time.time(), kind, level, message, fields))
+            with self._lock:
+                if accepted:
+                    self.emitted += 1
+                else:
+                    self.dropped += 1
+                    self.critical_dropped += 1
+                self._emit_timed(start)
+            return accepted
+        now = time.monotonic()
+        accepted = False
+        with self._lock:
+            # Drop exact repeats seen within the dedup window
+            key = (kind, message)
+            seen = self._recent.get(key)
+            if seen is not None and now - seen < self.dedup_window:
+                self.duplicates += 1
+            else:
+                self._recent[key] = now
+                if len(self._recent) > 100000:
+                    self._recent = {k: t for k, t in self._recent.items() if now - t < self.dedup_window}
+                bucket = self._buckets.get(kind)
+                if bucket is not None and not bucket.take(now):
+                    bucket.suppressed += 1
+                    self.rate_limited += 1
+                else:
+                    # put_nowait never waits: a full queue drops the event instead of stalling a scanner
+                    try:
+                        self._queue.put_nowait(Event(time.time(), kind, level, message, fields))
+                        self.emitted += 1
+                        accepted = True
+                    except queue.Full:
+                        self.dropped += 1
+            self._emit_timed(start)
+        return accepted
+
+    # Track the slowest emit call; called with the lock held
+    def _emit_timed(self, start):
+        elapsed = time.perf_counter() - start
+        if elapsed > self.max_emit_seconds:
+            self.max_emit_seconds = elapsed
+
+    # Queue a critical event, waiting up to CRITICAL_PUT_TIMEOUT for room; False once that passes or the
+    # pipeline is closed. Called without the pipeline lock held, so the writer can keep draining the queue
+    def _emit_critical(self, event):
+        deadline = time.monotonic() + CRITICAL_PUT_TIMEOUT
+        while True:
+            remaining = deadline - time.monotonic()
+            try:
+                self._queue.put(event, timeout=max(0.0, min(CRITICAL_PUT_POLL, remaining)))
+                return True
+            except queue.Full:
+                # A closed pipeline has no writer left to make room
+                if self._closed:
+                    return False
+                if remaining <= CRITICAL_PUT_POLL:
+                    logger.error(f"Event queue full for {CRITICAL_PUT_TIMEOUT:g}s; dropped {event.kind}: "
+                                 f"{event.message}")
+                    return False
+
+    # Summaries of rate-limited events, emitted by the writer thread once a second
+    def _suppression_summaries(self):
+        summaries = []
+        with self._lock:
+            for kind, bucket in self._buckets.items():
+                if bucket.suppressed:
+                    summaries.append(Event(time.time(), EVENTS_SUPPRESSED, logging.WARNING,
+                                           f"Suppressed {bucket.suppressed} {kind} events (rate limit)",
+                                           {'suppressed_kind': kind, 'count': bucket.suppressed}))
+                    bucket.suppressed = 0
+        return summaries
+
+    # Writer thread: gather a batch, hand it to every sink, repeat
+    def _run(self):
+        next_summary = time.monotonic() + 1.0
+        while True:
+            try:
+                first = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                first = None
+            batch = [] if first is None else [first]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = any(item is _STOP for item in batch)
+            # Flush markers are threading.Events set once everything queued before them is written
+            markers = [item for item in batch if isinstance(item, threading.Event)]
+            batch = [item for item in batch if isinstance(item, Event)]
+            if time.monotonic() >= next_summary or stop:
+                batch.extend(self._suppression_summaries())
+                next_summary = time.monotonic() + 1.0
+            if batch:
+                self._write(batch)
+            for marker in markers:
+                marker.set()
+            if stop:
+                return
+
+    # Write one batch to every sink; a failing sink never stops the others
+    def _write(self, batch):
+        for sink in self.sinks:
+            try:
+                sink.write_batch(batch)
+            except Exception as e:
+                logger.error(f"Event sink {type(sink).__name__} failed: {e}")
+        self.written += len(batch)
+
+    # Block until every event queued so far has been written, or `timeout` seconds pass; True once written
+    def flush(self, timeout=5.0):
+        if self._closed:
+            return True
+        deadline = time.monotonic() + timeout
+        marker = threading.Event()
+        try:
+            self._queue.put(marker, timeout=timeout)
+        except queue.Full:
+            return False
+        return marker.wait(max(0.0, deadline - time.monotonic()))
+
+    # Drain the queue, stop the writer thread and close the sinks, within CLOSE_TIMEOUT
+    # A writer stuck in a sink is abandoned (it is a daemon thread) and what it still holds is not written
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        _open_pipelines.discard(self)
+        deadline = time.monotonic() + CLOSE_TIMEOUT
+        try:
+            self._queue.put(_STOP, timeout=CLOSE_TIMEOUT)
+        except queue.Full:
+            logger.error(f"Event writer stuck; closing with {self._queue.qsize()} events unwritten")
+        self._thread.join(timeout=max(0.0, deadline - time.monotonic()))
+        if self._thread.is_alive():
+            # The stuck writer may still be inside a sink, so the sinks are left open
+            return
+        for sink in self.sinks:
+            sink.close()
+
+    # Counters describing the pipeline's behaviour
+    def stats(self):
+        return {
+            'emitted': self.emitted,
+            'written': self.written,
+            'dropped': self.dropped,
+            'critical_dropped': self.critical_dropped,
+            'duplicates': self.duplicates,
+            'rate_limited': self.rate_limited,
+            'queued': self._queue.qsize(),
+            'max_emit_seconds': self.max_emit_seconds,
+        }
@@ -0,0 +1,829 @@
+# Fleet mode for the Intelligent Defence System
+# Agents ship batched, zlib-compressed verdict records to a central aggregator over a unix socket or TCP
+# The aggregator keeps a shared cache of clean and malware content digests that agents query in bulk after their
+# single read of each file, so OS and vendor archives present on every host are opened and scanned member by
+# member once for the whole fleet, and it leases the directories of a large shared filesystem to several workers
+# Every message carries an HMAC-SHA256 tag made with a key shared by the fleet (--key-file or DEFENDER_FLEET_KEY),
+# so only holders of the key can add verdicts, lease work or pass as the aggregator
+#   python fleet.py aggregator --listen unix:defender_fleet.sock --key-file fleet.key
+#   python fleet.py agent /srv/share --aggregator unix:defender_fleet.sock --key-file fleet.key --shard 4
+#   python fleet.py bench       (local stand-in aggregator process, scanning avoided and ingest rate)
+# Developed for monitoring and threat response for the Indian Armed Forces
+
+import os  # Socket files, directory splitting, process ids and the key environment variable
+import re  # Digest validation
+import sys  # Command-line exit status and the interpreter used for the stand-in aggregator
+import hmac  # Message authentication with the shared fleet key
+import json  # Message encoding
+import stat  # Only a socket file left by a previous aggregator is removed before binding
+import time  # Ingest timing and reconnect back-off
+import zlib  # Message compression
+import socket  # Agent connections and host names
+import struct  # Frame length prefix
+import hashlib  # HMAC digest
+import argparse  # Command-line options
+import threading  # Aggregator lock, server thread and sharded workers
+import socketserver  # Threaded unix and TCP aggregator servers
+from collections import deque, OrderedDict  # Breadth-first directory splitting and the bounded verdict stores
+import events  # Shared 'defender' logger
+from walker import walk_files  # Streaming scandir-based walker producing (path, stat) entries
+from multiscan import scan_file_once  # Hash-only first pass, before the fleet is asked about the content
+from scan_engine import ScanStats  # Per-scan summary, extended with the fleet counters below
+
+# Default aggregator address: a unix socket in the working directory, for a single-machine stand-in
+DEFAULT_ADDRESS = 'unix:defender_fleet.sock'
+
+# Frame header: length of what follows, an HMAC-SHA256 tag and the compressed JSON message it covers
+FRAME = struct.Struct('>I')
+MAC_SIZE = 32
+
+# Roles mixed into every tag, so a request captured from an agent cannot be passed back to it as a reply
+ROLE_AGENT = b'agent'
+ROLE_AGGREGATOR = b'aggregator'
+
+# Environment variable holding the shared fleet key when no key file is given, and the shortest key accepted
+KEY_ENV = 'DEFENDER_FLEET_KEY'
+MIN_KEY_BYTES = 16
+
+# Largest compressed message accepted, so a peer cannot make the aggregator buffer much before the tag is checked
+# A batch of DEFAULT_BATCH records with 4096-byte paths is about 2.2 MB before compression
+MAX_FRAME = 4 * 1024 * 1024
+
+# Seconds the aggregator keeps an idle agent connection open, and seconds a started message has to arrive in full
+IDLE_TIMEOUT = 600.0
+MESSAGE_TIMEOUT = 30.0
+
+# Agent connections the aggregator serves at once; further connections are closed straight away
+MAX_CONNECTIONS = 256
+
+# Verdict records sent per batch, and files looked up in the shared cache per query
+DEFAULT_BATCH = 512
+
+# Directory units created per scanning worker when a shared tree is split into leases
+UNITS_PER_WORKER = 4
+
+# Seconds after which a unit leased to an agent that never reported it done is handed out again
+LEASE_TIMEOUT = 600.0
+
+# Seconds an agent waits before retrying an aggregator it could not reach; it scans locally meanwhile
+RECONNECT_INTERVAL = 30.0
+
+# Clean (fingerprint, digest) entries and malware digests kept by the aggregator; past these the least recently
+# reported or queried are forgotten, so a busy fleet cannot grow the aggregator without bound
+MAX_CLEAN_DIGESTS = 1000000
+MAX_BAD_DIGESTS = 100000
+
+# Directory units accepted from an agent for one shared tree
+MAX_UNITS = 10000
+
+# A sha256 digest in hex, the only content key the aggregator stores
+DIGEST_PATTERN = re.compile('[0-9a-f]{64}')
+
+
+# Raised on malformed, oversized or unauthenticated messages, and on a missing fleet key
+class FleetError(Exception):
+    pass
+
+
+# Parse 'unix:PATH' or 'HOST:PORT' into (address family, socket address)
+def parse_address(text):
+    if text.startswith('unix:'):
+        return socket.AF_UNIX, text[5:]
+    host, _, port = text.rpartition(':')
+    if not host or not port.isdigit():
+        raise FleetError(f"invalid address {text!r}; expected unix:PATH or HOST:PORT")
+    return socket.AF_INET, (host, int(port))
+
+
+# Shared fleet key from a key file, or from the DEFENDER_FLEET_KEY environment variable
+def load_key(path=None):
+    if path:
+        try:
+            with open(path, 'rb') as f:
+                key = f.read().strip()
+        except OSError as e:
+            raise FleetError(f'cannot read the fleet key: {e}') from e
+    else:
+        key = os.environ.get(KEY_ENV, '').encode('utf-8')
+    if len(key) < MIN_KEY_BYTES:
+        raise FleetError(f'a fleet key of at least {MIN_KEY_BYTES} bytes is required (--key-file or {KEY_ENV})')
+    return key
+
+
+# Authentication tag of a compressed message sent in `role`
+def _mac(key, role, body):
+    return hmac.new(key, role + body, hashlib.sha256).digest()
+
+
+# Send one message tagged with the fleet key; returns the number of bytes put on the wire
+def send_message(sock, message, key, role):
+    body = zlib.compress(json.dumps(message, separators=(',', ':')).encode('utf-8'))
+    data = _mac(key, role, body) + body
+    sock.sendall(FRAME.pack(len(data)) + data)
+    return FRAME.size + len(data)
+
+
+# Read exactly n bytes, or None if the peer closed the connection first
+# With a deadline (time.monotonic) the whole read must finish by then, however the peer paces its bytes
+def _recv_exact(sock, n, deadline=None):
+    chunks = []
+    while n:
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise socket.timeout('message not received in time')
+            sock.settimeout(remaining)
+        chunk = sock.recv(min(n, 1 << 20))
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        n -= len(chunk)
+    return b''.join(chunks)
+
+
+# Receive one message sent in `role`; returns (message, wire bytes, decompressed bytes), or None when the peer closed
+# A message whose tag does not match the fleet key raises FleetError before it is decompressed or parsed
+# With a timeout the rest of the message must arrive within that many seconds of its header
+def recv_message(sock, key, role, timeout=None):
+    header = _recv_exact(sock, FRAME.size)
+    if header is None:
+        return None
+    (length,) = FRAME.unpack(header)
+    if length > MAX_FRAME:
+        raise FleetError(f'message of {length} bytes exceeds the {MAX_FRAME} byte limit')
+    if length < MAC_SIZE:
+        raise FleetError('message too short to carry an authentication tag')
+    data = _recv_exact(sock, length, None if timeout is None else time.monotonic() + timeout)
+    if data is None:
+        return None
+    body = data[MAC_SIZE:]
+    if not hmac.compare_digest(data[:MAC_SIZE], _mac(key, role, body)):
+        raise FleetError('message failed authentication; the peer does not hold the fleet key')
+    try:
+        raw = zlib.decompress(body)
+        return json.loads(raw), FRAME.size + length, len(raw)
+    except (zlib.error, ValueError) as e:
+        raise FleetError(f'malformed message: {e}') from e
+
+
+# Split a tree into directory units for sharded scanning; agents run this on their own view of the tree
+# A unit is (directory, 0) for the files directly inside a directory, or (directory, None) for a whole subtree;
+# directories are expanded breadth first until there are about `parts` units, and every file is in exactly one
+def split_tree(root, parts):
+    units, frontier = [], deque([root])
+    while frontier:
+        directory = frontier.popleft()
+        try:
+            with os.scandir(directory) as it:
+                children = sorted(entry.path for entry in it if entry.is_dir(follow_symlinks=False))
+        except OSError:
+            children = []
+        units.append((directory, 0))
+        if len(units) + len(frontier) + len(children) < parts:
+            frontier.extend(children)
+        else:
+            units.extend((child, None) for child in children)
+    return units
+
+
+# Units still to scan under `root` once the units in `finished` are done, for an agent that lost its aggregator
+# `finished` may come from any agent's split of the root; directories with no finished work below them are
+# returned whole, the others are expanded so that every file outside `finished` is in exactly one unit
+def remaining_units(root, finished):
+    finished = {(os.path.normpath(path), max_depth) for path, max_depth in finished}
+    units, stack = [], [os.path.normpath(root)]
+    while stack:
+        directory = stack.pop()
+        if (directory, None) in finished:
+            continue
+        below = directory.rstrip(os.sep) + os.sep
+        if (directory, 0) not in finished and not any(path.startswith(below) for path, _ in finished):
+            units.append((directory, None))
+            continue
+        if (directory, 0) not in finished:
+            units.append((directory, 0))
+        try:
+            with os.scandir(directory) as it:
+                stack.extend(sorted((entry.path for entry in it if entry.is_dir(follow_symlinks=False)),
+                                    reverse=True))
+        except OSError:
+            pass
+    return units
+
+
+# Units offered by an agent for `root`, checked before they are leased to other agents
+# Each must be [directory, 0 or None] with the directory inside the root; raises ValueError otherwise
+def _valid_units(root, offered):
+    if not isinstance(offered, list) or len(offered) > MAX_UNITS:
+        raise ValueError(f'expected a list of at most {MAX_UNITS} units')
+    top = os.path.normpath(root)
+    units = []
+    for path, max_depth in offered:
+        if not isinstance(path, str) or max_depth not in (0, None) or \
+                os.path.commonpath([top, os.path.normpath(path)]) != top:
+            raise ValueError(f'{path!r} is not a directory unit of {root!r}')
+        units.append((path, max_depth))
+    return units
+
+
+# Add or refresh `key` in a bounded least-recently-used store, keeping the first value stored for it
+def _remember(store, key, value, limit):
+    if key in store:
+        store.move_to_end(key)
+        return
+    store[key] = value
+    if len(store) > limit:
+        store.popitem(last=False)
+
+
+# Central state of the fleet: shared verdicts, leases of shared trees and ingest counters
+# Requests reach it through AggregatorServer, which has already checked their authentication tag
+#   log_path: optional JSON-lines file receiving every malware and suspicious record from the agents
+class Aggregator:
+    def __init__(self, log_path=None):
+        self._lock = threading.Lock()
+        # (detection fingerprint, sha256 hex) of content found clean -> reporting host, least recently used first
+        # Verdicts are only shared between agents running the same signatures and rules
+        self._clean = OrderedDict()
+        # sha256 hex -> host that found the content to be malware, least recently reported first
+        self._bad = OrderedDict()
+        # Shared tree root -> units not yet leased, and units leased but not yet done -> lease time
+        self._units = {}
+        self._leased = {}
+        self._log = open(log_path, 'a', encoding='utf-8') if log_path else None
+        self.started = time.perf_counter()
+        self.counters = {'batches': 0, 'records': 0, 'wire_bytes': 0, 'raw_bytes': 0, 'ingest_seconds': 0.0,
+                         'queries': 0, 'digests_queried': 0, 'clean_hits': 0, 'bad_hits': 0, 'leases': 0}
+
+    # Dispatch one request; wire and raw are the compressed and decompressed sizes of the request
+    def handle(self, message, wire=0, raw=0):
+        kind = message.get('type') if isinstance(message, dict) else None
+        if kind == 'verdicts':
+            return self.ingest(message, wire, raw)
+        if kind == 'query':
+            return self.query(message)
+        if kind == 'lease':
+            return self.lease(message)
+        if kind == 'stats':
+            return dict(self.stats(), type='stats')
+        return {'type': 'error', 'message': f'unknown request type {kind!r}'}
+
+    # Store a batch of verdict records: [path, size, mtime_ns, sha256 hex, verdict, reason]
+    # Clean and malware verdicts are keyed by content digest only; path, size and mtime just go to the log
+    def ingest(self, message, wire=0, raw=0):
+        start = time.perf_counter()
+        host = str(message.get('host', '?'))
+        fingerprint = str(message.get('fingerprint'))
+        records = message.get('records', [])
+        lines = []
+        with self._lock:
+            for path, size, mtime_ns, digest, verdict, reason in records:
+                valid = isinstance(digest, str) and DIGEST_PATTERN.fullmatch(digest) is not None
+                if verdict == 'clean' and valid:
+                    _remember(self._clean, (fingerprint, digest), host, MAX_CLEAN_DIGESTS)
+                elif verdict == 'malware' and valid:
+                    _remember(self._bad, digest, host, MAX_BAD_DIGESTS)
+                if verdict in ('malware', 'suspicious') and self._log is not None:
+                    lines.append(json.dumps({'host': host, 'path': path, 'sha256': digest, 'verdict': verdict,
+                                             'reason': reason}) + '\n')
+            if lines:
+                self._log.writelines(lines)
+                self._log.flush()
+            counters = self.counters
+            counters['batches'] += 1
+            counters['records'] += len(records)
+            counters['wire_bytes'] += wire
+            counters['raw_bytes'] += raw
+            counters['ingest_seconds'] += time.perf_counter() - start
+        return {'type': 'ok', 'accepted': len(records)}
+
+    # Bulk lookup of content an agent just hashed: `digests` are sha256 hex digests under one detection fingerprint
+    # The answer lists the digests found clean under that fingerprint and maps those known to be malware to the
+    # reporting host; a malware report always wins over a clean one
+    def query(self, message):
+        fingerprint = str(message.get('fingerprint'))
+        digests = message.get('digests', [])
+        with self._lock:
+            bad = {digest: self._bad[digest] for digest in digests if digest in self._bad}
+            clean = []
+            for digest in digests:
+                key = (fingerprint, digest)
+                if key in self._clean and digest not in bad:
+                    self._clean.move_to_end(key)
+                    clean.append(digest)
+            counters = self.counters
+            counters['queries'] += 1
+            counters['digests_queried'] += len(digests)
+            counters['clean_hits'] += len(clean)
+            counters['bad_hits'] += len(bad)
+        return {'type': 'answers', 'clean': clean, 'bad': bad}
+
+    # Hand out the next unit of a shared tree
+    # `units` is the agent's own split of the tree (see split_tree); the first lease of a root with no pass under
+    # way takes them, so the aggregator never reads a filesystem itself. `done` is the unit the agent finished
+    # since its last lease; units not done within LEASE_TIMEOUT are handed out again. A null path means nothing
+    # is left to lease; once every unit is done the pass is complete and a lease offering units starts a new one
+    def lease(self, message):
+        root = message['root']
+        now = time.monotonic()
+        with self._lock:
+            units = self._units.get(root)
+            if units is None:
+                if not message.get('units'):
+                    return {'type': 'unit', 'path': None, 'max_depth': None}
+                units = self._units[root] = deque(_valid_units(root, message['units']))
+                self._leased[root] = {}
+            leased = self._leased[root]
+            if message.get('done') is not None:
+                leased.pop(tuple(message['done']), None)
+            for unit, since in list(leased.items()):
+                if now - since > LEASE_TIMEOUT:
+                    del leased[unit]
+                    units.append(unit)
+            if not units:
+                if not leased:
+                    del self._units[root]
+                    del self._leased[root]
+                return {'type': 'unit', 'path': None, 'max_depth': None}
+            unit = units.popleft()
+            leased[unit] = now
+            self.counters['leases'] += 1
+        return {'type': 'unit', 'path': unit[0], 'max_depth': unit[1]}
+
+    # Counters plus the derived scaling figures
+    def stats(self):
+        with self._lock:
+            record = dict(self.counters)
+            record['clean_entries'] = len(self._clean)
+            record['bad_digests'] = len(self._bad)
+        record['uptime_seconds'] = round(time.perf_counter() - self.started, 3)
+        # Records stored per second of ingest work: the aggregator's capacity, whatever the agents' pace
+        record['ingest_records_per_second'] = round(record['records'] / record['ingest_seconds'], 1) \
+            if record['ingest_seconds'] else 0.0
+        record['compression_ratio'] = round(record['raw_bytes'] / record['wire_bytes'], 2) \
+            if record['wire_bytes'] else 0.0
+        record['clean_hit_rate'] = round(record['clean_hits'] / record['digests_queried'], 4) \
+            if record['digests_queried'] else 0.0
+        return record
+
+    def close(self):
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+
+# Threaded server mix-in serving at most MAX_CONNECTIONS connections at once, each in its own thread
+class _ConnectionLimit:
+    def __init__(self, *args, **kwargs):
+        self._slots = threading.BoundedSemaphore(MAX_CONNECTIONS)
+        super().__init__(*args, **kwargs)
+
+    def process_request(self, request, client_address):
+        if not self._slots.acquire(blocking=False):
+            events.logger.warning(f"Fleet aggregator refused a connection: {MAX_CONNECTIONS} already open")
+            self.shutdown_request(request)
+            return
+        try:
+            super().process_request(request, client_address)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def process_request_thread(self, request, client_address):
+        try:
+            super().process_request_thread(request, client_address)
+        finally:
+            self._slots.release()
+
+
+# Threaded TCP server that may rebind its port while connections of a previous aggregator are in TIME_WAIT
+# A subclass, so other socketserver users in the same process keep the stdlib default
+class _ReusableTCPServer(_ConnectionLimit, socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+
+
+# Threaded unix socket server with the same connection limit, where the platform has unix sockets
+if hasattr(socketserver, 'ThreadingUnixStreamServer'):
+    class _UnixServer(_ConnectionLimit, socketserver.ThreadingUnixStreamServer):
+        pass
+
+
+# Remove the socket file a previous aggregator left at `path`; anything else found there is an error, not replaced
+def _remove_socket_file(path):
+    try:
+        mode = os.lstat(path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise FleetError(f'{path} exists and is not a socket; not replacing it')
+    os.unlink(path)
+
+
+# Threaded socket server answering agent requests with an Aggregator
+# Each connection carries any number of request/reply exchanges; a message without a valid tag for `key`
+# gets an error reply and closes the connection, so unauthenticated peers never reach the aggregator
+# A connection idle for IDLE_TIMEOUT, or a message not complete MESSAGE_TIMEOUT after it started, is closed
+class AggregatorServer:
+    def __init__(self, aggregator, address, key):
+        self.aggregator = aggregator
+        family, target = parse_address(address)
+        server = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                while True:
+                    try:
+                        self.request.settimeout(IDLE_TIMEOUT)
+                        received = recv_message(self.request, key, ROLE_AGENT, timeout=MESSAGE_TIMEOUT)
+                        if received is None:
+                            return
+                        reply = server.aggregator.handle(*received)
+                    except FleetError as e:
+                        events.logger.warning(f"Fleet aggregator refused a request: {e}")
+                        send_message(self.request, {'type': 'error', 'message': str(e)}, key, ROLE_AGGREGATOR)
+                        return
+                    except (KeyError, TypeError, ValueError) as e:
+                        reply = {'type': 'error', 'message': f'bad request: {e}'}
+                    except OSError:
+                        return
+                    send_message(self.request, reply, key, ROLE_AGGREGATOR)
+
+        if family == socket.AF_UNIX:
+            # A socket file left behind by a previous aggregator would make bind fail
+            _remove_socket_file(target)
+            self._server = _UnixServer(target, Handler)
+            self.address = f'unix:{target}'
+        else:
+            self._server = _ReusableTCPServer(target, Handler)
+            host, port = self._server.server_address[:2]
+            self.address = f'{host}:{port}'
+        self._server.daemon_threads = True
+        self._path = target if family == socket.AF_UNIX else None
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='fleet-aggregator', daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._path is not None:
+            # Whatever replaced the socket file since it was bound is left alone
+            try:
+                _remove_socket_file(self._path)
+            except (FleetError, OSError):
+                pass
+        self.aggregator.close()
+
+
+# Request/reply connection to the aggregator, authenticated both ways with the fleet key
+# While the aggregator is unreachable, request() returns None and agents carry on with local scanning
+class FleetClient:
+    def __init__(self, address, key, timeout=10.0):
+        self.address = address
+        self.key = key
+        self.timeout = timeout
+        self._sock = None
+        self._retry_at = 0.0
+        self._lock = threading.Lock()
+        self.sent_bytes = 0
+
+    def _connect(self):
+        family, target = parse_address(self.address)
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(target)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    # Send a request and wait for the reply; None if the aggregator cannot be reached
+    # A kept-open connection the aggregator has since closed (see IDLE_TIMEOUT) is replaced once straight away
+    def request(self, message):
+        with self._lock:
+            for fresh in (self._sock is None, True):
+                if self._sock is None:
+                    if time.monotonic() < self._retry_at:
+                        return None
+                    try:
+                        self._sock = self._connect()
+                    except OSError as e:
+                        events.logger.warning(f"Fleet aggregator {self.address} unreachable: {e}; scanning locally")
+                        self._retry_at = time.monotonic() + RECONNECT_INTERVAL
+                        return None
+                try:
+                    self.sent_bytes += send_message(self._sock, message, self.key, ROLE_AGENT)
+                    received = recv_message(self._sock, self.key, ROLE_AGGREGATOR)
+                except (OSError, FleetError) as e:
+                    received = None
+                    if fresh:
+                        events.logger.warning(f"Fleet aggregator {self.address} connection lost: {e}")
+                if received is not None:
+                    break
+                self._sock.close()
+                self._sock = None
+                if fresh:
+                    self._retry_at = time.monotonic() + RECONNECT_INTERVAL
+                    return None
+            reply = received[0]
+            if reply.get('type') == 'error':
+                events.logger.error(f"Fleet aggregator rejected a request: {reply.get('message')}")
+                return None
+            return reply
+
+    def close(self):
+        with self._lock:
+            if self._sock is not None:
+                self._sock.close()
+                self._sock = None
+
+
+# Scan summary of an agent, with the work the shared cache saved
+class FleetStats(ScanStats):
+    def __init__(self):
+        super().__init__()
+        # Files and bytes whose pattern and archive scan was skipped because another host found the content clean
+        self.avoided = 0
+        self.avoided_bytes = 0
+        # Detections made only because another host reported the digest
+        self.shared_detections = 0
+        # Directory units leased from the aggregator
+        self.units = 0
+
+    def as_dict(self):
+        return {'files': self.files, 'hashed': self.hashed, 'bytes': self.bytes, 'avoided': self.avoided,
+                'avoided_bytes': self.avoided_bytes, 'detections': self.detections, 'suspicious': self.suspicious,
+                'shared_detections': self.shared_detections, 'units': self.units, 'elapsed': round(self.elapsed, 6)}
+
+
+# Scanning agent: a SystemDefender whose cache misses are hashed, checked against the fleet by digest and only
+# then pattern-matched and archive-scanned if still unknown; its verdicts are shipped to the aggregator in batches
+class FleetAgent:
+    def __init__(self, defender, address, key, host=None, batch_size=DEFAULT_BATCH):
+        # Imported here like SystemDefender in main(), so the aggregator never loads the scanner
+        from raj9 import SUSPICIOUS_EXTENSIONS
+        self.defender = defender
+        self.client = FleetClient(address, key)
+        self.host = host or socket.gethostname()
+        self.batch_size = batch_size
+        self._suspicious = frozenset(SUSPICIOUS_EXTENSIONS)
+        self._records = []
+
+    # Queue a verdict record for the aggregator, sending a batch when it is full
+    def _submit(self, entry, result, verdict, reason, fingerprint):
+        digest = result.digests['sha256'].hex() if result is not None else None
+        self._records.append([entry.path, entry.stat.st_size, entry.stat.st_mtime_ns, digest, verdict, reason])
+        if len(self._records) >= self.batch_size:
+            self.flush(fingerprint)
+
+    # Send the queued verdict records; records are dropped if the aggregator is unreachable
+    def flush(self, fingerprint=None):
+        if not self._records:
+            return
+        fingerprint = fingerprint or self.defender.detection_fingerprint()
+        self.client.request({'type': 'verdicts', 'host': self.host, 'fingerprint': fingerprint,
+                             'records': self._records})
+        self._records = []
+
+    # Read a batch of cache misses once (digests and byte patterns), ask the fleet about their content and finish
+    # what is still unknown locally; content found clean elsewhere under the same signatures and rules skips the
+    # archive scan, unless a local signature, pattern or suspicious extension says otherwise. That remote verdict
+    # is not stored in the local cache, so the next scan asks the aggregator again
+    def _scan_batch(self, batch, fingerprint, stats):
+        defender = self.defender
+        algorithms = defender.scan_algorithms()
+        hashed = [(entry, scan_file_once(entry.path, algorithms, defender.matcher, defender.io_options))
+                  for entry in batch]
+        digests = [first.digests['sha256'].hex() for _, first in hashed if first is not None]
+        reply = self.client.request({'type': 'query', 'fingerprint': fingerprint, 'digests': digests}) \
+            if digests else None
+        known_clean = set(reply['clean']) if reply is not None else set()
+        if reply is not None:
+            # Digests other hosts have found to be malware are detections here too
+            for digest, host in reply['bad'].items():
+                defender.shared_detections[bytes.fromhex(digest)] = host
+        for entry, first in hashed:
+            if first is not None and first.digests['sha256'].hex() in known_clean and \
+                    defender.detection_reason(first) is None and \
+                    os.path.splitext(entry.path)[1].lower() not in self._suspicious:
+                stats.add_result(entry.stat, 'clean')
+                stats.avoided += 1
+                stats.avoided_bytes += entry.stat.st_size
+                continue
+            # The single read already matched the patterns; record_result only opens archives
+            verdict = defender.record_result(entry.path, entry.stat, first)
+            stats.add_result(entry.stat, verdict)
+            # Malware found only inside an archive has no reason of its own
+            reason = defender.detection_reason(first) if verdict == 'malware' else None
+            if reason is not None and reason.startswith('fleet '):
+                stats.shared_detections += 1
+            self._submit(entry, first, verdict, reason, fingerprint)
+
+    # Scan a directory tree (max_depth=0 scans only the files directly inside it)
+    # Extra keyword arguments are walker filters; returns FleetStats
+    def scan_directory(self, directory, max_depth=None, stats=None, **walk_options):
+        stats = stats if stats is not None else FleetStats()
+        start = time.perf_counter()
+        defender = self.defender
+        defender.reload_signatures()
+        fingerprint = defender.detection_fingerprint()
+        batch = []
+        for entry in walk_files(directory, max_depth=max_depth, **walk_options):
+            stats.files += 1
+            if defender.cache.is_settled(entry.stat):
+                continue
+            batch.append(entry)
+            if len(batch) >= self.batch_size:
+                self._scan_batch(batch, fingerprint, stats)
+                batch = []
+        if batch:
+            self._scan_batch(batch, fingerprint, stats)
+        self.flush(fingerprint)
+        defender.cache.flush()
+        stats.elapsed += time.perf_counter() - start
+        return stats
+
+    # Scan units of a shared tree leased from the aggregator until none are left
+    # Several agents (on one or more hosts) calling this with the same root split the tree between them; the
+    # first lease offers this agent's own split for `workers` workers, used if no pass over the root is under way
+    # Without an aggregator, or once it is lost, everything this agent has not scanned itself is scanned locally:
+    # what other agents finished is not known here, and scanning a file twice is better than not at all
+    def scan_shards(self, root, workers=1, **walk_options):
+        stats = FleetStats()
+        done = None
+        finished = []
+        units = [list(unit) for unit in split_tree(root, max(1, workers) * UNITS_PER_WORKER)]
+        while True:
+            reply = self.client.request({'type': 'lease', 'root': root, 'done': done, 'units': units})
+            units = None
+            if reply is None:
+                if finished:
+                    events.logger.warning(f"Fleet aggregator lost after {len(finished)} units of {root}; "
+                                          "scanning the rest locally")
+                for path, max_depth in remaining_units(root, finished):
+                    self.scan_directory(path, max_depth=max_depth, stats=stats, **walk_options)
+                return stats
+            if reply['path'] is None:
+                return stats
+            stats.units += 1
+            done = [reply['path'], reply['max_depth']]
+            self.scan_directory(reply['path'], max_depth=reply['max_depth'], stats=stats, **walk_options)
+            finished.append(done)
+
+    def close(self):
+        self.flush()
+        self.client.close()
+
+
+# Start `python fleet.py aggregator` as a separate process and wait until it accepts connections
+# The key is handed over in the environment rather than on the command line, where other users could read it
+def start_aggregator_process(address, key, log_path=None, timeout=10.0):
+    import subprocess
+    command = [sys.executable, os.path.abspath(__file__), 'aggregator', '--listen', address]
+    if log_path:
+        command += ['--log', log_path]
+    process = subprocess.Popen(command, env=dict(os.environ, **{KEY_ENV: key.decode('utf-8')}))
+    client = FleetClient(address, key)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            client._connect().close()
+            return process
+        except OSError:
+            if process.poll() is not None:
+                break
+            time.sleep(0.05)
+    process.terminate()
+    raise FleetError(f'aggregator did not start on {address}')
+
+
+# Single-machine benchmark against a stand-in aggregator process
+#   workers: agents splitting one tree through leases, scanning each file once between them
+#   agents: hosts then scanning the whole tree, which should find nearly all of its content in the shared cache
+#   records: synthetic verdict records sent to measure the aggregator's ingest rate
+# A stand-in aggregator gets a random key; a running one (--aggregator) needs the fleet key
+def bench(args):
+    import tempfile
+    from benchmark_suite import BenchmarkSuite, TreeSpec, parse_distribution
+    key = load_key(args.key_file) if args.aggregator else os.urandom(32).hex().encode('utf-8')
+    workdir = tempfile.mkdtemp(prefix='fleet-bench-')
+    address = args.aggregator or f'unix:{os.path.join(workdir, "aggregator.sock")}'
+    suite = BenchmarkSuite(TreeSpec(args.files, parse_distribution(args.sizes), 2, 4, 5, 0, 1), workdir)
+    suite.prepare()
+    process = None if args.aggregator else start_aggregator_process(address, key)
+    report = {'kind': 'fleet_bench', 'files': args.files}
+    try:
+        # Sharded scan: concurrent workers split the tree through leases and scan every file once between them
+        results = [None] * args.workers
+
+        def work(index):
+            agent = FleetAgent(suite.defender(), address, key, host=f'bench-worker-{index}')
+            results[index] = agent.scan_shards(suite.tree, args.workers).as_dict()
+            agent.close()
+
+        threads = [threading.Thread(target=work, args=(i,)) for i in range(args.workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        report['shards'] = results
+        report['sharded_files'] = sum(r['files'] for r in results)
+        report['sharded_hashed'] = sum(r['hashed'] for r in results)
+        # Hosts with identical content scanning the whole tree: the shared cache already knows it is clean
+        report['agents'] = []
+        for i in range(args.agents):
+            agent = FleetAgent(suite.defender(), address, key, host=f'bench-host-{i}')
+            stats = agent.scan_directory(suite.tree)
+            agent.close()
+            report['agents'].append(dict(stats.as_dict(), host=agent.host))
+        seen = sum(a['hashed'] for a in report['agents'])
+        report['redundant_scanning_avoided'] = round(sum(a['avoided'] for a in report['agents']) / seen, 4) \
+            if seen else 0.0
+        # Ingest: synthetic clean records in full batches from one client
+        client = FleetClient(address, key)
+        batch = args.batch
+        start = time.perf_counter()
+        for offset in range(0, args.records, batch):
+            records = [[f'/bench/{offset + i}', 4096, offset + i, '%064x' % (offset + i), 'clean', None]
+                       for i in range(min(batch, args.records - offset))]
+            client.request({'type': 'verdicts', 'host': 'bench-ingest', 'fingerprint': 'bench', 'records': records})
+        elapsed = time.perf_counter() - start
+        report['client_records_per_second'] = round(args.records / elapsed, 1) if elapsed else 0.0
+        report['client_wire_bytes'] = client.sent_bytes
+        report['aggregator'] = client.request({'type': 'stats'})
+        client.close()
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+# Command-line entry point
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Fleet agent and aggregator for the Intelligent Defence System')
+    sub = parser.add_subparsers(dest='command', required=True)
+    aggregator = sub.add_parser('aggregator', help='run the aggregator until interrupted')
+    aggregator.add_argument('--listen', default=DEFAULT_ADDRESS, help='unix:PATH or HOST:PORT (default: %(default)s)')
+    aggregator.add_argument('--log', help='append malware and suspicious records from every agent to this file')
+    aggregator.add_argument('--key-file', help=f'file holding the shared fleet key (default: ${KEY_ENV})')
+    agent = sub.add_parser('agent', help='scan directories, sharing verdicts through the aggregator')
+    agent.add_argument('paths', nargs='+', metavar='PATH')
+    agent.add_argument('--aggregator', default=DEFAULT_ADDRESS, help='unix:PATH or HOST:PORT (default: %(default)s)')
+    agent.add_argument('--shard', type=int, metavar='WORKERS',
+                       help='lease units of each PATH from the aggregator, splitting it for WORKERS agents')
+    agent.add_argument('--cache', default='defender_cache.db', help='local verdict cache (default: %(default)s)')
+    agent.add_argument('--dry-run', action='store_true', help='report detections without deleting files')
+    agent.add_argument('--batch', type=int, default=DEFAULT_BATCH, help='records per batch and files per query')
+    agent.add_argument('--key-file', help=f'file holding the shared fleet key (default: ${KEY_ENV})')
+    benchmark = sub.add_parser('bench', help='measure scanning avoided and ingest rate with a local aggregator')
+    benchmark.add_argument('--aggregator', help='use a running aggregator instead of starting one')
+    benchmark.add_argument('--key-file', help=f'fleet key of the running aggregator (default: ${KEY_ENV})')
+    benchmark.add_argument('--files', type=int, default=2000)
+    benchmark.add_argument('--sizes', default='4K:70,64K:25,1M:5', help='size distribution as SIZE:WEIGHT,...')
+    benchmark.add_argument('--agents', type=int, default=3, help='hosts scanning the same tree')
+    benchmark.add_argument('--workers', type=int, default=4, help='agents splitting one tree')
+    benchmark.add_argument('--records', type=int, default=200000, help='records sent for the ingest test')
+    benchmark.add_argument('--batch', type=int, default=DEFAULT_BATCH)
+    args = parser.parse_args(argv)
+    try:
+        if args.command == 'bench':
+            return bench(args)
+        key = load_key(args.key_file)
+        if args.command == 'aggregator':
+            server = AggregatorServer(Aggregator(args.log), args.listen, key)
+            print(f'Fleet aggregator listening on {server.address}', flush=True)
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                server.stop()
+            return 0
+    except FleetError as e:
+        parser.error(str(e))
+    # Agent: scan with the local defender, sharing verdicts through the aggregator
+    from raj9 import SystemDefender
+    events.configure_logging()
+    defender = SystemDefender(cache_path=args.cache, dry_run=args.dry_run)
+    agent = FleetAgent(defender, args.aggregator, key, batch_size=args.batch)
+    detections = 0
+    for path in args.paths:
+        stats = agent.scan_shards(path, args.shard) if args.shard else agent.scan_directory(path)
+        print(json.dumps(dict(stats.as_dict(), path=path)), flush=True)
+        detections += stats.detections
+    agent.close()
+    defender.events.close()
+    return 1 if detections else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
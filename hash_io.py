@@ -0,0 +1,242 @@
+# Hashing I/O backends for the Intelligent Defence System
+# Pluggable read strategies (readinto into a reused buffer, hashlib.file_digest, mmap for immutable inputs) with
+# buffer sizes adapted to the file size and page-cache hints so a full scan does not evict hot pages
+# Run "python hash_io.py" to benchmark each strategy across a spread of file sizes
+# Developed for monitoring and threat response for the Indian Armed Forces
+
+import os  # Low-level open flags, fadvise and file sizes
+import sys  # Command-line exit status
+import mmap  # Zero-copy mapping strategy for large files
+import time  # Benchmark timing
+import hashlib  # Digest objects and hashlib.file_digest
+import argparse  # Benchmark command-line options
+import tempfile  # Scratch directory for benchmark files
+import threading  # Per-thread reusable buffers
+from collections import namedtuple  # Options record passed through the scanners
+
+# Available read strategies
+# mmap is opt-in and only safe on inputs nobody can modify while they are read: a file truncated under the
+# mapping raises SIGBUS, which kills the whole process, so scans of user-writable trees use readinto
+STRATEGIES = ('readinto', 'mmap', 'file_digest')
+
+# Smallest and largest read buffer used by the readinto strategy
+MIN_BUFFER = 64 * 1024
+MAX_BUFFER = 4 * 1024 * 1024
+
+# Size of the views handed out when walking a memory mapping
+MMAP_CHUNK = 4 * 1024 * 1024
+
+# How files are read while scanning
+#   strategy: one of STRATEGIES
+#   noatime: open with O_NOATIME where permitted so scans do not dirty inode access times
+#   drop_cache: advise the kernel to drop the file's pages once it has been read
+IOOptions = namedtuple('IOOptions', ['strategy', 'noatime', 'drop_cache'])
+
+# Default options: readinto with buffers sized to the file, page-cache friendly
+DEFAULT_IO = IOOptions('readinto', True, True)
+
+# Per-thread pool of reusable buffers, one per size class
+_local = threading.local()
+
+
+# Pick a read buffer size for a file: large enough to need few calls, small enough to stay in cache
+def buffer_size_for(size):
+    if size <= MIN_BUFFER:
+        return MIN_BUFFER
+    if size >= MAX_BUFFER * 16:
+        return MAX_BUFFER
+    # Roughly a sixteenth of the file, rounded up to a power of two
+    return min(MAX_BUFFER, max(MIN_BUFFER, 1 << ((size // 16) - 1).bit_length()))
+
+
+# Return this thread's reusable buffer of the given size class
+def _buffer(size):
+    buffers = getattr(_local, 'buffers', None)
+    if buffers is None:
+        buffers = _local.buffers = {}
+    buffer = buffers.get(size)
+    if buffer is None:
+        buffer = buffers[size] = bytearray(size)
+    return buffer
+
+
+# Give the kernel a page-cache hint, ignoring platforms without posix_fadvise
+def advise(fd, advice_name, offset=0, length=0):
+    advice = getattr(os, advice_name, None)
+    if advice is None or not hasattr(os, 'posix_fadvise'):
+        return
+    try:
+        os.posix_fadvise(fd, offset, length, advice)
+    except OSError:
+        pass
+
+
+# Open a file for scanning and return its descriptor
+# O_NOATIME is only allowed for the file's owner (or with CAP_FOWNER), so EPERM falls back to a plain open
+def open_for_scan(file_path, noatime=True):
+    flags = os.O_RDONLY | getattr(os, 'O_BINARY', 0) | getattr(os, 'O_CLOEXEC', 0)
+    noatime_flag = getattr(os, 'O_NOATIME', 0) if noatime else 0
+    if noatime_flag:
+        try:
+            return os.open(file_path, flags | noatime_flag)
+        except PermissionError:
+            pass
+    return os.open(file_path, flags)
+
+
+# Check a strategy name, returning it unchanged; raises ValueError for a name not in STRATEGIES
+def validate_strategy(strategy):
+    if strategy not in STRATEGIES:
+        raise ValueError(f'Unknown hashing strategy {strategy!r}; expected one of {STRATEGIES}')
+    return strategy
+
+
+# Yield the contents of an open descriptor as memoryviews, using the readinto or mmap strategy
+# Views are only valid until the next one is requested
+def iter_chunks(fd, size, strategy='readinto'):
+    if strategy == 'mmap' and size > 0:
+        with mmap.mmap(fd, 0, access=mmap.ACCESS_READ) as mapped:
+            if hasattr(mapped, 'madvise') and hasattr(mmap, 'MADV_SEQUENTIAL'):
+                mapped.madvise(mmap.MADV_SEQUENTIAL)
+            view = memoryview(mapped)
+            try:
+                for offset in range(0, len(mapped), MMAP_CHUNK):
+                    chunk = view[offset:offset + MMAP_CHUNK]
+                    try:
+                        yield chunk
+                    finally:
+                        chunk.release()
+            finally:
+                view.release()
+        return
+    buffer = _buffer(buffer_size_for(size))
+    view = memoryview(buffer)
+    # Unbuffered raw reader over the descriptor: readinto fills the reused buffer with no copies
+    raw = open(fd, 'rb', buffering=0, closefd=False)
+    try:
+        while True:
+            n = raw.readinto(buffer)
+            if not n:
+                return
+            yield view[:n]
+    finally:
+        view.release()
+        raw.close()
+
+
+# Stream a file's contents through `consume(chunk)` with the configured strategy and cache hints
+# Returns the number of bytes read; raises OSError if the file cannot be read
+def read_file(file_path, consume, io=DEFAULT_IO):
+    fd = open_for_scan(file_path, io.noatime)
+    try:
+        size = os.fstat(fd).st_size
+        advise(fd, 'POSIX_FADV_SEQUENTIAL')
+        # file_digest cannot hand out chunks, so callers that need them read with readinto instead
+        strategy = 'readinto' if io.strategy == 'file_digest' else validate_strategy(io.strategy)
+        total = 0
+        for chunk in iter_chunks(fd, size, strategy):
+            consume(chunk)
+            total += len(chunk)
+        return total
+    finally:
+        if io.drop_cache:
+            advise(fd, 'POSIX_FADV_DONTNEED')
+        os.close(fd)
+
+
+# Compute one digest of a file with the configured strategy; returns the raw digest or None
+def digest_file(file_path, algorithm='sha256', io=DEFAULT_IO):
+    try:
+        if io.strategy == 'file_digest' and hasattr(hashlib, 'file_digest'):
+            fd = open_for_scan(file_path, io.noatime)
+            try:
+                advise(fd, 'POSIX_FADV_SEQUENTIAL')
+                with open(fd, 'rb', closefd=False) as f:
+                    return hashlib.file_digest(f, algorithm).digest()
+            finally:
+                if io.drop_cache:
+                    advise(fd, 'POSIX_FADV_DONTNEED')
+                os.close(fd)
+        hasher = hashlib.new(algorithm)
+        read_file(file_path, hasher.update, io)
+        return hasher.digest()
+    except (OSError, ValueError):
+        return None
+
+
+# Write the benchmark file set: `count` files of each size, filled with random data
+def _make_files(directory, sizes, count):
+    files = []
+    for size in sizes:
+        block = os.urandom(min(size, 1 << 20))
+        for i in range(count):
+            path = os.path.join(directory, f'{size}-{i}.bin')
+            with open(path, 'wb') as f:
+                remaining = size
+                while remaining:
+                    f.write(block[:remaining])
+                    remaining -= min(remaining, len(block))
+            files.append((path, size))
+    return files
+
+
+# Time the original 4 KiB f.read loop, kept as the baseline the strategies are compared with
+def _legacy_digest(file_path):
+    h = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(4096), b""):
+            h.update(chunk)
+    return h.digest()
+
+
+# Benchmark every strategy over the given file sizes and return {size: {strategy: MB/s}}
+def benchmark(sizes, count=4, repeat=3, cold=False):
+    results = {}
+    with tempfile.TemporaryDirectory(prefix='hash_io_bench-') as directory:
+        files = _make_files(directory, sizes, count)
+        strategies = [('legacy-4k', None)] + [(s, IOOptions(s, True, cold)) for s in STRATEGIES]
+        for size in sizes:
+            group = [path for path, file_size in files if file_size == size]
+            results[size] = {}
+            for name, io in strategies:
+                best = float('inf')
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    for path in group:
+                        if io is None:
+                            _legacy_digest(path)
+                        else:
+                            digest_file(path, 'sha256', io)
+                    best = min(best, time.perf_counter() - start)
+                results[size][name] = size * len(group) / 1e6 / best if best else 0.0
+    return results
+
+
+# Parse a size such as 4K, 16M or 1G
+def parse_size(text):
+    units = {'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30}
+    text = text.strip().upper()
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+
+# Command-line entry point for the micro-benchmark
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark hashing I/O strategies (MB/s, SHA-256)')
+    parser.add_argument('--sizes', default='4K,64K,1M,16M,64M', help='comma-separated file sizes')
+    parser.add_argument('--count', type=int, default=4, help='files per size')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per strategy; the best is reported')
+    parser.add_argument('--cold', action='store_true', help='drop each file from the page cache after reading')
+    args = parser.parse_args(argv)
+    sizes = [parse_size(s) for s in args.sizes.split(',') if s.strip()]
+    results = benchmark(sizes, args.count, args.repeat, args.cold)
+    names = list(next(iter(results.values())).keys()) if results else []
+    print(f"{'size':>10} " + ' '.join(f'{name:>12}' for name in names))
+    for size, row in results.items():
+        print(f'{size:>10} ' + ' '.join(f'{row[name]:>12.1f}' for name in names))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
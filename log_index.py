@@ -0,0 +1,444 @@
+# Indexed access to defender.log for the Intelligent Defence System
+# Maintains a sidecar index of line offsets with their timestamp, level and event kind, extended
+# incrementally as the log grows, so tail, paging, time-range seeks, filters and per-minute statistics
+# never have to read the whole log
+# Run "python log_index.py tail|query|stats|plot" for command-line access
+# Developed for monitoring and threat response for the Indian Armed Forces
+#
+# Sidecar layout (little endian, <log>.idx):
+#   header   magic (8 bytes), indexed bytes (uint64), record count (uint64),
+#            length of the log head covered by the checksum (uint32), crc32 of that head (uint32)
+#   records  count * (line offset uint64, unix time float64, level uint8, kind uint8)
+
+import os  # File sizes and sidecar replacement
+import re  # Line header and message pattern matching
+import sys  # Command-line exit status
+import time  # Local-time conversion of log timestamps
+import zlib  # Checksum of the log head, detects rotation or replacement
+import bisect  # Binary search of record times
+import itertools  # Index-only paging of query results
+import struct  # Packs the sidecar header and records
+import logging  # Level names and numbers
+import argparse  # Command-line interface
+from collections import namedtuple, Counter  # Entry type and per-bucket kind counts
+import events  # Default log path and event kind names
+
+# Magic bytes identifying a log index file
+MAGIC = b'RAJLIDX1'
+
+# Header: magic, indexed bytes, record count, head length, head crc32
+HEADER = struct.Struct('<8sQQII')
+
+# Record: line offset, unix time, level number, kind code
+RECORD = struct.Struct('<QdBB')
+
+# Bytes at the start of the log covered by the rotation checksum
+HEAD_BYTES = 256
+
+# Bytes read from the log per step while indexing
+READ_SIZE = 1024 * 1024
+
+# Line header written by events.LOG_FORMAT: "2025-09-02 23:11:22,440 - INFO - message"
+LINE_HEADER = re.compile(rb'(\d{4}-\d\d-\d\d \d\d:\d\d):(\d\d),(\d{3}) - ([A-Z]+) - ')
+
+# Message prefixes of every event kind, in the order they are tried
+# Kind codes are positions in this table and are stored in sidecars, so new kinds are only ever appended
+KIND_PREFIXES = (
+    (b'Malware detected: ', events.MALWARE_DETECTED),
+    (b'Suspicious file: ', events.SUSPICIOUS_FILE),
+    (b'Deleted file: ', events.FILE_DELETED),
+    (b'Failed to delete ', events.DELETE_FAILED),
+    (b'Suspicious process: ', events.SUSPICIOUS_PROCESS),
+    (b'Terminated process PID: ', events.PROCESS_TERMINATED),
+    (b'Killed process PID: ', events.PROCESS_KILLED),
+    (b'Process PID: ', events.PROCESS_GONE),
+    (b'Failed to terminate PID: ', events.TERMINATE_FAILED),
+    (b'Blocked connection from: ', events.CONNECTION_BLOCKED),
+    (b'Suspicious connection from: ', events.SUSPICIOUS_CONNECTION),
+    (b'Suppressed ', events.EVENTS_SUPPRESSED),
+    (b'Dry run: ', events.ACTION_SKIPPED),
+    (b'Archive limit reached: ', events.ARCHIVE_LIMIT),
+)
+
+# Kind names by code; code 0 is any line that is not a detection event
+KINDS = ('other',) + tuple(kind for _, kind in KIND_PREFIXES)
+
+# Kinds counted as detections by default in statistics and timelines
+DETECTION_KINDS = (events.MALWARE_DETECTED, events.SUSPICIOUS_FILE, events.SUSPICIOUS_PROCESS,
+                   events.SUSPICIOUS_CONNECTION, events.ARCHIVE_LIMIT)
+
+# One log entry: record number, unix time, level name, kind and the full text (including continuation lines)
+LogEntry = namedtuple('LogEntry', ['number', 'time', 'level', 'kind', 'text'])
+
+
+# Raised when a time given on the command line or to a query cannot be understood
+class LogQueryError(ValueError):
+    pass
+
+
+# Convert a level given as a name ('WARNING') or number (30) into its number
+def level_number(level):
+    if isinstance(level, int):
+        return level
+    number = logging.getLevelName(str(level).upper())
+    if not isinstance(number, int):
+        raise LogQueryError(f'unknown level: {level}')
+    return number
+
+
+# Convert a time given as unix seconds, a datetime or 'YYYY-MM-DD[ HH:MM[:SS]]' local time into unix seconds
+def parse_time(value):
+    if value is None or isinstance(value, (int, float)):
+        return value
+    if hasattr(value, 'timestamp'):
+        return value.timestamp()
+    for layout in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d'):
+        try:
+            return time.mktime(time.strptime(str(value).strip(), layout))
+        except ValueError:
+            continue
+    raise LogQueryError(f'unrecognised time: {value}')
+
+
+# Sidecar-indexed view of one log file
+#   log_path: the log to index; index_path defaults to <log_path>.idx
+# When the sidecar cannot be written (read-only directory) the index is kept in memory only
+class LogIndex:
+    def __init__(self, log_path=events.DEFAULT_LOG_PATH, index_path=None):
+        self.log_path = log_path
+        self.index_path = index_path or log_path + '.idx'
+        # Packed records, indexed bytes of the log and the head checksum they were built against
+        self._records = bytearray()
+        self._times = []
+        self._indexed = 0
+        self._head = (0, 0)
+        # Memo of unix time per 'YYYY-MM-DD HH:MM' prefix; one mktime call per minute of log
+        self._minutes = {}
+        self._load()
+
+    # Number of indexed entries
+    def __len__(self):
+        return len(self._records) // RECORD.size
+
+    # Load the sidecar, ignoring it if it is missing, damaged or written for another log
+    def _load(self):
+        try:
+            with open(self.index_path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return
+        if len(data) < HEADER.size:
+            return
+        magic, indexed, count, head_len, head_crc = HEADER.unpack_from(data)
+        # Records beyond the header count belong to an interrupted update and are dropped
+        end = HEADER.size + count * RECORD.size
+        if magic != MAGIC or len(data) < end:
+            return
+        self._records = bytearray(data[HEADER.size:end])
+        self._times = [record[1] for record in RECORD.iter_unpack(self._records)]
+        self._indexed = indexed
+        self._head = (head_len, head_crc)
+
+    # Checksum of the first `length` bytes of the log
+    def _head_crc(self, f, length):
+        f.seek(0)
+        return zlib.crc32(f.read(length))
+
+    # Rewrite the sidecar header and any records appended since `start` (a record number)
+    def _save(self, start):
+        if not os.path.exists(self.index_path):
+            start = 0
+        try:
+            with open(self.index_path, 'r+b' if start else 'wb') as f:
+                # Records go first and the header last, so an interrupted update leaves a valid prefix
+                f.seek(HEADER.size + start * RECORD.size)
+                f.write(self._records[start * RECORD.size:])
+                f.truncate()
+                f.seek(0)
+                f.write(HEADER.pack(MAGIC, self._indexed, len(self), *self._head))
+        except OSError:
+            # Read-only location: keep serving from memory
+            pass
+
+    # Unix time of a line header's timestamp fields
+    def _timestamp(self, minute, seconds, millis):
+        base = self._minutes.get(minute)
+        if base is None:
+            base = time.mktime(time.strptime(minute.decode('ascii'), '%Y-%m-%d %H:%M'))
+            self._minutes[minute] = base
+        return base + int(seconds) + int(millis) / 1000.0
+
+    # Kind code of a message
+    def _kind(self, line, start):
+        for code, (prefix, _) in enumerate(KIND_PREFIXES, 1):
+            if line.startswith(prefix, start):
+                return code
+        return 0
+
+    # Index lines appended since the last call; rebuilds from scratch if the log was rotated or truncated
+    # Returns the number of new entries
+    def refresh(self):
+        try:
+            f = open(self.log_path, 'rb')
+        except FileNotFoundError:
+            if self._records:
+                self._reset()
+                self._save(0)
+            return 0
+        with f:
+            size = os.fstat(f.fileno()).st_size
+            head_len, head_crc = self._head
+            if size < self._indexed or (head_len and self._head_crc(f, head_len) != head_crc):
+                self._reset()
+            if size == self._indexed:
+                return 0
+            first = len(self)
+            position = self._indexed
+            f.seek(position)
+            pending = b''
+            pack, header = RECORD.pack, LINE_HEADER.match
+            while True:
+                chunk = f.read(READ_SIZE)
+                if not chunk:
+                    break
+                data = pending + chunk
+                # Only complete lines are indexed; a partly written last line waits for the next refresh
+                end = data.rfind(b'\n') + 1
+                pending = data[end:]
+                line_start = 0
+                while line_start < end:
+                    line_end = data.index(b'\n', line_start) + 1
+                    match = header(data, line_start)
+                    # Lines without a header (tracebacks, wrapped messages) belong to the entry above them
+                    if match is not None:
+                        minute, seconds, millis, level = match.groups()
+                        number = logging.getLevelName(level.decode('ascii'))
+                        stamp = self._timestamp(minute, seconds, millis)
+                        self._records += pack(position + line_start, stamp,
+                                              number if isinstance(number, int) else 0,
+                                              self._kind(data, match.end()))
+                        self._times.append(stamp)
+                    line_start = line_end
+                position += end
+            self._indexed = position
+            if self._head[0] < HEAD_BYTES:
+                length = min(position, HEAD_BYTES)
+                self._head = (length, self._head_crc(f, length))
+        self._save(first)
+        return len(self) - first
+
+    # Drop every entry so the log is indexed again from the start
+    def _reset(self):
+        self._records = bytearray()
+        self._times = []
+        self._indexed = 0
+        self._head = (0, 0)
+
+    # (offset, time, level, kind code) of entry `number`
+    def record(self, number):
+        return RECORD.unpack_from(self._records, number * RECORD.size)
+
+    # First entry logged at or after `when` (unix seconds or a time string)
+    def find_time(self, when):
+        return bisect.bisect_left(self._times, parse_time(when))
+
+    # Entry numbers within [start, end) that pass the level and kind filters, newest first if reverse
+    def _candidates(self, start, end, levels, kinds, reverse):
+        first = 0 if start is None else self.find_time(start)
+        last = len(self) if end is None else self.find_time(end)
+        numbers = range(last - 1, first - 1, -1) if reverse else range(first, last)
+        if levels is None and kinds is None:
+            yield from numbers
+            return
+        levels = None if levels is None else {level_number(level) for level in levels}
+        kinds = None if kinds is None else {KINDS.index(kind) for kind in kinds}
+        records, size = self._records, RECORD.size
+        for number in numbers:
+            _, _, level, kind = RECORD.unpack_from(records, number * size)
+            if (levels is None or level in levels) and (kinds is None or kind in kinds):
+                yield number
+
+    # Read the text of consecutive entries first..last in one read
+    def _read_run(self, f, first, last):
+        start = self.record(first)[0]
+        end = self.record(last + 1)[0] if last + 1 < len(self) else self._indexed
+        f.seek(start)
+        data = f.read(end - start)
+        entries = []
+        for number in range(first, last + 1):
+            offset, stamp, level, kind = self.record(number)
+            stop = self.record(number + 1)[0] if number + 1 <= last else end
+            text = data[offset - start:stop - start].decode('utf-8', 'replace').rstrip('\r\n')
+            entries.append(LogEntry(number, stamp, logging.getLevelName(level), KINDS[kind], text))
+        return entries
+
+    # Yield entries matching every filter, reading only their lines from the log
+    #   start / end: time range (unix seconds or 'YYYY-MM-DD HH:MM[:SS]'), end exclusive
+    #   levels: level names or numbers; kinds: event kinds (see KINDS)
+    #   pattern: regular expression searched in the entry text
+    #   skip / limit: paging over the matching entries; reverse: newest first
+    def query(self, start=None, end=None, levels=None, kinds=None, pattern=None, skip=0, limit=None,
+              reverse=False):
+        self.refresh()
+        if isinstance(pattern, str):
+            pattern = re.compile(pattern)
+        numbers = self._candidates(start, end, levels, kinds, reverse)
+        if pattern is None:
+            # Without a text pattern paging is decided from the index alone; skipped lines are never read
+            numbers = itertools.islice(numbers, skip, None if limit is None else skip + limit)
+            skip = 0
+        with open(self.log_path, 'rb') as f:
+            for entry in self._entries(f, numbers, pattern):
+                if skip:
+                    skip -= 1
+                    continue
+                if limit is not None:
+                    if limit <= 0:
+                        return
+                    limit -= 1
+                yield entry
+
+    # Read the entries behind a sequence of entry numbers, grouping neighbours so each run costs one read
+    def _entries(self, f, numbers, pattern):
+        run = []
+        for number in numbers:
+            if run and abs(number - run[-1]) == 1 and len(run) < 256:
+                run.append(number)
+                continue
+            if run:
+                yield from self._filter_run(f, run, pattern)
+            run = [number]
+        if run:
+            yield from self._filter_run(f, run, pattern)
+
+    # Entries of one run that match the text pattern, in the run's order
+    def _filter_run(self, f, run, pattern):
+        entries = self._read_run(f, min(run[0], run[-1]), max(run[0], run[-1]))
+        if run[0] > run[-1]:
+            entries.reverse()
+        if pattern is None:
+            return entries
+        return [entry for entry in entries if pattern.search(entry.text)]
+
+    # Last `count` matching entries, oldest first
+    def tail(self, count=50, **filters):
+        entries = list(self.query(limit=count, reverse=True, **filters))
+        entries.reverse()
+        return entries
+
+    # One page of matching entries; page 0 is the newest page when newest_first is set
+    def page(self, number, size=50, newest_first=True, **filters):
+        entries = list(self.query(skip=number * size, limit=size, reverse=newest_first, **filters))
+        if newest_first:
+            entries.reverse()
+        return entries
+
+    # Count entries per time bucket and kind without reading the log
+    #   bucket: bucket width in seconds (60 gives per-minute counts)
+    # Returns {bucket start (unix seconds): Counter(kind -> count)} in time order
+    def stats(self, start=None, end=None, bucket=60, levels=None, kinds=DETECTION_KINDS):
+        self.refresh()
+        buckets = {}
+        for number in self._candidates(start, end, levels, kinds, False):
+            _, stamp, _, kind = self.record(number)
+            key = stamp - stamp % bucket
+            counts = buckets.get(key)
+            if counts is None:
+                counts = buckets[key] = Counter()
+            counts[KINDS[kind]] += 1
+        return dict(sorted(buckets.items()))
+
+    # Draw per-bucket counts of each kind as a timeline image (needs matplotlib)
+    # Returns the path written
+    def plot_timeline(self, out_path='defender_log_timeline.png', start=None, end=None, bucket=60,
+                      kinds=DETECTION_KINDS, levels=None):
+        try:
+            import matplotlib
+            matplotlib.use('Agg')
+            import matplotlib.pyplot as plt
+            import matplotlib.dates as mdates
+        except ImportError:
+            raise RuntimeError('plotting the timeline requires matplotlib (pip install matplotlib)')
+        from datetime import datetime
+        buckets = self.stats(start, end, bucket, levels, kinds)
+        times = [datetime.fromtimestamp(key) for key in buckets]
+        names = sorted({kind for counts in buckets.values() for kind in counts})
+        fig, ax = plt.subplots(figsize=(10, 6))
+        for kind in names:
+            ax.plot(times, [counts.get(kind, 0) for counts in buckets.values()], marker='o', linestyle='--',
+                    alpha=0.7, label=kind)
+        ax.set_title('Defender Log Events Timeline')
+        ax.set_xlabel('Time')
+        ax.set_ylabel(f'Events per {bucket:g}s')
+        ax.grid(alpha=0.3)
+        if names:
+            ax.legend()
+        ax.xaxis.set_major_formatter(mdates.DateFormatter('%d %H:%M'))
+        fig.autofmt_xdate(rotation=45)
+        fig.tight_layout()
+        fig.savefig(out_path)
+        plt.close(fig)
+        return out_path
+
+
+# Shared filter options of the query subcommands
+def _add_filters(parser):
+    parser.add_argument('--log', default=events.DEFAULT_LOG_PATH, help='log file (default: %(default)s)')
+    parser.add_argument('--since', help="start time, e.g. '2025-09-02 23:00'")
+    parser.add_argument('--until', help='end time (exclusive)')
+    parser.add_argument('--level', action='append', help='only this level (repeatable)')
+    parser.add_argument('--kind', action='append', choices=KINDS, help='only this event kind (repeatable)')
+
+
+# Command-line entry point
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Query defender.log through its sidecar index')
+    sub = parser.add_subparsers(dest='command', required=True)
+    tail = sub.add_parser('tail', help='show the newest entries')
+    tail.add_argument('-n', type=int, default=50, help='number of entries')
+    tail.add_argument('--grep', help='regular expression the entry must contain')
+    _add_filters(tail)
+    query = sub.add_parser('query', help='show one page of matching entries, oldest first')
+    query.add_argument('--page', type=int, default=0)
+    query.add_argument('--page-size', type=int, default=50)
+    query.add_argument('--grep', help='regular expression the entry must contain')
+    _add_filters(query)
+    stats = sub.add_parser('stats', help='count events per time bucket and kind')
+    stats.add_argument('--bucket', type=float, default=60, help='bucket width in seconds')
+    _add_filters(stats)
+    plot = sub.add_parser('plot', help='write a timeline image (needs matplotlib)')
+    plot.add_argument('--out', default='defender_log_timeline.png')
+    plot.add_argument('--bucket', type=float, default=60, help='bucket width in seconds')
+    _add_filters(plot)
+    args = parser.parse_args(argv)
+
+    index = LogIndex(args.log)
+    filters = {'start': args.since, 'end': args.until, 'levels': args.level}
+    try:
+        if args.command in ('tail', 'query'):
+            filters.update(kinds=args.kind, pattern=args.grep)
+            if args.command == 'tail':
+                entries = index.tail(args.n, **filters)
+            else:
+                entries = list(index.query(skip=args.page * args.page_size, limit=args.page_size, **filters))
+            for entry in entries:
+                print(entry.text)
+        elif args.command == 'stats':
+            for key, counts in index.stats(bucket=args.bucket, kinds=args.kind or DETECTION_KINDS,
+                                           **filters).items():
+                stamp = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(key))
+                print(stamp + '  ' + ', '.join(f'{kind}={count}' for kind, count in sorted(counts.items())))
+        else:
+            print(index.plot_timeline(args.out, bucket=args.bucket, kinds=args.kind or DETECTION_KINDS,
+                                      **filters))
+    except (LogQueryError, RuntimeError, re.error) as e:
+        print(f'error: {e}', file=sys.stderr)
+        return 2
+    except FileNotFoundError:
+        print(f'error: {args.log} not found', file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
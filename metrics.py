@@ -0,0 +1,433 @@
+# Metrics and profiling for the Intelligent Defence System
+# Counters, gauges and latency histograms for every hot path (walk, stat, hash, lookup, action,
+# process snapshot, network accept and verdict), exported in the Prometheus text format over a local
+# HTTP endpoint and as a periodically rewritten snapshot file, plus a sampling profiler that can be
+# switched on and off while the defender runs
+# Developed for monitoring and threat response for the Indian Armed Forces
+
+import os  # Atomic snapshot replacement
+import sys  # Thread frames for the sampling profiler
+import time  # Sampling interval and snapshot timing
+import bisect  # Finds the histogram bucket of an observation
+import threading  # Metric locks, exporter and profiler threads
+from collections import Counter as _Tally  # Stack sample counts
+# http.server is imported by MetricsServer, so importing this module stays cheap for short-lived scans
+
+# Per-file latencies on the cached (warm) path, stat and verdict cache lookup, are timed on one call in
+# this many so a rescan of an unchanged tree stays within a few percent of its uninstrumented speed
+LATENCY_SAMPLE_EVERY = 16
+
+# Default latency buckets in seconds, 50 us to 10 s
+LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0)
+
+# Default address of the metrics endpoint; loopback only, nothing is exposed to the network
+DEFAULT_METRICS_HOST = '127.0.0.1'
+DEFAULT_METRICS_PORT = 9464
+
+# Default snapshot file, in the format read by the node_exporter textfile collector
+DEFAULT_SNAPSHOT_PATH = 'defender_metrics.prom'
+
+
+# Escape a label value for the text format
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+# Render a label set as {a="1",b="2"}
+def _labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)] + [f'{n}="{v}"' for n, v in extra]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+# Base of every metric: a name, help text and optional label names with one child per label value set
+class _Metric:
+    kind = 'untyped'
+    function = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children = {}
+
+    # Child metric for one set of label values, e.g. LOOKUP_SECONDS.labels('cache')
+    def labels(self, *values):
+        values = tuple(str(v) for v in values)
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    # (label values, child) pairs to export; an unlabelled metric is its own only child
+    def _samples(self):
+        if self.labelnames:
+            return sorted(self._children.items())
+        return [((), self)]
+
+    # Compute the value from a callable each time the metric is exported
+    # Used for values another object already counts, such as the verdict cache hits
+    def set_function(self, function):
+        self.function = function
+
+    # Exported value: the result of the function if one is set, otherwise the stored value
+    def _current(self):
+        if self.function is None:
+            return self.value
+        try:
+            return self.function()
+        except Exception:
+            return float('nan')
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for values, child in self._samples():
+            lines.extend(child._render_child(self.name, self.labelnames, values))
+        return lines
+
+
+# Monotonically increasing count
+class Counter(_Metric):
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self.value = 0
+
+    def _new_child(self):
+        return Counter(self.name, self.documentation)
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def _render_child(self, name, labelnames, values):
+        return [f'{name}{_labels(labelnames, values)} {self._current()}']
+
+
+# Value that can go up and down; `function` makes it computed at export time
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), function=None):
+        super().__init__(name, documentation, labelnames)
+        self.value = 0
+        self.function = function
+
+    def _new_child(self):
+        return Gauge(self.name, self.documentation)
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def _render_child(self, name, labelnames, values):
+        return [f'{name}{_labels(labelnames, values)} {self._current()}']
+
+
+# Distribution of observed values (latencies in seconds by default) over fixed buckets
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        # One count per bucket plus the +Inf overflow bucket; exported cumulatively
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def _new_child(self):
+        return Histogram(self.name, self.documentation, buckets=self.buckets)
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    # Context manager timing the enclosed block
+    def time(self):
+        return _Timer(self)
+
+    # Approximate quantile (0-1) from the bucket counts, as an upper bucket bound
+    def quantile(self, q):
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        running = 0
+        for bound, count in zip(self.buckets, self.counts):
+            running += count
+            if running >= target:
+                return bound
+        return float('inf')
+
+    def _render_child(self, name, labelnames, values):
+        lines = []
+        running = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            running += count
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            lines.append(f'{name}_bucket{_labels(labelnames, values, [("le", le)])} {running}')
+        lines.append(f'{name}_sum{_labels(labelnames, values)} {self.sum}')
+        lines.append(f'{name}_count{_labels(labelnames, values)} {self.count}')
+        return lines
+
+
+# Times a block into a histogram
+class _Timer:
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+# Set of metrics exported together
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    # Add a metric, or return the one already registered under its name
+    def register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=(), function=None):
+        return self.register(Gauge(name, documentation, labelnames, function))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    # Every metric in the Prometheus text exposition format
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+# Registry shared by every module of the defence system
+REGISTRY = Registry()
+
+# Hot-path metrics, one group per stage
+WALK_SECONDS = REGISTRY.counter('defender_walk_seconds_total', 'Seconds spent listing directories')
+WALK_DIRECTORIES = REGISTRY.counter('defender_walk_directories_total', 'Directories listed by the walker')
+STAT_SECONDS = REGISTRY.histogram('defender_stat_seconds', 'Latency of stat calls made by the walker (sampled)')
+HASH_SECONDS = REGISTRY.histogram('defender_hash_seconds', 'Latency of the single-pass read and hash of a file')
+HASHED_BYTES = REGISTRY.counter('defender_hashed_bytes_total', 'Bytes read by the hashing pass')
+LOOKUP_SECONDS = REGISTRY.histogram('defender_lookup_seconds',
+                                    'Latency of verdict cache (sampled) and signature lookups', ['store'])
+CACHE_RESULTS = REGISTRY.counter('defender_cache_lookups_total', 'Verdict cache lookups by result', ['result'])
+VERDICTS = REGISTRY.counter('defender_verdicts_total', 'Scanned files by verdict', ['verdict'])
+ACTION_SECONDS = REGISTRY.histogram('defender_action_seconds', 'Latency of response actions', ['action'])
+ACTIONS = REGISTRY.counter('defender_actions_total', 'Response actions by outcome', ['action', 'outcome'])
+PROCESS_SNAPSHOT_SECONDS = REGISTRY.histogram('defender_process_snapshot_seconds',
+                                              'Latency of one process-table snapshot and diff')
+PROCESSES_INSPECTED = REGISTRY.counter('defender_processes_inspected_total', 'New processes inspected')
+PROCESSES_KNOWN = REGISTRY.gauge('defender_processes', 'Processes in the last snapshot')
+NETWORK_CONNECTIONS = REGISTRY.counter('defender_network_connections_total', 'Connections accepted by verdict',
+                                       ['verdict'])
+NETWORK_VERDICT_SECONDS = REGISTRY.histogram('defender_network_verdict_seconds',
+                                             'Latency from accept to verdict of a connection')
+TASK_SECONDS = REGISTRY.histogram('defender_task_seconds', 'Run time of scheduled defence tasks', ['task'])
+TASK_MISSED = REGISTRY.gauge('defender_task_missed_ticks', 'Ticks skipped because a task overran', ['task'])
+
+
+# Local HTTP endpoint serving the registry and the profiler
+#   GET /metrics          Prometheus text
+#   GET /profile          profiler report (top functions and folded stacks)
+#   GET /profile/start    start sampling; /profile/stop stops it
+class MetricsServer:
+    def __init__(self, host=DEFAULT_METRICS_HOST, port=DEFAULT_METRICS_PORT, registry=REGISTRY, profiler=None):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        self.registry = registry
+        self.profiler = profiler if profiler is not None else SamplingProfiler()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split('?', 1)[0]
+                if path == '/metrics':
+                    body, content_type = server.registry.render(), 'text/plain; version=0.0.4'
+                elif path == '/profile/start':
+                    server.profiler.start()
+                    body, content_type = 'profiler started\n', 'text/plain'
+                elif path == '/profile/stop':
+                    server.profiler.stop()
+                    body, content_type = 'profiler stopped\n', 'text/plain'
+                elif path == '/profile':
+                    body, content_type = server.profiler.report(), 'text/plain'
+                else:
+                    self.send_error(404)
+                    return
+                data = body.encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            # Requests are not written to stderr
+            def log_message(self, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer((host, port), Handler)
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    # Port actually bound (useful with port 0)
+    @property
+    def port(self):
+        return self._httpd.server_address[1]
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name='metrics-http', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        self.profiler.stop()
+
+
+# Rewrites a snapshot of the registry every `interval` seconds (atomically, via a temporary file)
+class SnapshotWriter:
+    def __init__(self, path=DEFAULT_SNAPSHOT_PATH, interval=15.0, registry=REGISTRY):
+        self.path = path
+        self.interval = interval
+        self.registry = registry
+        self._stop = threading.Event()
+        self._thread = None
+
+    # Write one snapshot now
+    def write(self):
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(self.registry.render())
+        os.replace(tmp_path, self.path)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.write()
+            except OSError:
+                pass
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='metrics-snapshot', daemon=True)
+        self._thread.start()
+        return self
+
+    # Stop and write a final snapshot
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        try:
+            self.write()
+        except OSError:
+            pass
+
+
+# Statistical profiler sampling every thread's stack from a background thread
+# Costs nothing while stopped; while running, one sys._current_frames() call per interval
+#   interval: seconds between samples; depth: frames kept per stack
+class SamplingProfiler:
+    def __init__(self, interval=0.005, depth=32):
+        self.interval = interval
+        self.depth = depth
+        # Folded stack ('outer;inner') -> samples, and innermost function -> samples
+        self.stacks = _Tally()
+        self.functions = _Tally()
+        self.samples = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    # Start sampling (no-op if already running)
+    def start(self):
+        with self._lock:
+            if self.running:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+            self._thread.start()
+
+    # Stop sampling; collected samples are kept until reset()
+    def stop(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stop.set()
+            thread.join()
+
+    def reset(self):
+        with self._lock:
+            self.stacks.clear()
+            self.functions.clear()
+            self.samples = 0
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            with self._lock:
+                for ident, frame in frames.items():
+                    if ident == own:
+                        continue
+                    names = []
+                    while frame is not None and len(names) < self.depth:
+                        code = frame.f_code
+                        names.append(f'{os.path.basename(code.co_filename)}:{code.co_name}')
+                        frame = frame.f_back
+                    if not names:
+                        continue
+                    self.functions[names[0]] += 1
+                    self.stacks[';'.join(reversed(names))] += 1
+                self.samples += 1
+
+    # Folded stacks, one 'frame;frame count' line each (input of flamegraph.pl and speedscope)
+    def folded(self):
+        with self._lock:
+            return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+    # Human-readable summary of the busiest functions
+    def report(self, limit=25):
+        with self._lock:
+            total = sum(self.functions.values())
+            lines = [f'samples: {self.samples}, running: {self.running}']
+            for name, count in self.functions.most_common(limit):
+                lines.append(f'{count / total:7.1%}  {count:>8}  {name}')
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,267 @@
+# Single-pass content scanner for the Intelligent Defence System
+# Reads each file once and feeds the same buffers to several digests and a multi-pattern byte matcher
+# Developed for monitoring and threat response for the Indian Armed Forces
+
+import re  # Literal searches run in C directly over the read buffers
+import json  # Rules file format
+import hashlib  # Digest algorithms computed in the single pass
+from collections import deque, namedtuple  # Automaton construction queue and the per-file result record
+from hash_io import DEFAULT_IO, read_file, digest_file  # Pluggable read strategies with page-cache hints
+
+# Default location of the byte-pattern rules file
+DEFAULT_RULES_PATH = 'rules.json'
+
+# Digest algorithms that signature feeds publish and their digest sizes in bytes
+DIGEST_SIZES = {'sha256': 32, 'sha1': 20, 'md5': 16}
+
+# Outcome of scanning one file: digests maps algorithm -> raw digest, matches maps rule name -> offset
+# size is the number of bytes read, or None when hashlib.file_digest did the reading
+# archive is the archive_scan.ArchiveReport of the members when the file was scanned as an archive
+# head holds the first SNIFF_BYTES bytes, or None when hashlib.file_digest did the reading
+ScanResult = namedtuple('ScanResult', ['digests', 'matches', 'size', 'archive', 'head'], defaults=(None, None))
+
+# Leading bytes kept from every scanned file, enough for archive_scan.sniff_format to recognise an archive
+# by its magic bytes whatever the file is called, without reading the file a second time
+SNIFF_BYTES = 512
+
+
+# Largest rule set matched by searching each buffer once per pattern; every search is a compiled literal regex
+# run in C over the buffer itself (no copy) at several hundred MB/s, so the set beats the automaton's per-byte
+# Python loop (about 20 MB/s) up to a few dozen patterns. One regex alternation of all the patterns is not used:
+# the regex engine tries every branch at every position, which measured slower than the automaton from ~16 up
+SEARCH_MAX_RULES = 32
+
+# Automaton nodes this shallow get a full 256-entry transition list, up to AUTOMATON_DENSE_NODES of them
+# (about 2 KiB each); deeper nodes, which ordinary data rarely reaches, keep only their own edges
+AUTOMATON_DENSE_DEPTH = 3
+AUTOMATON_DENSE_NODES = 4096
+
+
+# Raised when a rules file is malformed
+class RulesError(ValueError):
+    pass
+
+
+# Aho-Corasick automaton over bytes: one transition per input byte, whatever the number of patterns
+# Node 0 is the root; each node lists the (name, length) of every pattern ending there, suffixes included
+class _Automaton:
+    # patterns: [(pattern bytes, rule name)] with distinct patterns
+    def __init__(self, patterns):
+        edges = [{}]
+        depth = [0]
+        outputs = [[]]
+        for pattern, name in patterns:
+            node = 0
+            for byte in pattern:
+                child = edges[node].get(byte)
+                if child is None:
+                    child = len(edges)
+                    edges[node][byte] = child
+                    edges.append({})
+                    depth.append(depth[node] + 1)
+                    outputs.append([])
+                node = child
+            outputs[node].append((name, len(pattern)))
+        self._fail = fail = [0] * len(edges)
+        # rows[node][byte] is the next node: a list for dense nodes, a dict of own edges otherwise
+        self._rows = rows = [None] * len(edges)
+        rows[0] = [edges[0].get(byte, 0) for byte in range(256)]
+        dense = 1
+        # Breadth first, so every failure link points at a node whose row is already built
+        order = deque(edges[0].values())
+        while order:
+            node = order.popleft()
+            for byte, child in edges[node].items():
+                fail[child] = self._next(fail[node], byte) if node else 0
+                outputs[child].extend(outputs[fail[child]])
+                order.append(child)
+            if depth[node] < AUTOMATON_DENSE_DEPTH and dense < AUTOMATON_DENSE_NODES:
+                base = rows[fail[node]]
+                row = list(base) if isinstance(base, list) else \
+                    [self._next(fail[node], byte) for byte in range(256)]
+                for byte, child in edges[node].items():
+                    row[byte] = child
+                rows[node] = row
+                dense += 1
+            else:
+                rows[node] = edges[node]
+        self._outputs = [tuple(output) for output in outputs]
+        self._accepting = [bool(output) for output in outputs]
+
+    # Next node from `node` on `byte`, following failure links through sparse nodes
+    def _next(self, node, byte):
+        rows, fail = self._rows, self._fail
+        while True:
+            row = rows[node]
+            if isinstance(row, list):
+                return row[byte]
+            child = row.get(byte)
+            if child is not None:
+                return child
+            node = fail[node]
+
+    # Run one buffer from `node`; matches are rare, so a buffer is only walked a second time,
+    # with positions, when the first walk reached an accepting node
+    def feed(self, buffer, offset, node, matches):
+        rows, fail, accepting = self._rows, self._fail, self._accepting
+        start = node
+        hit = False
+        for byte in buffer:
+            try:
+                node = rows[node][byte]
+            except KeyError:
+                node = self._next(fail[node], byte)
+            if accepting[node]:
+                hit = True
+        if hit:
+            outputs = self._outputs
+            node = start
+            for position, byte in enumerate(buffer, offset + 1):
+                try:
+                    node = rows[node][byte]
+                except KeyError:
+                    node = self._next(fail[node], byte)
+                for name, length in outputs[node]:
+                    matches.setdefault(name, position - length)
+        return node
+
+
+# Multi-pattern byte matcher over a stream of buffers
+# Rule sets of up to SEARCH_MAX_RULES patterns are searched pattern by pattern, without copying the buffer; the
+# cost grows with every pattern, so larger sets fall back to an Aho-Corasick automaton whose cost per byte does
+# not depend on the number of patterns. Both carry their state across buffers (the searches keep the last
+# max_len - 1 bytes, the automaton its current node), so matches spanning buffers are found
+class PatternMatcher:
+    # rules: iterable of (name, pattern bytes)
+    def __init__(self, rules):
+        self.rules = [(name, bytes(pattern)) for name, pattern in rules if pattern]
+        self.max_len = max((len(p) for _, p in self.rules), default=0)
+        # Distinct patterns and the rule reported for each, the first rule listing it
+        names = {}
+        for name, pattern in self.rules:
+            names.setdefault(pattern, name)
+        self._patterns = list(names.items())
+        self._automaton = _Automaton(self._patterns) if len(self._patterns) > SEARCH_MAX_RULES else None
+        self._searches = [] if self._automaton is not None else \
+            [(re.compile(re.escape(pattern)).search, name) for pattern, name in self._patterns]
+        # State to pass to the first feed() of a stream
+        self.initial = 0 if self._automaton is not None else b''
+        # Fingerprint of the rule set, used to invalidate cached verdicts when rules change
+        h = hashlib.sha256()
+        for name, pattern in sorted(self.rules):
+            h.update(name.encode('utf-8') + b'\0' + pattern + b'\n')
+        self.fingerprint = h.hexdigest()
+
+    # Load rules from a JSON file of the form
+    #   {"rules": [{"name": "...", "hex": "4d5a..."}, {"name": "...", "text": "..."}]}
+    # A missing file yields an empty matcher
+    @classmethod
+    def load(cls, path=DEFAULT_RULES_PATH):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                document = json.load(f)
+        except FileNotFoundError:
+            return cls(())
+        except (OSError, ValueError) as e:
+            raise RulesError(f'{path}: {e}') from e
+        rules = []
+        for i, rule in enumerate(document.get('rules', []) if isinstance(document, dict) else ()):
+            name = rule.get('name') if isinstance(rule, dict) else None
+            if not name:
+                raise RulesError(f'{path}: rule {i} has no name')
+            try:
+                if 'hex' in rule:
+                    pattern = bytes.fromhex(rule['hex'])
+                elif 'text' in rule:
+                    pattern = rule['text'].encode('utf-8')
+                else:
+                    raise RulesError(f'{path}: rule {name!r} needs "hex" or "text"')
+            except (ValueError, AttributeError) as e:
+                raise RulesError(f'{path}: rule {name!r}: {e}') from e
+            if not pattern:
+                raise RulesError(f'{path}: rule {name!r} has an empty pattern')
+            rules.append((name, pattern))
+        return cls(rules)
+
+    # True when there is at least one pattern to look for
+    def __bool__(self):
+        return bool(self._patterns)
+
+    # Scan one buffer at stream offset `offset`, updating `matches` with first-seen offsets
+    # `tail` is the state returned by the previous call (self.initial for the first buffer of a stream);
+    # returns the state for the next call
+    def feed(self, buffer, offset, tail, matches):
+        if self._automaton is not None:
+            return self._automaton.feed(buffer, offset, tail, matches)
+        if not self._patterns:
+            return b''
+        keep = self.max_len - 1
+        # Seam between the previous buffers and this one, for matches that straddle both; only the seam is copied
+        if tail:
+            seam = tail + bytes(buffer[:keep])
+            for search, name in self._searches:
+                if name not in matches:
+                    found = search(seam)
+                    if found is not None and found.start() < len(tail):
+                        matches[name] = offset - len(tail) + found.start()
+        # The buffer itself (bytes, bytearray or a memoryview of the read buffer) is searched in place
+        for search, name in self._searches:
+            if name not in matches:
+                found = search(buffer)
+                if found is not None:
+                    matches[name] = offset + found.start()
+        if not keep:
+            return b''
+        if len(buffer) >= keep:
+            return bytes(buffer[len(buffer) - keep:])
+        # Buffers shorter than the carried bytes extend the tail rather than replace it
+        return (tail + bytes(buffer))[-keep:]
+
+
+# Incremental single pass over a stream of buffers: every digest and the pattern matcher see each buffer once
+# Used by scan_file_once for files and by archive_scan for decompressed archive members
+class ContentScan:
+    def __init__(self, algorithms=('sha256',), matcher=None):
+        self._hashers = [(name, hashlib.new(name)) for name in algorithms]
+        self._updates = [hasher.update for _, hasher in self._hashers]
+        self._matcher = matcher if matcher else None
+        self._tail = matcher.initial if matcher else None
+        self.matches = {}
+        self.head = b''
+        # Bytes fed so far, which is also the stream offset of the next buffer
+        self.offset = 0
+
+    # Feed one buffer to every digest and to the matcher
+    def feed(self, chunk):
+        for update in self._updates:
+            update(chunk)
+        if self._matcher is not None:
+            self._tail = self._matcher.feed(chunk, self.offset, self._tail, self.matches)
+        if self.offset < SNIFF_BYTES:
+            self.head += bytes(chunk[:SNIFF_BYTES - self.offset])
+        self.offset += len(chunk)
+
+    # ScanResult of everything fed so far
+    def result(self):
+        return ScanResult({name: hasher.digest() for name, hasher in self._hashers}, self.matches, self.offset,
+                          head=self.head)
+
+
+# Read a file once and compute every requested digest and pattern match from the same buffers
+# `io` selects the hash_io read strategy and page-cache behaviour
+# Returns a ScanResult, or None if the file cannot be read
+def scan_file_once(file_path, algorithms=('sha256',), matcher=None, io=DEFAULT_IO):
+    if matcher is not None and not matcher:
+        matcher = None
+    # A lone digest with no patterns can use hashlib.file_digest directly
+    if io.strategy == 'file_digest' and matcher is None and len(algorithms) == 1:
+        digest = digest_file(file_path, algorithms[0], io)
+        if digest is None:
+            return None
+        return ScanResult({algorithms[0]: digest}, {}, None)
+    scan = ContentScan(algorithms, matcher)
+    try:
+        read_file(file_path, scan.feed, io)
+    except (OSError, ValueError):
+        return None
+    return scan.result()
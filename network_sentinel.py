@@ -0,0 +1,307 @@
+# Persistent network sentinel for the Intelligent Defence System
+# A long-lived asyncio listener on configured ports that stream-matches payload patterns,
+# enforces per-connection deadlines and byte limits, and blocks offending addresses by CIDR with expiry
+# Run "python network_sentinel.py bench" for a loopback load test
+# Developed for monitoring and threat response for the Indian Armed Forces
+
+import sys  # Command-line exit status
+import time  # Verdict latency and blocklist expiry
+import asyncio  # Event loop serving thousands of concurrent connections
+import logging  # Levels of the detection events
+import events  # Detection event kinds and the shared logger
+import argparse  # Load generator command-line options
+import ipaddress  # Parses addresses and CIDR networks
+import threading  # Runs the event loop beside the synchronous defence loop
+from collections import deque  # Bounded window of recent verdict latencies
+from multiscan import PatternMatcher  # Same streaming multi-pattern matcher as the file scanner
+from metrics import NETWORK_CONNECTIONS, NETWORK_VERDICT_SECONDS  # Accept and verdict metrics
+
+# Payload patterns flagged by default (the original placeholder check)
+DEFAULT_PATTERNS = [('malicious', b'malicious')]
+
+# Default address and ports the sentinel listens on; loopback unless a caller asks for more
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORTS = [8888]
+
+
+# Blocklist of addresses and CIDR networks with optional per-entry expiry
+# Entries are kept in one hash table per prefix length, so a lookup costs one probe per length in use
+# The sentinel's event loop adds and looks up entries while the defence loop expires them, so every access
+# holds a lock
+class IPBlocklist:
+    def __init__(self, default_ttl=None):
+        self.default_ttl = default_ttl
+        # (version, prefix length) -> {network address as int: expiry time or None}
+        self._tables = {}
+        self._lock = threading.Lock()
+
+    # Block an address or network (e.g. '10.0.0.0/8') for `ttl` seconds, or forever when ttl is None
+    def add(self, address, ttl=None):
+        network = ipaddress.ip_network(address, strict=False)
+        ttl = self.default_ttl if ttl is None else ttl
+        expiry = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            table = self._tables.setdefault((network.version, network.prefixlen), {})
+            table[int(network.network_address)] = expiry
+
+    # Unblock an address or network previously added
+    def discard(self, address):
+        network = ipaddress.ip_network(address, strict=False)
+        with self._lock:
+            table = self._tables.get((network.version, network.prefixlen))
+            if table is not None:
+                table.pop(int(network.network_address), None)
+
+    # True when the address falls inside a blocked, unexpired network
+    def __contains__(self, address):
+        try:
+            ip = ipaddress.ip_address(address)
+        except ValueError:
+            return False
+        # Treat IPv4-mapped IPv6 addresses (dual-stack sockets) as their IPv4 form
+        if ip.version == 6 and ip.ipv4_mapped is not None:
+            ip = ip.ipv4_mapped
+        value = int(ip)
+        bits = ip.max_prefixlen
+        now = time.monotonic()
+        with self._lock:
+            for (version, prefixlen), table in self._tables.items():
+                if version != ip.version:
+                    continue
+                key = value >> (bits - prefixlen) << (bits - prefixlen) if prefixlen else 0
+                if key in table:
+                    expiry = table[key]
+                    if expiry is None or expiry > now:
+                        return True
+        return False
+
+    # Drop expired entries; returns how many were removed
+    def expire(self):
+        now = time.monotonic()
+        removed = 0
+        with self._lock:
+            for table in self._tables.values():
+                for key in [k for k, expiry in table.items() if expiry is not None and expiry <= now]:
+                    del table[key]
+                    removed += 1
+        return removed
+
+    # Number of entries, including ones that have expired but not yet been dropped
+    def __len__(self):
+        with self._lock:
+            return sum(len(table) for table in self._tables.values())
+
+
+# Long-lived listener that inspects incoming connections
+#   host / ports: where to listen; pass '0.0.0.0' (or '::') explicitly to accept connections from other hosts
+#   patterns: (name, bytes) payload patterns; the first match blocks the sender
+#   read_timeout: seconds a connection gets in total to deliver its payload, so a peer trickling bytes cannot
+#                 hold the connection open by never quite going idle
+#   max_bytes: bytes inspected per connection before it is closed
+#   block_ttl: seconds an offending address stays blocked (None for forever)
+#   event_pipeline: EventPipeline receiving connection events; without one they go straight to the shared logger
+class NetworkSentinel:
+    def __init__(self, host=DEFAULT_HOST, ports=DEFAULT_PORTS, patterns=DEFAULT_PATTERNS, blocklist=None,
+                 read_timeout=5.0, max_bytes=64 * 1024, block_ttl=3600.0, backlog=4096,
+                 event_pipeline=None):
+        self.host = host
+        self.ports = list(ports)
+        self.matcher = PatternMatcher(patterns)
+        self.blocklist = blocklist if blocklist is not None else IPBlocklist()
+        self.read_timeout = read_timeout
+        self.max_bytes = max_bytes
+        self.block_ttl = block_ttl
+        self.backlog = backlog
+        self.events = event_pipeline
+        # Counters and a window of recent accept-to-verdict latencies in seconds
+        self.connections = 0
+        self.blocked = 0
+        self.suspicious = 0
+        self.latencies = deque(maxlen=100000)
+        self._loop = None
+        self._servers = []
+        self._thread = None
+        self._ready = threading.Event()
+        self._error = None
+
+    # Ports actually bound (useful when port 0 asks the OS to pick one)
+    @property
+    def bound_ports(self):
+        return [s.getsockname()[1] for server in self._servers for s in server.sockets]
+
+    # Report a connection event through the pipeline, or the shared logger when there is none
+    def _emit(self, kind, level, message, address):
+        if self.events is not None:
+            self.events.emit(kind, level, message, address=address)
+        else:
+            events.logger.log(level, message)
+
+    # Handle one connection: reject blocked senders, otherwise stream-match the payload
+    async def _handle(self, reader, writer):
+        accepted = time.perf_counter()
+        self.connections += 1
+        peer = writer.get_extra_info('peername')
+        address = peer[0] if peer else ''
+        verdict = 'clean'
+        try:
+            if address in self.blocklist:
+                self.blocked += 1
+                verdict = 'blocked'
+                self._emit(events.CONNECTION_BLOCKED, logging.INFO, f"Blocked connection from: {address}", address)
+                return
+            matches, tail, offset = {}, self.matcher.initial, 0
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + self.read_timeout
+            while offset < self.max_bytes and not matches:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    data = await asyncio.wait_for(reader.read(min(4096, self.max_bytes - offset)), remaining)
+                except asyncio.TimeoutError:
+                    break
+                if not data:
+                    break
+                tail = self.matcher.feed(data, offset, tail, matches)
+                offset += len(data)
+            if matches:
+                self.suspicious += 1
+                verdict = 'suspicious'
+                # A peer without an IP address (none reported, or not parsable) cannot be blocked; still report it
+                try:
+                    self.blocklist.add(address, self.block_ttl)
+                except ValueError:
+                    address = address or 'unknown peer'
+                self._emit(events.SUSPICIOUS_CONNECTION, logging.WARNING, f"Suspicious connection from: {address}",
+                           address)
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            latency = time.perf_counter() - accepted
+            self.latencies.append(latency)
+            NETWORK_VERDICT_SECONDS.observe(latency)
+            NETWORK_CONNECTIONS.labels(verdict).inc()
+            writer.close()
+
+    # Bind every configured port on the running loop
+    async def _start_servers(self):
+        for port in self.ports:
+            server = await asyncio.start_server(self._handle, self.host, port, backlog=self.backlog,
+                                                reuse_address=True)
+            self._servers.append(server)
+
+    # Event loop thread body
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._loop.run_until_complete(self._start_servers())
+        except OSError as e:
+            self._error = e
+            self._ready.set()
+            self._loop.close()
+            return
+        self._ready.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            for server in self._servers:
+                server.close()
+            # Cancel connections still being inspected so the loop can close cleanly
+            pending = asyncio.all_tasks(self._loop)
+            for task in pending:
+                task.cancel()
+            self._loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            self._loop.close()
+
+    # Start listening in a background thread; raises OSError if a port cannot be bound
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._ready.clear()
+        self._error = None
+        self._servers = []
+        self._thread = threading.Thread(target=self._run, name='network-sentinel', daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        if self._error is not None:
+            self._thread.join()
+            self._thread = None
+            raise self._error
+
+    # Stop listening and wait for the loop thread to exit
+    def stop(self):
+        if self._thread is None:
+            return
+        if self._loop is not None and self._loop.is_running():
+            self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._thread = None
+
+    # True while the listener thread is serving
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    # Latency percentile (0-100) over recent connections, in seconds
+    def latency_percentile(self, percentile):
+        values = sorted(self.latencies)
+        if not values:
+            return 0.0
+        return values[min(len(values) - 1, int(len(values) * percentile / 100))]
+
+
+# Loopback load generator: open `connections` connections with at most `concurrency` in flight
+# Every `malicious_every`-th connection sends a matching payload; returns (elapsed seconds, errors)
+async def generate_load(host, port, connections=5000, concurrency=500, malicious_every=10):
+    limit = asyncio.Semaphore(concurrency)
+    errors = 0
+
+    async def one(i):
+        nonlocal errors
+        async with limit:
+            try:
+                reader, writer = await asyncio.open_connection(host, port)
+                payload = b'GET / malicious\r\n' if malicious_every and i % malicious_every == 0 else b'GET /\r\n'
+                writer.write(payload)
+                await writer.drain()
+                writer.write_eof()
+                await reader.read()
+                writer.close()
+            except OSError:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(connections)))
+    return time.perf_counter() - start, errors
+
+
+# Command-line entry point: run a local sentinel and hammer it from loopback
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Network sentinel loopback load test')
+    sub = parser.add_subparsers(dest='command', required=True)
+    bench = sub.add_parser('bench', help='measure connections/s and accept-to-verdict latency')
+    bench.add_argument('--connections', type=int, default=5000)
+    bench.add_argument('--concurrency', type=int, default=500)
+    bench.add_argument('--malicious-every', type=int, default=0,
+                       help='send a matching payload every N connections (0: never, so nothing is blocked)')
+    args = parser.parse_args(argv)
+
+    sentinel = NetworkSentinel(DEFAULT_HOST, [0], block_ttl=None)
+    sentinel.start()
+    try:
+        port = sentinel.bound_ports[0]
+        elapsed, errors = asyncio.run(generate_load('127.0.0.1', port, args.connections, args.concurrency,
+                                                    args.malicious_every))
+    finally:
+        sentinel.stop()
+    print(f'connections: {sentinel.connections} in {elapsed:.2f}s '
+          f'({sentinel.connections / elapsed if elapsed else 0:.0f}/s), client errors: {errors}')
+    print(f'suspicious: {sentinel.suspicious}, blocked: {sentinel.blocked}')
+    print(f'accept-to-verdict p50: {sentinel.latency_percentile(50) * 1000:.2f} ms, '
+          f'p99: {sentinel.latency_percentile(99) * 1000:.2f} ms')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,130 @@
+# Incremental process monitor for the Intelligent Defence System
+# Diffs successive process-table snapshots so only new processes are inspected,
+# and terminates every offender found in a cycle together instead of one at a time
+# Developed for monitoring and threat response for the Indian Armed Forces
+
+import os  # Stat of process executables for the verdict cache
+import time  # Snapshot and termination latency for the metrics
+import re  # Compiled process-name patterns
+import logging  # Levels of the detection events
+import events  # Detection event kinds
+import psutil  # Process table access and batched waiting
+from metrics import (PROCESS_SNAPSHOT_SECONDS, PROCESSES_INSPECTED, PROCESSES_KNOWN,  # Snapshot metrics
+                     ACTION_SECONDS, ACTIONS)  # Termination metrics
+
+
+# Process monitor bound to a SystemDefender, whose verdict cache and scanners check executables
+#   names: exact process names (matched case-insensitively through a set)
+#   patterns: regular expressions matched against process names
+#   grace: seconds offenders get to exit after SIGTERM before being killed
+class ProcessMonitor:
+    def __init__(self, defender, names=(), patterns=(), grace=3.0):
+        self.defender = defender
+        self.names = {name.lower() for name in names}
+        self.pattern = re.compile('|'.join(f'(?:{p})' for p in patterns), re.IGNORECASE) if patterns else None
+        self.grace = grace
+        # (pid, create_time) of every process seen in the previous snapshot
+        self._known = set()
+
+    # Decide whether a new process is malicious; returns a reason string or None
+    def inspect(self, proc):
+        name = proc.info.get('name') or ''
+        if name.lower() in self.names:
+            return 'name'
+        if self.pattern is not None and self.pattern.search(name):
+            return 'pattern'
+        exe = proc.info.get('exe')
+        if exe and self.executable_is_malware(exe):
+            return 'executable'
+        return None
+
+    # Check a process executable through the file-hash path, reusing cached verdicts
+    def executable_is_malware(self, exe):
+        try:
+            st = os.stat(exe)
+        except OSError:
+            return False
+        cached = self.defender.cache.lookup(st)
+        if cached is not None:
+            return cached[1] == 'malware'
+        # Unseen or modified executable: scan it like any other file, which records its verdict
+        result = self.defender.inspect_file(exe)
+        if result is None:
+            return False
+        self.defender.record_result(exe, st, result)
+        return self.defender.detection_reason(result) is not None
+
+    # Take a snapshot, inspect processes that appeared since the last one and terminate offenders
+    # Returns the list of offending psutil.Process objects
+    def scan(self):
+        start = time.perf_counter()
+        current = set()
+        offenders = []
+        inspected = 0
+        for proc in psutil.process_iter(['pid', 'create_time']):
+            key = (proc.info['pid'], proc.info['create_time'])
+            current.add(key)
+            if key in self._known:
+                continue
+            try:
+                # Only new processes pay for the name and executable lookups
+                proc.info.update(proc.as_dict(['name', 'exe']))
+                inspected += 1
+                reason = self.inspect(proc)
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+            if reason is not None:
+                self.defender.events.emit(events.SUSPICIOUS_PROCESS, logging.WARNING,
+                                          f"Suspicious process: {proc.info['name']} (PID: {proc.info['pid']})",
+                                          pid=proc.info['pid'], name=proc.info['name'], reason=reason)
+                offenders.append(proc)
+                # Offenders are re-inspected next cycle if they survive termination
+                current.discard(key)
+        self._known = current
+        PROCESS_SNAPSHOT_SECONDS.observe(time.perf_counter() - start)
+        PROCESSES_INSPECTED.inc(inspected)
+        PROCESSES_KNOWN.set(len(current))
+        if offenders:
+            self.terminate(offenders)
+        return offenders
+
+    # Terminate processes as one batch: SIGTERM to all, one shared wait, then SIGKILL the survivors
+    # A dry-run defender only reports the processes it would have terminated
+    def terminate(self, procs):
+        emit = self.defender.events.emit
+        if self.defender.dry_run:
+            for proc in procs:
+                emit(events.ACTION_SKIPPED, logging.INFO, f"Dry run: not terminating PID: {proc.pid}", pid=proc.pid)
+            ACTIONS.labels('terminate', 'skipped').inc(len(procs))
+            return
+        with ACTION_SECONDS.labels('terminate').time():
+            self._terminate(procs, emit)
+
+    # SIGTERM, shared wait and SIGKILL of a batch of processes (the body of terminate)
+    def _terminate(self, procs, emit):
+        signalled = []
+        for proc in procs:
+            try:
+                proc.terminate()
+                signalled.append(proc)
+            except psutil.NoSuchProcess:
+                emit(events.PROCESS_GONE, logging.INFO, f"Process PID: {proc.pid} already terminated", pid=proc.pid)
+                ACTIONS.labels('terminate', 'gone').inc()
+            except psutil.AccessDenied as e:
+                emit(events.TERMINATE_FAILED, logging.ERROR, f"Failed to terminate PID: {proc.pid}: {e}",
+                     pid=proc.pid, error=str(e))
+                ACTIONS.labels('terminate', 'failed').inc()
+        gone, alive = psutil.wait_procs(signalled, timeout=self.grace)
+        for proc in gone:
+            emit(events.PROCESS_TERMINATED, logging.INFO, f"Terminated process PID: {proc.pid}", pid=proc.pid)
+        ACTIONS.labels('terminate', 'terminated').inc(len(gone))
+        for proc in alive:
+            try:
+                proc.kill()
+            except psutil.NoSuchProcess:
+                pass
+        # Short shared wait so killed processes are reaped before the next snapshot
+        psutil.wait_procs(alive, timeout=1)
+        for proc in alive:
+            emit(events.PROCESS_KILLED, logging.INFO, f"Killed process PID: {proc.pid}", pid=proc.pid)
+        ACTIONS.labels('terminate', 'killed').inc(len(alive))
@@ -6,16 +6,16 @@ import socket
 import threading
 import logging
 from pathlib import Path
+from walker import walk_files
+from signature_store import SignatureDatabase, SignatureStore, DEFAULT_SIGNATURE_PATH
+from raj9 import KNOWN_MALWARE_HASHES as BUILTIN_MALWARE_HASHES
 
 # Set up logging
 logging.basicConfig(filename='defender.log', level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-# Known malware hashes (example, in real use, load from database)
-KNOWN_MALWARE_HASHES = {
-    'e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495991b7852b855',  # example hash
-    '9bf5ce6d9ffa13e30342a62a6dec17fd56556b36f2ceb5533ba9263931311c9b',  # test_malware.exe hash
-    # Add more hashes here
-}
+# Known malware hashes: compiled signature database, falling back to the same built-in examples as raj9
+KNOWN_MALWARE_HASHES = SignatureDatabase(DEFAULT_SIGNATURE_PATH,
+                                         fallback=SignatureStore.from_digests(BUILTIN_MALWARE_HASHES))
 
 # Suspicious file extensions
 SUSPICIOUS_EXTENSIONS = ['.exe', '.dll', '.bat', '.scr', '.pif', '.com']
@@ -28,24 +28,30 @@ class SystemDefender:
         self.scanned_files = set()
         self.blocked_ips = set()
 
-    def calculate_hash(self, file_path):
-        """Calculate SHA256 hash of a file."""
+    def calculate_digest(self, file_path):
+        """Calculate the raw SHA256 digest of a file."""
         hash_sha256 = hashlib.sha256()
         try:
             with open(file_path, 'rb') as f:
                 for chunk in iter(lambda: f.read(4096), b""):
                     hash_sha256.update(chunk)
-            return hash_sha256.hexdigest()
+            return hash_sha256.digest()
         except (OSError, IOError):
             return None
 
+    def calculate_hash(self, file_path):
+        """Calculate SHA256 hash of a file."""
+        digest = self.calculate_digest(file_path)
+        return digest.hex() if digest is not None else None
+
     def scan_file(self, file_path):
         """Scan a file for malware."""
         if file_path in self.scanned_files:
             return
         self.scanned_files.add(file_path)
-        file_hash = self.calculate_hash(file_path)
-        if file_hash and file_hash in KNOWN_MALWARE_HASHES:
+        # Raw digests are looked up directly, without decoding a hex string for every file
+        file_digest = self.calculate_digest(file_path)
+        if file_digest and file_digest in KNOWN_MALWARE_HASHES:
             print(f"Malware detected: {file_path}")
             logging.warning(f"Malware detected: {file_path}")
             self.destroy_file(file_path)
@@ -55,10 +61,8 @@ class SystemDefender:
 
     def scan_directory(self, directory):
         """Scan a directory recursively."""
-        for root, dirs, files in os.walk(directory):
-            for file in files:
-                file_path = os.path.join(root, file)
-                self.scan_file(file_path)
+        for entry in walk_files(directory):
+            self.scan_file(entry.path)
 
     def monitor_processes(self):
         """Monitor running processes."""
@@ -4,23 +4,32 @@
 
 # Import necessary modules for the defence system
 import os  # Provides functions for interacting with the operating system, such as file operations
-import psutil  # Library for retrieving information on running processes and system utilization
 import hashlib  # Module for generating hash values (e.g., SHA256) to identify files
-import time  # Module for time-related functions, used for delays and timestamps
-import socket  # Module for network socket operations, used for basic network monitoring
+import signal  # Module for handling termination signals, used for graceful shutdown
 import threading  # Module for creating and managing threads, though not heavily used here
-import logging  # Module for logging events, used to record defence actions
+import time  # Module for timing scan passes
+import logging  # Module for logging levels used by detection events
 from pathlib import Path  # Object-oriented interface to filesystem paths, used for file extension checks
+from scan_cache import VerdictCache, DEFAULT_CACHE_PATH  # Persistent per-file verdict cache
+from scan_engine import ScanEngine, ScanStats  # Parallel producer/worker hashing engine
+from walker import walk_files  # Streaming scandir-based tree walker with filters
+from scan_queue import ScanQueue  # Risk-ordered scanning in time- and bytes-budgeted cycles
+from signature_store import SignatureDatabase, SignatureStore, DEFAULT_SIGNATURE_PATH  # Memory-mapped signatures
+from hash_io import DEFAULT_IO, digest_file  # Adaptive hashing I/O strategies
+# psutil, the process monitor, the network sentinel (asyncio), the inotify watcher and the scheduler are
+# imported where they are first used, so a one-off file scan does not pay for loading them
+import events  # Non-blocking detection event pipeline and the shared 'defender' logger
+from multiscan import PatternMatcher, scan_file_once, DEFAULT_RULES_PATH, DIGEST_SIZES  # Single-pass scanner
+from archive_scan import scan_archive, is_archive, DEFAULT_ARCHIVE_LIMITS  # Scans inside archives
+import metrics  # Hot-path counters and histograms, the /metrics endpoint and the sampling profiler
 
-# Set up logging configuration
-# This configures the logging system to write logs to 'defender.log' file
-# Level is set to INFO, meaning it will log informational, warning, error, and critical messages
-# Format includes timestamp, log level, and message for detailed tracking
-logging.basicConfig(filename='defender.log', level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+# Logging is configured by main() (see events.configure_logging), not at import time
+# This keeps applications that import SystemDefender, such as defence_app and defence_gui, in control of logging
 
-# Define a set of known malware hashes for comparison
-# In a real-world scenario, this would be loaded from a secure database or API
-# These are example hashes; replace with actual malware signatures
+# Built-in set of known malware hashes
+# Used only when no compiled signature database (signatures.sig) is present
+# Real deployments compile their threat feeds with: python signature_store.py compile signatures.sig FEED...
+# Entries that are not valid 64-character SHA-256 digests are skipped when the set is loaded
 KNOWN_MALWARE_HASHES = {
     'e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495991b7852b855',  # Example hash for demonstration
     '9bf5ce6d9ffa13e30342a62a6dec17fd56556b36f2ceb5533ba9263931311c9b',  # Hash for test_malware.exe
@@ -31,6 +40,39 @@ KNOWN_MALWARE_HASHES = {
     # Additional hashes can be added here for more comprehensive malware detection
 }
 
+# Address and ports the network sentinel listens on
+# Loopback only by default; set DEFENDER_SENTINEL_HOST (e.g. to 0.0.0.0) to inspect connections from other hosts
+SENTINEL_HOST = '127.0.0.1'
+SENTINEL_HOST_ENV = 'DEFENDER_SENTINEL_HOST'
+SENTINEL_PORTS = [8888]
+
+# Seconds an address stays blocked after a suspicious connection
+BLOCK_TTL = 3600
+
+# Loopback port of the Prometheus /metrics endpoint started by main(), and the snapshot written beside it
+METRICS_PORT = metrics.DEFAULT_METRICS_PORT
+METRICS_SNAPSHOT_PATH = metrics.DEFAULT_SNAPSHOT_PATH
+
+# Metric children resolved once, off the per-file path
+_SIGNATURE_LOOKUP_SECONDS = metrics.LOOKUP_SECONDS.labels('signatures')
+_DELETE_SECONDS = metrics.ACTION_SECONDS.labels('delete')
+_KILL_SECONDS = metrics.ACTION_SECONDS.labels('kill')
+_VERDICTS = {verdict: metrics.VERDICTS.labels(verdict or 'unreadable')
+             for verdict in ('malware', 'suspicious', 'clean', None)}
+
+# Seconds between runs of each periodic defence task
+DEFEND_INTERVALS = {'scan': 1.0, 'processes': 1.0, 'network': 1.0}
+
+# Budgets of each periodic scan cycle when the directory cannot be watched with inotify
+# The cycle may use this share of the scan interval, read this many bytes and read at this rate (bytes/s)
+SCAN_CYCLE_SHARE = 0.8
+SCAN_BYTE_BUDGET = 512 * 1024 * 1024
+SCAN_IO_RATE = 64 * 1024 * 1024
+
+# Compiled databases for the other digest types threat feeds publish
+# Each is optional; an algorithm is only computed while its database holds digests
+EXTRA_SIGNATURE_PATHS = {'md5': 'signatures-md5.sig', 'sha1': 'signatures-sha1.sig'}
+
 # List of file extensions considered suspicious for potential malware
 # These are common extensions for executable files that could contain malicious code
 SUSPICIOUS_EXTENSIONS = ['.exe', '.dll', '.bat', '.scr', '.pif', '.com']
@@ -39,96 +81,315 @@ SUSPICIOUS_EXTENSIONS = ['.exe', '.dll', '.bat', '.scr', '.pif', '.com']
 # These are example names; in practice, this would be based on known malicious processes
 SUSPICIOUS_PROCESSES = ['malware.exe', 'virus.exe']
 
+# Regular expressions matched against process names, for families that vary their names
+# Example: r'^cryptominer-\d+$'
+SUSPICIOUS_PROCESS_PATTERNS = []
+
+# Function to calculate the raw SHA256 digest of a file
+# Module-level so it can also run inside worker processes of the parallel engine
+# Reads through hash_io, which reuses buffers sized to the file and keeps the page cache clean
+def calculate_file_digest(file_path, io=DEFAULT_IO):
+    # Returns None if the file cannot be read (e.g., permission issues)
+    return digest_file(file_path, 'sha256', io)
+
+# Function to calculate the SHA256 hash of a file as a hexadecimal string
+def calculate_file_hash(file_path, io=DEFAULT_IO):
+    digest = calculate_file_digest(file_path, io)
+    return digest.hex() if digest is not None else None
+
+# Open the SHA-256 signature database and the optional MD5/SHA-1 ones, as {algorithm: SignatureDatabase}
+# The built-in hashes stand in for a missing SHA-256 database; the other algorithms fall back to an empty set
+def load_signature_databases(signature_path=DEFAULT_SIGNATURE_PATH):
+    databases = {'sha256': SignatureDatabase(signature_path,
+                                             fallback=SignatureStore.from_digests(KNOWN_MALWARE_HASHES))}
+    for algorithm, path in EXTRA_SIGNATURE_PATHS.items():
+        empty = SignatureStore.from_digests((), digest_size=DIGEST_SIZES[algorithm])
+        databases[algorithm] = SignatureDatabase(path, fallback=empty)
+    return databases
+
 # Define the main SystemDefender class
 # This class encapsulates all defence functionalities
 class SystemDefender:
     # Constructor method to initialize the defender object
     # Sets up initial state variables for tracking scanned files and blocked IPs
-    def __init__(self):
-        # Initialize a set to keep track of files that have already been scanned
-        # This prevents redundant scanning of the same file
-        self.scanned_files = set()
-        # Initialize a set to keep track of blocked IP addresses
-        # This helps in preventing repeated connections from known malicious IPs
-        self.blocked_ips = set()
+    # jobs sets the default number of hashing workers used by scan_directory
+    # signature_path points at the compiled signature database; the built-in set is used if it is missing
+    # rules_path points at the JSON byte-pattern rules matched during the same read as the digests
+    # io_options selects the hashing read strategy (readinto, mmap, file_digest) and cache hints
+    # event_pipeline receives every detection event (see events.EventPipeline)
+    # dry_run reports detections without deleting files or terminating processes
+    # archive_limits bounds the scan of zip/tar/gzip/bzip2/xz members (see archive_scan); None turns it off
+    def __init__(self, cache_path=DEFAULT_CACHE_PATH, jobs=1, signature_path=DEFAULT_SIGNATURE_PATH,
+                 rules_path=DEFAULT_RULES_PATH, io_options=DEFAULT_IO, event_pipeline=None, dry_run=False,
+                 archive_limits=DEFAULT_ARCHIVE_LIMITS):
+        # Number of parallel hashing workers (1 keeps the original serial scan)
+        self.jobs = jobs
+        # When set, destroy_file and kill_process only report what they would have done
+        self.dry_run = dry_run
+        # Read strategy and page-cache behaviour used when hashing (see hash_io.IOOptions)
+        self.io_options = io_options
+        # Detection events are queued here and written by a background thread
+        # Defaults to console alerts, defender.log and defender_events.jsonl
+        self.events = event_pipeline or events.EventPipeline(
+            [events.ConsoleSink(), events.LogSink(), events.JsonLinesSink()])
+        # Load the memory-mapped signature database, falling back to the built-in hashes, together with the
+        # optional MD5 and SHA-1 indicator databases published by some threat feeds
+        self.digest_signatures = load_signature_databases(signature_path)
+        self.signatures = self.digest_signatures['sha256']
+        # Byte-pattern rules, matched over the same buffers that feed the digests
+        self.matcher = PatternMatcher.load(rules_path)
+        # Limits of the scan inside archives, streamed through the same digests and patterns
+        self.archive_limits = archive_limits
+        # Open the persistent verdict cache keyed by each file's stat tuple
+        # Unchanged files are skipped without hashing; modified files are rescanned
+        # Pass cache_path=None to keep the cache in memory only
+        self.cache = VerdictCache(cache_path, signatures=self.detection_fingerprint())
+        # Process monitor and network sentinel are created on first use (see the properties below)
+        self._process_monitor = None
+        self._sentinel = None
+        # Risk-ordered queues of the directories scanned by prioritized_scan, carried across cycles
+        self.scan_queues = {}
+        # Raw SHA-256 digests reported as malware by other hosts (see fleet.FleetAgent) -> host that found it
+        self.shared_detections = {}
+        # Metrics endpoint and snapshot writer, started by serve_metrics
+        self.metrics_server = None
+        self.metrics_snapshot = None
+
+    # Incremental process monitor sharing the verdict cache for executable checks
+    @property
+    def process_monitor(self):
+        if self._process_monitor is None:
+            from process_monitor import ProcessMonitor
+            self._process_monitor = ProcessMonitor(self, SUSPICIOUS_PROCESSES, SUSPICIOUS_PROCESS_PATTERNS)
+        return self._process_monitor
+
+    # Persistent listener on the configured ports, created (but not started) on first use
+    @property
+    def sentinel(self):
+        if self._sentinel is None:
+            from network_sentinel import NetworkSentinel, IPBlocklist
+            # Blocklist of IP addresses and CIDR networks, with expiry
+            # This helps in preventing repeated connections from known malicious IPs
+            host = os.environ.get(SENTINEL_HOST_ENV) or SENTINEL_HOST
+            if host != SENTINEL_HOST:
+                events.logger.warning(f"Network sentinel exposed on {host} (set by {SENTINEL_HOST_ENV})")
+            self._sentinel = NetworkSentinel(host, SENTINEL_PORTS, blocklist=IPBlocklist(),
+                                             block_ttl=BLOCK_TTL, event_pipeline=self.events)
+        return self._sentinel
+
+    # Blocklist shared with the network sentinel
+    @property
+    def blocked_ips(self):
+        return self.sentinel.blocklist
 
     # Method to calculate the SHA256 hash of a file
     # This is used to compare file signatures against known malware hashes
     def calculate_hash(self, file_path):
-        # Create a SHA256 hash object
-        hash_sha256 = hashlib.sha256()
-        # Attempt to open the file in binary read mode
-        try:
-            with open(file_path, 'rb') as f:
-                # Read the file in chunks to handle large files efficiently
-                for chunk in iter(lambda: f.read(4096), b""):
-                    # Update the hash with each chunk
-                    hash_sha256.update(chunk)
-            # Return the hexadecimal representation of the hash
-            return hash_sha256.hexdigest()
-        # Handle cases where the file cannot be read (e.g., permission issues)
-        except (OSError, IOError):
-            # Return None if hashing fails
-            return None
+        return calculate_file_hash(file_path, self.io_options)
+
+    # Method to calculate the raw SHA256 digest of a file, as used by the scanners
+    def calculate_digest(self, file_path):
+        return calculate_file_digest(file_path, self.io_options)
+
+    # Method to compute a fingerprint covering every signature database and the pattern rules
+    # Cached verdicts are only valid for the exact detection content they were computed with
+    def detection_fingerprint(self):
+        parts = [f'{name}:{db.fingerprint}' for name, db in sorted(self.digest_signatures.items())]
+        parts.append(f'rules:{self.matcher.fingerprint}')
+        # Verdicts reached with archive scanning off (or with other limits) do not carry over
+        parts.append(f'archives:{tuple(self.archive_limits) if self.archive_limits else None}')
+        return hashlib.sha256('\n'.join(parts).encode('ascii')).hexdigest()
+
+    # Method to pick up signature databases replaced on disk since the last scan
+    # Cached verdicts are invalidated whenever the signatures change
+    def reload_signatures(self):
+        changed = [db.reload() for db in self.digest_signatures.values()]
+        if any(changed):
+            self.cache.set_signatures(self.detection_fingerprint())
+
+    # Method to list the digest algorithms worth computing: SHA-256 plus any loaded indicator feeds
+    def scan_algorithms(self):
+        return ('sha256',) + tuple(name for name, db in self.digest_signatures.items()
+                                   if name != 'sha256' and len(db))
+
+    # Method to read a file once, computing every digest and pattern match in a single pass
+    # Archives also have their members scanned (see inspect_archive), so parallel workers do that work too
+    def inspect_file(self, file_path):
+        start = time.perf_counter()
+        result = scan_file_once(file_path, self.scan_algorithms(), self.matcher, self.io_options)
+        metrics.HASH_SECONDS.observe(time.perf_counter() - start)
+        if result is not None and result.size:
+            metrics.HASHED_BYTES.inc(result.size)
+        if result is not None and self.archive_limits is not None and is_archive(file_path, result.head):
+            result = result._replace(archive=self.inspect_archive(file_path))
+        return result
+
+    # Method to scan the members of an archive without extracting it
+    # Returns an archive_scan.ArchiveReport, or None if the file is not a supported archive
+    def inspect_archive(self, file_path):
+        return scan_archive(file_path, self.scan_algorithms(), self.matcher, self.detection_reason,
+                            self.archive_limits)
 
     # Method to scan a single file for malware
     # Checks file hash against known malware and flags suspicious extensions
-    def scan_file(self, file_path):
-        # Check if the file has already been scanned to avoid duplication
-        if file_path in self.scanned_files:
+    # An already available stat result can be passed in to avoid a second stat call
+    def scan_file(self, file_path, st=None):
+        # Stat the file to build its cache key
+        if st is None:
+            try:
+                st = os.stat(file_path)
+            except OSError:
+                return
+        # Skip the file entirely if it is unchanged since it was found clean or already reported suspicious
+        if self.cache.is_settled(st):
             return
-        # Add the file to the scanned set
-        self.scanned_files.add(file_path)
-        # Calculate the hash of the file
-        file_hash = self.calculate_hash(file_path)
-        # If hash calculation succeeded and matches a known malware hash
-        if file_hash and file_hash in KNOWN_MALWARE_HASHES:
-            # Print alert to console
-            print(f"Malware detected: {file_path}")
-            # Log the detection as a warning
-            logging.warning(f"Malware detected: {file_path}")
-            # Destroy the malicious file
+        # Read the file once and act on the verdict
+        return self.record_result(file_path, st, self.inspect_file(file_path))
+
+    # Method to decide why a scanned file counts as malware, or None if it does not
+    def detection_reason(self, result):
+        start = time.perf_counter()
+        try:
+            for algorithm, digest in result.digests.items():
+                if digest in self.digest_signatures[algorithm]:
+                    return algorithm
+        finally:
+            _SIGNATURE_LOOKUP_SECONDS.observe(time.perf_counter() - start)
+        for name in result.matches:
+            return f'pattern {name}'
+        # Content another host of the fleet already found to be malware
+        host = self.shared_detections.get(result.digests.get('sha256'))
+        if host is not None:
+            return f'fleet {host}'
+        return None
+
+    # Method to act on the single-pass scan result of a file (None if it could not be read)
+    # Shared by scan_file and the parallel engine so every verdict is handled in one place
+    # Returns the verdict: 'malware', 'suspicious', 'clean', or None when the file could not be read
+    def record_result(self, file_path, st, result):
+        verdict = self._record_result(file_path, st, result)
+        _VERDICTS[verdict].inc()
+        return verdict
+
+    def _record_result(self, file_path, st, result):
+        file_hash = result.digests['sha256'] if result is not None else None
+        reason = self.detection_reason(result) if result is not None else None
+        # Archives scanned by the process pool come back without their members scanned
+        archive = result.archive if result is not None else None
+        if archive is None and result is not None and self.archive_limits is not None and \
+                is_archive(file_path, result.head):
+            archive = self.inspect_archive(file_path)
+        # Detections inside the archive are reported by member, as archive!member
+        detections = [(file_path, reason, file_hash)] if reason is not None else []
+        if archive is not None:
+            detections.extend(archive.detections)
+        # If a digest matches a known malware signature or a byte pattern was found
+        if detections:
+            for path, reason, digest in detections:
+                # Digest hits keep the original message; other detections name the indicator
+                message = f"Malware detected: {path}"
+                if reason != 'sha256':
+                    message += f" ({reason})"
+                # Queue the alert for the console, defender.log and the JSON-lines sink
+                self.events.emit(events.MALWARE_DETECTED, logging.WARNING, message, path=path, reason=reason,
+                                 sha256=digest.hex() if digest else None)
+            # Destroy the malicious file (the whole archive when a member is malicious)
             self.destroy_file(file_path)
+            # Remember the verdict in case deletion failed and the file is seen again
+            # A dry run leaves it uncached so the next real run still acts on the file
+            if not self.dry_run:
+                self.cache.store(st, file_hash, 'malware')
+            return 'malware'
+        # An archive whose scan stopped at a limit may be a decompression bomb or hide content too deep to reach
+        elif archive is not None and archive.limit is not None:
+            self.events.emit(events.ARCHIVE_LIMIT, logging.WARNING,
+                             f"Archive limit reached: {file_path} ({archive.limit})", path=file_path,
+                             limit=archive.limit, members=archive.members, bytes=archive.bytes)
+            if file_hash:
+                self.cache.store(st, file_hash, 'suspicious')
+            return 'suspicious'
         # If the file has a suspicious extension
         elif Path(file_path).suffix.lower() in SUSPICIOUS_EXTENSIONS:
-            # Print alert for suspicious file
-            print(f"Suspicious file: {file_path}")
-            # Log as informational
-            logging.info(f"Suspicious file: {file_path}")
+            # Queue an informational alert for the suspicious file
+            self.events.emit(events.SUSPICIOUS_FILE, logging.INFO, f"Suspicious file: {file_path}", path=file_path)
+            # Remember the verdict unless the read failed, so unreadable files are retried next time
+            if file_hash:
+                self.cache.store(st, file_hash, 'suspicious')
+            return 'suspicious'
+        # Cache clean verdicts too, again skipping failed reads
+        elif file_hash:
+            self.cache.store(st, file_hash, 'clean')
+            return 'clean'
+        return None
 
     # Method to scan a directory recursively
-    # Walks through all files in the directory and subdirectories
-    def scan_directory(self, directory):
-        # Use os.walk to traverse the directory tree
-        for root, dirs, files in os.walk(directory):
-            # Iterate through each file in the current directory
-            for file in files:
-                # Construct the full file path
-                file_path = os.path.join(root, file)
-                # Scan the individual file
-                self.scan_file(file_path)
+    # Streams files from the scandir-based walker, reusing the stat result it already gathered
+    # jobs > 1 hands the walk to the parallel ScanEngine; executor selects threads or processes
+    # progress, cancel and stats are passed through to ScanEngine.scan (live updates and cancellation)
+    # Extra keyword arguments are walker filters (include, exclude, max_depth, one_filesystem, ...)
+    # Returns a ScanStats summary of the pass
+    def scan_directory(self, directory, jobs=None, executor='thread', progress=None, cancel=None, stats=None,
+                       **walk_options):
+        jobs = self.jobs if jobs is None else jobs
+        # Swap in an updated signature database before the pass starts
+        self.reload_signatures()
+        if jobs > 1:
+            return ScanEngine(self, jobs=jobs, executor=executor).scan(directory, progress, cancel, stats,
+                                                                       **walk_options)
+        stats = stats if stats is not None else ScanStats()
+        start = stats.started = time.perf_counter()
+        # Scan each file with the stat result produced by the walk
+        for entry in walk_files(directory, **walk_options):
+            if cancel is not None and cancel.is_set():
+                stats.cancelled = True
+                break
+            stats.files += 1
+            # Unchanged clean and suspicious files are skipped through the cache, as in scan_file
+            if self.cache.is_settled(entry.stat):
+                continue
+            verdict = self.record_result(entry.path, entry.stat, self.inspect_file(entry.path))
+            stats.add_result(entry.stat, verdict)
+            if progress is not None:
+                progress(entry.path, verdict)
+        # Persist the verdicts gathered during this pass
+        self.cache.flush()
+        stats.elapsed = time.perf_counter() - start
+        return stats
+
+    # Method to run one budgeted cycle of a prioritized scan of a directory
+    # Pending files are hashed riskiest first (see scan_queue.risk_score) until time_budget seconds or
+    # byte_budget bytes are used; what is left, including a partly hashed large file, waits for the next call
+    # io_rate paces reads in bytes per second; the queue, its pacing and walker filters are set on the first call
+    # Returns the CycleStats of the cycle; its stopped field is 'complete' once a pass over the tree has finished
+    def prioritized_scan(self, directory, time_budget=None, byte_budget=None, io_rate=None, cancel=None,
+                         **walk_options):
+        queue = self.scan_queues.get(directory)
+        if queue is None:
+            queue = self.scan_queues[directory] = ScanQueue(self, directory, SUSPICIOUS_EXTENSIONS,
+                                                            io_rate=io_rate, **walk_options)
+        self.reload_signatures()
+        return queue.run_cycle(time_budget, byte_budget, cancel)
 
     # Method to monitor running processes
-    # Checks for suspicious process names and terminates them if found
+    # Only processes that appeared since the last call are inspected (by name, pattern and executable hash)
+    # All offenders found are terminated together, then killed together if they do not exit in time
     def monitor_processes(self):
-        # Iterate through all running processes
-        for proc in psutil.process_iter(['pid', 'name', 'exe']):
-            try:
-                # Check if the process name is in the suspicious list
-                if proc.info['name'] in SUSPICIOUS_PROCESSES:
-                    # Print alert for suspicious process
-                    print(f"Suspicious process: {proc.info['name']} (PID: {proc.info['pid']})")
-                    # Log as warning
-                    logging.warning(f"Suspicious process: {proc.info['name']} (PID: {proc.info['pid']})")
-                    # Kill the suspicious process
-                    self.kill_process(proc.info['pid'])
-            # Handle exceptions for processes that no longer exist or access denied
-            except (psutil.NoSuchProcess, psutil.AccessDenied):
-                continue
+        return self.process_monitor.scan()
 
     # Method to kill a process by its PID
     # Attempts graceful termination first, then force kills if necessary
     def kill_process(self, pid):
+        if self.dry_run:
+            self.events.emit(events.ACTION_SKIPPED, logging.INFO, f"Dry run: not terminating PID: {pid}", pid=pid)
+            metrics.ACTIONS.labels('kill', 'skipped').inc()
+            return
+        import psutil
+        with _KILL_SECONDS.time():
+            outcome = self._kill_process(psutil, pid)
+        metrics.ACTIONS.labels('kill', outcome).inc()
+
+    # Terminate-then-kill body of kill_process; returns the outcome for the action metrics
+    def _kill_process(self, psutil, pid):
         try:
             # Get the process object
             proc = psutil.Process(pid)
@@ -136,97 +397,161 @@ class SystemDefender:
             proc.terminate()
             # Wait for the process to terminate with a timeout
             proc.wait(timeout=3)
-            # Print success message
-            print(f"Terminated process PID: {pid}")
-            # Log the action
-            logging.info(f"Terminated process PID: {pid}")
+            # Report success
+            self.events.emit(events.PROCESS_TERMINATED, logging.INFO, f"Terminated process PID: {pid}", pid=pid)
+            return 'terminated'
         # Handle case where process no longer exists
         except psutil.NoSuchProcess:
-            print(f"Process PID: {pid} already terminated")
-            logging.info(f"Process PID: {pid} already terminated")
+            self.events.emit(events.PROCESS_GONE, logging.INFO, f"Process PID: {pid} already terminated", pid=pid)
+            return 'gone'
         # Handle case where termination times out
         except psutil.TimeoutExpired:
             # Force kill the process
             proc.kill()
-            print(f"Killed process PID: {pid}")
-            logging.info(f"Killed process PID: {pid}")
+            self.events.emit(events.PROCESS_KILLED, logging.INFO, f"Killed process PID: {pid}", pid=pid)
+            return 'killed'
 
     # Method to destroy (delete) a malicious file
     # Removes the file from the filesystem
     def destroy_file(self, file_path):
+        if self.dry_run:
+            self.events.emit(events.ACTION_SKIPPED, logging.INFO, f"Dry run: not deleting {file_path}",
+                             path=file_path)
+            metrics.ACTIONS.labels('delete', 'skipped').inc()
+            return
         try:
             # Attempt to remove the file
-            os.remove(file_path)
-            # Print success message
-            print(f"Deleted file: {file_path}")
-            # Log the action
-            logging.info(f"Deleted file: {file_path}")
+            with _DELETE_SECONDS.time():
+                os.remove(file_path)
+            # Report the action
+            self.events.emit(events.FILE_DELETED, logging.INFO, f"Deleted file: {file_path}", path=file_path)
+            metrics.ACTIONS.labels('delete', 'deleted').inc()
         # Handle exceptions during file deletion
         except OSError as e:
-            print(f"Failed to delete {file_path}: {e}")
-            logging.error(f"Failed to delete {file_path}: {e}")
+            self.events.emit(events.DELETE_FAILED, logging.ERROR, f"Failed to delete {file_path}: {e}",
+                             path=file_path, error=str(e))
+            metrics.ACTIONS.labels('delete', 'failed').inc()
 
-    # Method to monitor network connections (basic implementation)
-    # Listens for incoming connections and checks for suspicious activity
+    # Method to monitor network connections
+    # Makes sure the persistent sentinel is listening on the configured ports and expires old blocks
+    # The sentinel runs in its own thread, so this never blocks the defence loop
     def monitor_network(self):
         # Note: This is a simplified example; for production, use advanced tools like scapy
         try:
-            # Create a TCP socket
-            s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            # Bind to any available port
-            s.bind(('', 0))
-            # Listen for incoming connections
-            s.listen(1)
-            # Set a timeout for the accept operation
-            s.settimeout(1)
-            # Accept an incoming connection
-            conn, addr = s.accept()
-            # Check if the IP is already blocked
-            if addr[0] in self.blocked_ips:
-                # Close the connection
-                conn.close()
-                # Log the blocked connection
-                logging.info(f"Blocked connection from: {addr[0]}")
-            else:
-                # Receive data from the connection
-                data = conn.recv(1024)
-                # Check for suspicious content (example check)
-                if b'malicious' in data:  # This is a placeholder; use real detection logic
-                    # Add IP to blocked list
-                    self.blocked_ips.add(addr[0])
-                    # Log the suspicious connection
-                    logging.warning(f"Suspicious connection from: {addr[0]}")
-                # Close the connection
-                conn.close()
-        # Handle timeout (no connection received)
-        except socket.timeout:
-            pass
-        # Handle other exceptions
+            # Start the listener on first use (or restart it if it stopped)
+            if not self.sentinel.running:
+                self.sentinel.start()
+            # Drop blocklist entries whose time-to-live has passed
+            self.blocked_ips.expire()
+        # Handle errors such as a configured port already being in use
         except Exception as e:
-            logging.error(f"Network monitoring error: {e}")
+            events.logger.error(f"Network monitoring error: {e}")
+
+    # Method to watch a directory in real time until stop_event is set
+    # Runs one baseline scan, then scans only files reported by inotify as created, moved in or written
+    def watch(self, directory, stop_event=None, **options):
+        from watcher import watch_directory
+        watch_directory(self, directory, stop_event=stop_event, **options)
 
     # Main defence loop method
-    # Runs the defence operations in a loop
-    def defend(self):
-        # Run the loop a limited number of times for testing (adjust as needed)
-        for i in range(3):  # Test mode: run 3 times
-            # Scan the test directory
-            self.scan_directory('test')
-            # Monitor running processes
-            self.monitor_processes()
-            # Monitor network activity
-            self.monitor_network()
-            # Sleep for a short period to simulate real-time monitoring
-            time.sleep(1)  # Short sleep for test
+    # Runs every monitor as an independent periodic task so a slow scan never delays process detection
+    # cycles: stop once every task has run this many times (3 keeps the original test mode)
+    # duration: stop after this many seconds; with neither set, runs as a daemon until stop() is called
+    # intervals: optional overrides of DEFEND_INTERVALS, e.g. {'processes': 0.5}
+    def defend(self, cycles=3, duration=None, intervals=None, directory='test'):
+        from watcher import DirectoryWatch
+        from scheduler import Scheduler, PeriodicTask
+        intervals = dict(DEFEND_INTERVALS, **(intervals or {}))
+        self.scheduler = Scheduler()
+        # Watch the directory in the background where inotify is available
+        # Otherwise fall back to budgeted, risk-ordered scan cycles as a periodic task
+        stop_event = threading.Event()
+        try:
+            watch = DirectoryWatch(self, directory)
+        except OSError:
+            watch = None
+            cycle = lambda: self.prioritized_scan(directory, time_budget=intervals['scan'] * SCAN_CYCLE_SHARE,
+                                                  byte_budget=SCAN_BYTE_BUDGET, io_rate=SCAN_IO_RATE)
+            self.scheduler.add(PeriodicTask('scan', cycle, intervals['scan'], jitter=intervals['scan'] * 0.1,
+                                            priority=0))
+        if watch is not None:
+            watch_thread = threading.Thread(target=watch.run, args=(stop_event,), name='directory-watch',
+                                            daemon=True)
+            watch_thread.start()
+        # Process detection has the highest priority; the network task only supervises the sentinel
+        self.scheduler.add(PeriodicTask('processes', self.monitor_processes, intervals['processes'], priority=2))
+        self.scheduler.add(PeriodicTask('network', self.monitor_network, intervals['network'], priority=1))
+        try:
+            return self.scheduler.run(duration=duration, cycles=cycles)
+        finally:
+            # Stop the watcher and the network sentinel before returning
+            stop_event.set()
+            if watch is not None:
+                watch_thread.join()
+            if self._sentinel is not None:
+                self._sentinel.stop()
+
+    # Method to stop a running defend() loop gracefully (e.g. from a signal handler)
+    def stop(self):
+        scheduler = getattr(self, 'scheduler', None)
+        if scheduler is not None:
+            scheduler.stop()
+
+    # Method to export metrics while the defender runs
+    # Serves /metrics (Prometheus text) and /profile on the loopback port and, when snapshot_path is set,
+    # rewrites a snapshot file every snapshot_interval seconds; raises OSError if the port is taken
+    # Port 0 picks a free port (see metrics_server.port)
+    def serve_metrics(self, port=METRICS_PORT, snapshot_path=METRICS_SNAPSHOT_PATH, snapshot_interval=15.0):
+        registry = metrics.REGISTRY
+        # Values computed at export time, so the hot paths pay nothing for them
+        metrics.CACHE_RESULTS.labels('hit').set_function(lambda: self.cache.hits)
+        metrics.CACHE_RESULTS.labels('miss').set_function(lambda: self.cache.misses)
+        registry.gauge('defender_cache_entries', 'Entries in the verdict cache').set_function(
+            lambda: len(self.cache))
+        registry.gauge('defender_blocklist_entries', 'Entries in the IP blocklist').set_function(
+            lambda: len(self._sentinel.blocklist) if self._sentinel is not None else 0)
+        registry.gauge('defender_events_dropped', 'Events dropped because the event queue was full').set_function(
+            lambda: self.events.dropped)
+        registry.gauge('defender_events_queued', 'Events waiting for the event writer').set_function(
+            lambda: self.events.stats()['queued'])
+        self.metrics_server = metrics.MetricsServer(port=port).start()
+        if snapshot_path:
+            self.metrics_snapshot = metrics.SnapshotWriter(snapshot_path, snapshot_interval).start()
+        return self.metrics_server
+
+    # Method to stop the metrics endpoint and write a final snapshot
+    def stop_metrics(self):
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+            self.metrics_server = None
+        if self.metrics_snapshot is not None:
+            self.metrics_snapshot.stop()
+            self.metrics_snapshot = None
 
 # Main function to run the defence system
 def main():
+    # Send defender.log output through a background QueueListener (before any events are queued)
+    events.configure_logging()
     # Create an instance of the SystemDefender class
     defender = SystemDefender()
     # Log the start of the defence system
-    logging.info("System Defender AI started")
-    # For testing, run the defence loop directly
-    defender.defend()
+    events.logger.info("System Defender AI started")
+    # Export metrics on the loopback port; the defence loop runs without them if the port is taken
+    try:
+        defender.serve_metrics()
+        events.logger.info(f"Metrics available at http://{metrics.DEFAULT_METRICS_HOST}:{METRICS_PORT}/metrics")
+    except OSError as e:
+        events.logger.error(f"Metrics endpoint unavailable on port {METRICS_PORT}: {e}")
+    # Stop gracefully on SIGTERM (Ctrl+C raises KeyboardInterrupt, handled below)
+    signal.signal(signal.SIGTERM, lambda signum, frame: defender.stop())
+    # For testing, run the defence loop directly with the 3-cycle budget
+    try:
+        defender.defend()
+    except KeyboardInterrupt:
+        defender.stop()
+    # Write out every queued alert and the final metrics snapshot before exiting
+    defender.stop_metrics()
+    defender.events.close()
 
 # Entry point of the script
 # Ensures the main function is called when the script is run directly
@@ -0,0 +1,222 @@
+# Persistent verdict cache for the Intelligent Defence System
+# Remembers the digest and verdict of every scanned file so repeat scans only cost a stat call
+# Developed for monitoring and threat response for the Indian Armed Forces
+
+import sqlite3  # Stdlib on-disk key/value store used to persist verdicts between runs
+import hashlib  # Used to fingerprint the signature set the cached verdicts were computed against
+import time  # Lookup latency for the metrics
+import threading  # Lock guarding the cache when scans run from more than one thread
+import os  # Absolute path of a cache opened read-only
+from urllib.request import pathname2url  # Cache path quoted for a sqlite file: URI
+from collections import OrderedDict  # Ordered mapping used as the in-memory LRU front
+from metrics import LOOKUP_SECONDS, LATENCY_SAMPLE_EVERY  # Sampled lookup latency
+
+# Metric child resolved once, off the lookup path
+_LOOKUP_SECONDS = LOOKUP_SECONDS.labels('cache')
+
+# Default location of the on-disk cache, kept next to defender.log
+DEFAULT_CACHE_PATH = 'defender_cache.db'
+
+# Number of entries kept in memory in front of the database
+DEFAULT_MEMORY_ENTRIES = 100000
+
+# Maximum number of rows kept on disk before least-recently-used rows are evicted
+DEFAULT_DISK_ENTRIES = 5000000
+
+# Verdicts that need no further action while the file is unchanged, so a repeat scan skips the read and the alert
+# 'suspicious' covers suspicious extensions and archives that hit a limit: both were reported once already, and an
+# archive bomb is not decompressed again; 'malware' is left out so a failed deletion is retried and re-alerted
+SETTLED_VERDICTS = ('clean', 'suspicious')
+
+# Writes (stores and LRU refreshes) held back before they are committed together
+WRITE_BATCH = 1000
+
+
+# Build the cache key for a file from its stat result
+# Any change to the file (rewrite, truncate, chmod, replace) changes at least one of these fields
+def stat_key(st):
+    return (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns, st.st_ctime_ns)
+
+
+# Compute a stable fingerprint of a signature set (or pass through an already computed one)
+# Cached verdicts are only valid for the exact signatures they were computed against
+def signature_fingerprint(signatures):
+    # Precomputed fingerprints are used as-is
+    if isinstance(signatures, str):
+        return signatures
+    # Signature stores expose their own fingerprint; plain sets of hex digests are hashed here
+    fingerprint = getattr(signatures, 'fingerprint', None)
+    if fingerprint is not None:
+        return fingerprint
+    h = hashlib.sha256()
+    for digest in sorted(signatures):
+        h.update(digest.encode('ascii', 'replace') if isinstance(digest, str) else bytes(digest))
+        h.update(b'\n')
+    return h.hexdigest()
+
+
+# Verdict cache keyed by (device, inode, size, mtime_ns, ctime_ns)
+# Memory use is bounded by an LRU dictionary; the database is bounded by periodic eviction
+class VerdictCache:
+    # Open (or create) the cache at `path`; pass None for a purely in-memory cache
+    def __init__(self, path=DEFAULT_CACHE_PATH, signatures=(), memory_entries=DEFAULT_MEMORY_ENTRIES,
+                 disk_entries=DEFAULT_DISK_ENTRIES):
+        self.path = path
+        self.memory_entries = memory_entries
+        self.disk_entries = disk_entries
+        # LRU of key -> (digest, verdict), most recently used at the end
+        self._memory = OrderedDict()
+        # Lock serialising access from scanner threads
+        self._lock = threading.Lock()
+        # Monotonic counter used as the LRU clock for rows on disk
+        self._clock = 0
+        # Number of writes since the last eviction check
+        self._writes = 0
+        # Disk rows hit since the last flush -> their refreshed LRU clock, written out by _flush_locked
+        self._touched = {}
+        # Hit/miss counters, useful to confirm that repeat scans skip hashing
+        self.hits = 0
+        self.misses = 0
+        # Open the database; ':memory:' keeps everything in RAM when no path is given
+        self._db = sqlite3.connect(path or ':memory:', check_same_thread=False)
+        if path:
+            self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute('CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)')
+        self._db.execute('CREATE TABLE IF NOT EXISTS verdicts ('
+                         'dev INTEGER, ino INTEGER, size INTEGER, mtime_ns INTEGER, ctime_ns INTEGER, '
+                         'digest BLOB, verdict TEXT, used INTEGER, '
+                         'PRIMARY KEY (dev, ino, size, mtime_ns, ctime_ns))')
+        self._db.execute('CREATE INDEX IF NOT EXISTS verdicts_used ON verdicts (used)')
+        row = self._db.execute('SELECT MAX(used) FROM verdicts').fetchone()
+        self._clock = row[0] or 0
+        # Drop every cached verdict if the signature set changed since the cache was written
+        self.set_signatures(signatures)
+
+    # Record the signature set in use, invalidating the cache if it differs from the stored one
+    def set_signatures(self, signatures):
+        fingerprint = signature_fingerprint(signatures)
+        with self._lock:
+            row = self._db.execute("SELECT value FROM meta WHERE name = 'signatures'").fetchone()
+            if row is None or row[0] != fingerprint:
+                self._db.execute('DELETE FROM verdicts')
+                self._db.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('signatures', ?)",
+                                 (fingerprint,))
+                self._db.commit()
+                self._memory.clear()
+                self._touched.clear()
+            self.fingerprint = fingerprint
+
+    # Look up a file by its stat result
+    # Returns (digest, verdict) when the file is unchanged since it was cached, otherwise None
+    # One lookup in LATENCY_SAMPLE_EVERY is timed; hits and misses are counted on every call
+    def lookup(self, st):
+        if (self.hits + self.misses) % LATENCY_SAMPLE_EVERY:
+            return self._lookup(st)
+        start = time.perf_counter()
+        entry = self._lookup(st)
+        _LOOKUP_SECONDS.observe(time.perf_counter() - start)
+        return entry
+
+    # True if the file is unchanged since it was found clean
+    def is_clean(self, st):
+        entry = self.lookup(st)
+        return entry is not None and entry[1] == 'clean'
+
+    # True if the file is unchanged since it got one of the SETTLED_VERDICTS, so reading it again can be skipped
+    # Cached 'malware' does not count: that file is scanned again so the alert is repeated and a deletion that
+    # failed is retried while the file stays on disk
+    def is_settled(self, st):
+        entry = self.lookup(st)
+        return entry is not None and entry[1] in SETTLED_VERDICTS
+
+    def _lookup(self, st):
+        key = stat_key(st)
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return entry
+            row = self._db.execute('SELECT digest, verdict FROM verdicts WHERE dev = ? AND ino = ? AND size = ? '
+                                   'AND mtime_ns = ? AND ctime_ns = ?', key).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            # Refresh the LRU clock of the row so eviction keeps files that are still present
+            # The refresh is written out with the next batch rather than as one UPDATE per hit
+            self._clock += 1
+            self._touched[key] = self._clock
+            if len(self._touched) >= WRITE_BATCH:
+                self._flush_locked()
+            entry = (row[0], row[1])
+            self._remember(key, entry)
+            self.hits += 1
+            return entry
+
+    # Store the digest and verdict computed for a file
+    def store(self, st, digest, verdict):
+        key = stat_key(st)
+        with self._lock:
+            self._clock += 1
+            self._touched.pop(key, None)
+            self._db.execute('INSERT OR REPLACE INTO verdicts VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                             key + (digest, verdict, self._clock))
+            self._remember(key, (digest, verdict))
+            self._writes += 1
+            # Commit and check the disk bound in batches to keep per-file overhead low
+            if self._writes >= WRITE_BATCH:
+                self._flush_locked()
+
+    # Add an entry to the in-memory LRU, evicting the oldest entry when full
+    def _remember(self, key, entry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    # Commit pending writes and LRU refreshes, and evict least-recently-used rows beyond the disk bound
+    def _flush_locked(self):
+        self._writes = 0
+        if self._touched:
+            self._db.executemany('UPDATE verdicts SET used = ? WHERE dev = ? AND ino = ? AND size = ? '
+                                 'AND mtime_ns = ? AND ctime_ns = ?',
+                                 [(used,) + key for key, used in self._touched.items()])
+            self._touched.clear()
+        count = self._db.execute('SELECT COUNT(*) FROM verdicts').fetchone()[0]
+        if count > self.disk_entries:
+            self._db.execute('DELETE FROM verdicts WHERE used <= (SELECT used FROM verdicts ORDER BY used '
+                             'LIMIT 1 OFFSET ?)', (count - self.disk_entries - 1,))
+        self._db.commit()
+
+    # Write pending changes to disk
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    # Flush and close the database
+    def close(self):
+        with self._lock:
+            self._flush_locked()
+            self._db.close()
+
+    # Number of entries currently stored on disk
+    def __len__(self):
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM verdicts').fetchone()[0]
+
+
+# Number of entries in the cache file at `path`, without opening it as a VerdictCache
+# The file is opened read-only, so a caller with another detection fingerprint cannot empty it (see set_signatures)
+# A missing or never-initialised file counts as 0
+def count_entries(path=DEFAULT_CACHE_PATH):
+    try:
+        db = sqlite3.connect(f'file:{pathname2url(os.path.abspath(path))}?mode=ro', uri=True)
+    except sqlite3.OperationalError:
+        return 0
+    try:
+        return db.execute('SELECT COUNT(*) FROM verdicts').fetchone()[0]
+    except sqlite3.OperationalError:
+        return 0
+    finally:
+        db.close()
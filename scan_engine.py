@@ -0,0 +1,222 @@
+# Parallel scanning engine for the Intelligent Defence System
+# One producer walks the tree into a bounded queue and a pool of workers hashes the files
+# Verdicts, file destruction and logging all happen on the calling thread, so they stay race-free
+# Developed for monitoring and threat response for the Indian Armed Forces
+
+import os  # Used to size the default worker pool
+import queue  # Thread-safe bounded queues connecting producer, workers and the result consumer
+import threading  # Producer and hashing worker threads
+import time  # Used to time each scan pass
+import events  # Shared 'defender' logger for files a worker failed on
+from walker import walk_files  # Streaming scandir-based walker producing (path, stat) entries
+from multiscan import scan_file_once  # Single-pass digest and pattern scan run by the workers
+from metrics import HASH_SECONDS, HASHED_BYTES  # Hashing latency of files sent to the process pool
+
+# Supported hashing backends
+# Threads work well because hashlib releases the GIL while digesting large buffers
+EXECUTORS = ('thread', 'process')
+
+# Marker placed on a queue to signal that no more items will follow
+_DONE = object()
+
+# Seconds between checks of the halt event while waiting on a full or empty queue
+QUEUE_POLL = 0.1
+
+
+# Put an item on a bounded queue unless the pass is halted first; returns False when halted
+# The producer and workers never block forever on a consumer that has gone away
+def _put(q, item, halt):
+    while not halt.is_set():
+        try:
+            q.put(item, timeout=QUEUE_POLL)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+# Detection content of this process when it is a worker of the process backend, set once by _init_worker
+_worker_content = None
+
+
+# Process pool initializer: receive the digest algorithms, pattern matcher and read options once per worker,
+# rather than pickling the matcher (possibly a large automaton) with every file submitted
+def _init_worker(algorithms, matcher, io_options):
+    global _worker_content
+    _worker_content = (algorithms, matcher, io_options)
+
+
+# Scan one file in a process pool worker with the content given to _init_worker
+def _scan_in_worker(file_path):
+    algorithms, matcher, io_options = _worker_content
+    return scan_file_once(file_path, algorithms, matcher, io_options)
+
+
+# Take an item from a queue, or _DONE once the pass is halted
+def _get(q, halt):
+    while not halt.is_set():
+        try:
+            return q.get(timeout=QUEUE_POLL)
+        except queue.Empty:
+            pass
+    return _DONE
+
+
+# Summary of one scan pass, returned by ScanEngine.scan
+class ScanStats:
+    def __init__(self):
+        # Number of files seen by the producer
+        self.files = 0
+        # Number of files actually hashed (cache misses)
+        self.hashed = 0
+        # Number of bytes hashed
+        self.bytes = 0
+        # Number of files found to be malware, and number flagged as suspicious
+        self.detections = 0
+        self.suspicious = 0
+        # perf_counter() value when the pass started, so watchers can compute live rates
+        self.started = time.perf_counter()
+        # Wall-clock duration of the pass in seconds
+        self.elapsed = 0.0
+        # True when the pass was stopped through its cancel event
+        self.cancelled = False
+
+    # Count one scanned file and its verdict (see SystemDefender.record_result)
+    def add_result(self, st, verdict):
+        self.hashed += 1
+        self.bytes += st.st_size
+        if verdict == 'malware':
+            self.detections += 1
+        elif verdict == 'suspicious':
+            self.suspicious += 1
+
+    # Files per second over the whole pass
+    @property
+    def files_per_second(self):
+        return self.files / self.elapsed if self.elapsed else 0.0
+
+    # Megabytes hashed per second over the whole pass
+    @property
+    def mb_per_second(self):
+        return self.bytes / 1e6 / self.elapsed if self.elapsed else 0.0
+
+
+# Scanning engine with a configurable number of hashing workers
+class ScanEngine:
+    # Create an engine that scans on behalf of `defender`
+    # jobs: number of hashing workers; executor: 'thread' or 'process'
+    # queue_size: bound on pending paths, defaults to four per worker
+    def __init__(self, defender, jobs=os.cpu_count() or 1, executor='thread', queue_size=None):
+        if executor not in EXECUTORS:
+            raise ValueError(f"Unknown executor {executor!r}; expected one of {EXECUTORS}")
+        self.defender = defender
+        self.jobs = max(1, int(jobs))
+        self.executor = executor
+        self.queue_size = queue_size or self.jobs * 4
+
+    # Scan every file under `directory` and return a ScanStats summary
+    #   progress: called as progress(path, verdict) on the calling thread after each scanned file
+    #   cancel: threading.Event; once set the walk stops, queued files are dropped and the pass returns
+    #   stats: ScanStats updated in place, so another thread can watch the pass while it runs
+    # Keyword arguments are passed to walker.walk_files as filters
+    def scan(self, directory, progress=None, cancel=None, stats=None, **walk_options):
+        stats = stats if stats is not None else ScanStats()
+        start = stats.started = time.perf_counter()
+        # Bounded queue of (path, stat) pairs still to be hashed; keeps memory flat on huge trees
+        work = queue.Queue(maxsize=self.queue_size)
+        # Results flow back to this thread, which is the only one that acts on verdicts
+        results = queue.Queue(maxsize=self.queue_size)
+        # Set when the consumer stops, normally or on an exception, so every other thread exits
+        halt = threading.Event()
+        pool = None
+        threads = []
+        if self.executor == 'process':
+            # Imported here: multiprocessing is only worth loading when the process backend is used
+            from concurrent.futures import ProcessPoolExecutor
+            pool = ProcessPoolExecutor(max_workers=self.jobs, initializer=_init_worker,
+                                       initargs=(self.defender.scan_algorithms(), self.defender.matcher,
+                                                 self.defender.io_options))
+        try:
+            producer = threading.Thread(target=self._produce,
+                                        args=(directory, walk_options, work, stats, cancel, halt),
+                                        name='scan-producer', daemon=True)
+            workers = [threading.Thread(target=self._work, args=(work, results, pool, cancel, halt),
+                                        name=f'scan-worker-{i}', daemon=True) for i in range(self.jobs)]
+            threads = [producer] + workers
+            for thread in threads:
+                thread.start()
+            # Consume results until every worker has reported that it is finished
+            remaining = len(workers)
+            while remaining:
+                item = results.get()
+                if item is _DONE:
+                    remaining -= 1
+                    continue
+                file_path, st, result = item
+                verdict = self.defender.record_result(file_path, st, result)
+                stats.add_result(st, verdict)
+                if progress is not None:
+                    progress(file_path, verdict)
+        finally:
+            # Also reached when record_result or progress raised: release and wait for every thread
+            halt.set()
+            for thread in threads:
+                thread.join()
+            if pool is not None:
+                pool.shutdown()
+        self.defender.cache.flush()
+        stats.elapsed = time.perf_counter() - start
+        return stats
+
+    # Producer: walk the tree and queue every file without a settled verdict (see VerdictCache.is_settled)
+    # Stops early once `halt` is set, so it never waits on workers that have all exited
+    def _produce(self, directory, walk_options, work, stats, cancel, halt):
+        try:
+            for entry in walk_files(directory, **walk_options):
+                if cancel is not None and cancel.is_set():
+                    stats.cancelled = True
+                    break
+                stats.files += 1
+                if not self.defender.cache.is_settled(entry.stat):
+                    if not _put(work, (entry.path, entry.stat), halt):
+                        break
+        finally:
+            # Always release the workers, even if the walk failed part-way
+            for _ in range(self.jobs):
+                if not _put(work, _DONE, halt):
+                    break
+
+    # Worker: scan queued files in a single pass and hand the results back to the consumer
+    # A file that raises is reported as unreadable (result None) and the worker carries on with the next one
+    def _work(self, work, results, pool, cancel, halt):
+        try:
+            while True:
+                item = _get(work, halt)
+                if item is _DONE:
+                    break
+                if cancel is not None and cancel.is_set():
+                    # Cancelled: drain the queue without scanning so the producer is never left blocked
+                    continue
+                file_path, st = item
+                try:
+                    result = self._scan(file_path, pool)
+                except Exception as e:
+                    events.logger.error(f"Scan worker failed on {file_path}: {e!r}")
+                    result = None
+                if not _put(results, (file_path, st, result), halt):
+                    break
+        finally:
+            _put(results, _DONE, halt)
+
+    # Scan one file on this thread, or in the process pool when there is one
+    # Pool workers received the detection content of the pass when they started (see _init_worker)
+    def _scan(self, file_path, pool):
+        if pool is None:
+            return self.defender.inspect_file(file_path)
+        # Each worker thread keeps exactly one file in flight in the process pool
+        start = time.perf_counter()
+        result = pool.submit(_scan_in_worker, file_path).result()
+        HASH_SECONDS.observe(time.perf_counter() - start)
+        if result is not None and result.size:
+            HASHED_BYTES.inc(result.size)
+        return result
@@ -0,0 +1,368 @@
+# Prioritized, budgeted scanning for the Intelligent Defence System
+# Pending files are ordered by a risk score (suspicious extension, executable bits, recent modification,
+# location and size), so a freshly dropped executable is hashed before a multi-gigabyte disk image
+# Each cycle stops at a wall-time and bytes-read budget; a large file is hashed across several cycles,
+# resuming where it stopped, and reads are paced by a token bucket to leave I/O for the host's workload
+# Developed for monitoring and threat response for the Indian Armed Forces
+
+import os  # File reads and stat checks when a partially hashed file is resumed
+import math  # Size penalty of the risk score
+import time  # Budgets, pacing and latency measurement
+import heapq  # Pending files ordered by risk
+from walker import walk_files, normalize_glob_path  # Streaming walker; '/'-separated paths on Windows
+from archive_scan import is_archive  # Files whose verdict reads them again as archives
+from multiscan import ContentScan  # Resumable single-pass digests and pattern matching
+from hash_io import open_for_scan, advise, buffer_size_for  # Read helpers shared with the scanners
+from metrics import HASHED_BYTES  # Bytes read by the hashing pass
+
+# Risk score weights
+RISK_SUSPICIOUS_EXTENSION = 40
+RISK_EXECUTABLE = 25
+# (age limit in seconds, points): the most recent band that a file's mtime falls into counts
+RISK_RECENCY = ((3600, 30), (86400, 15), (7 * 86400, 5))
+# (path fragment, points): staging areas where dropped payloads usually land
+# Fragments use '/' separators and also match Windows paths, where they compare case-insensitively
+RISK_LOCATIONS = (('/tmp/', 20), ('/var/tmp/', 20), ('/dev/shm/', 25), ('/AppData/Local/Temp/', 20),
+                  ('/Windows/Temp/', 20), ('/Downloads/', 15), ('/.cache/', 10))
+# Files above SIZE_PIVOT lose RISK_SIZE_SLOPE points per doubling, up to RISK_SIZE_MAX_PENALTY
+SIZE_PIVOT = 1 << 20
+RISK_SIZE_SLOPE = 5
+RISK_SIZE_MAX_PENALTY = 40
+
+# Files scoring at least this much are reported as high-risk (time from discovery to verdict)
+HIGH_RISK_SCORE = 50
+
+# Largest read between two budget and pacing checks
+QUEUE_CHUNK = 1 << 20
+
+# Share of the time budget a cycle may spend walking the tree, in total, while files are waiting to be hashed
+WALK_SHARE = 0.5
+
+# Burst allowed by the I/O throttle, in seconds of its rate (never less than one read)
+THROTTLE_BURST_SECONDS = 0.1
+
+# Weight of the newest verdict in the running estimate of how long recording a verdict takes
+RECORD_COST_WEIGHT = 0.25
+
+
+# Risk score of a file; higher is scanned first
+#   extensions: suspicious extensions (lower case, with the dot); locations: (path fragment, points) pairs
+def risk_score(path, st, now=None, extensions=(), locations=RISK_LOCATIONS):
+    now = time.time() if now is None else now
+    score = 0
+    if os.path.splitext(path)[1].lower() in extensions:
+        score += RISK_SUSPICIOUS_EXTENSION
+    if st.st_mode & 0o111:
+        score += RISK_EXECUTABLE
+    age = now - st.st_mtime
+    for limit, points in RISK_RECENCY:
+        if age < limit:
+            score += points
+            break
+    target = normalize_glob_path(path)
+    for fragment, points in locations:
+        if normalize_glob_path(fragment) in target:
+            score += points
+    if st.st_size > SIZE_PIVOT:
+        score -= min(RISK_SIZE_MAX_PENALTY, RISK_SIZE_SLOPE * math.log2(st.st_size / SIZE_PIVOT))
+    return score
+
+
+# Token bucket pacing reads to `rate` bytes per second, allowing bursts of up to `burst` bytes
+class IOThrottle:
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else rate)
+        self.tokens = self.burst
+        self.stamp = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    # Seconds to wait before `amount` bytes may be read
+    def delay(self, amount):
+        self._refill()
+        # A read larger than the burst only has to wait for a full bucket
+        needed = min(amount, self.burst)
+        return 0.0 if self.tokens >= needed else (needed - self.tokens) / self.rate
+
+    # Charge `amount` bytes that were read
+    def take(self, amount):
+        self._refill()
+        self.tokens -= amount
+
+
+# Summary of one cycle, returned by ScanQueue.run_cycle
+# Unlike ScanStats, bytes counts what this cycle read, including parts of files finished in another cycle
+class CycleStats:
+    def __init__(self):
+        # Files seen by the walk in this cycle, and files whose verdict was reached
+        self.files = 0
+        self.hashed = 0
+        # Bytes read in this cycle
+        self.bytes = 0
+        self.detections = 0
+        self.suspicious = 0
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+        self.cancelled = False
+        # Why the cycle ended: 'time', 'bytes', 'complete' (the pass finished) or 'cancelled'
+        self.stopped = None
+        # Files left for later cycles, including one partly hashed file
+        self.pending = 0
+        # Seconds from the start of the cycle to its first malware verdict
+        self.first_detection = None
+        # Seconds from discovery to verdict of that first detection
+        self.detection_latency = None
+        # High-risk files finished in this cycle and the longest time one of them waited for its verdict
+        self.high_risk = 0
+        self.high_risk_latency = None
+        # Seconds spent waiting on the I/O throttle
+        self.throttled = 0.0
+        # Seconds the cycle ran past its time budget; a verdict already under way is never cut short
+        self.overrun = 0.0
+
+    @property
+    def files_per_second(self):
+        return self.files / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def mb_per_second(self):
+        return self.bytes / 1e6 / self.elapsed if self.elapsed else 0.0
+
+    # Record as a plain dict for JSON output
+    def as_dict(self):
+        return {'files': self.files, 'hashed': self.hashed, 'bytes': self.bytes, 'detections': self.detections,
+                'suspicious': self.suspicious, 'elapsed': round(self.elapsed, 6), 'stopped': self.stopped,
+                'pending': self.pending, 'first_detection_seconds': self.first_detection,
+                'detection_latency_seconds': self.detection_latency, 'high_risk': self.high_risk,
+                'high_risk_latency_seconds': self.high_risk_latency, 'throttled_seconds': round(self.throttled, 6),
+                'overrun_seconds': round(self.overrun, 6),
+                'files_per_second': round(self.files_per_second, 1), 'mb_per_second': round(self.mb_per_second, 3)}
+
+
+# Risk-ordered queue of the files below one directory, scanned by a SystemDefender in budgeted cycles
+#   extensions / locations: risk score inputs (see risk_score)
+#   io_rate: bytes per second allowed for hashing reads, or None for no pacing
+#   max_pending: files held in the queue at once; the walk resumes as the queue drains
+# Extra keyword arguments are walker filters (include, exclude, max_depth, one_filesystem, ...)
+class ScanQueue:
+    def __init__(self, defender, directory, extensions=(), locations=RISK_LOCATIONS, io_rate=None,
+                 max_pending=100000, **walk_options):
+        self.defender = defender
+        self.directory = directory
+        self.extensions = frozenset(extensions)
+        self.locations = locations
+        self.throttle = IOThrottle(io_rate, max(QUEUE_CHUNK, io_rate * THROTTLE_BURST_SECONDS)) if io_rate else None
+        self.max_pending = max_pending
+        self.walk_options = walk_options
+        # Heap of [-score, sequence, path, stat, discovered, ContentScan of a partly hashed file or None]
+        self._heap = []
+        self._sequence = 0
+        # Walk generator of the current pass: None before it starts, False once exhausted
+        self._walk = None
+        # Completed passes over the tree
+        self.passes = 0
+        # Running estimate of the seconds one record_result call takes (archives, cache writes, deletions)
+        self.record_cost = None
+
+    # Files waiting, including a partly hashed one
+    def __len__(self):
+        return len(self._heap)
+
+    # Add a file to the queue unless it is unchanged since it was found clean or already reported suspicious
+    def add(self, path, st, now=None):
+        if self.defender.cache.is_settled(st):
+            return False
+        score = risk_score(path, st, now, self.extensions, self.locations)
+        self._sequence += 1
+        heapq.heappush(self._heap, [-score, self._sequence, path, st, time.perf_counter(), None])
+        return True
+
+    # Pull entries from the walk until it is exhausted, the queue is full or `deadline` passes
+    # Returns the number of files seen (cached ones included)
+    def _fill(self, deadline):
+        if self._walk is None:
+            self._walk = walk_files(self.directory, **self.walk_options)
+        seen = 0
+        now = time.time()
+        clock = time.perf_counter
+        for entry in self._walk:
+            seen += 1
+            self.add(entry.path, entry.stat, now)
+            if len(self._heap) >= self.max_pending or (deadline is not None and clock() >= deadline):
+                return seen
+        self._walk = False
+        return seen
+
+    # Run one cycle: hash the riskiest pending files until the time or bytes budget is spent
+    #   time_budget: seconds; byte_budget: bytes read; either may be None for no limit
+    #   cancel: optional threading.Event stopping the cycle early
+    # Unfinished work, including a partly hashed file, is carried over to the next cycle
+    # A verdict expected to end past the deadline is left for the next cycle; any overrun is in stats.overrun
+    def run_cycle(self, time_budget=None, byte_budget=None, cancel=None):
+        clock = time.perf_counter
+        stats = CycleStats()
+        start = stats.started
+        deadline = start + time_budget if time_budget is not None else None
+        # A finished pass starts a new one; unchanged files cost one cache lookup
+        if self._walk is False and not self._heap:
+            self._walk = None
+        # Seconds of this cycle the walk may take while there are files to hash
+        walk_share = time_budget * WALK_SHARE if time_budget is not None else None
+        walked = 0.0
+        remaining = byte_budget
+        while True:
+            if cancel is not None and cancel.is_set():
+                stats.cancelled = True
+                stats.stopped = 'cancelled'
+                break
+            # Keep the queue topped up while the walk lasts, within the walk's share of the cycle
+            if self._walk is not False and len(self._heap) < self.max_pending // 2:
+                began = clock()
+                stats.files += self._fill(min(deadline, began + max(0.0, walk_share - walked))
+                                          if deadline is not None else None)
+                walked += clock() - began
+            if not self._heap:
+                if not self._walk:
+                    stats.stopped = 'complete'
+                    self.passes += 1
+                    break
+                if deadline is not None and clock() >= deadline:
+                    stats.stopped = 'time'
+                    break
+                # Nothing queued yet (unchanged files so far): the walk goes on, one entry per round
+                continue
+            if deadline is not None and clock() >= deadline:
+                stats.stopped = 'time'
+                break
+            if remaining is not None and remaining <= 0:
+                stats.stopped = 'bytes'
+                break
+            item = heapq.heappop(self._heap)
+            finished, read = self._hash(item, deadline, remaining, stats)
+            stats.bytes += read
+            HASHED_BYTES.inc(read)
+            if remaining is not None:
+                remaining -= read
+            if not finished:
+                # Back in the queue with its progress; files that became riskier since may overtake it
+                heapq.heappush(self._heap, item)
+                continue
+            # A verdict that would not fit before the deadline waits for the next cycle, which records it
+            # without reading the file again; every cycle records at least one, so the queue always moves
+            if deadline is not None and stats.hashed and clock() + (self.record_cost or 0.0) >= deadline:
+                heapq.heappush(self._heap, item)
+                stats.stopped = 'time'
+                break
+            # So does an archive whose second read, to scan its members, would not fit in the bytes left
+            rereads = self._archive_bytes(item)
+            if rereads and remaining is not None and stats.hashed and rereads > remaining:
+                heapq.heappush(self._heap, item)
+                stats.stopped = 'bytes'
+                break
+            recording = clock()
+            self._record(item, stats, start, rereads)
+            cost = clock() - recording
+            stats.bytes += rereads
+            if remaining is not None:
+                remaining -= rereads
+            self.record_cost = cost if self.record_cost is None else \
+                self.record_cost + RECORD_COST_WEIGHT * (cost - self.record_cost)
+        stats.pending = len(self._heap)
+        # Persist the verdicts gathered during this cycle, inside its time
+        self.defender.cache.flush()
+        stats.elapsed = clock() - start
+        if time_budget is not None:
+            stats.overrun = max(0.0, stats.elapsed - time_budget)
+        return stats
+
+    # Bytes the verdict of a fully hashed file reads again: the whole file when its members are scanned as an
+    # archive, otherwise none
+    def _archive_bytes(self, item):
+        path, st, scan = item[2], item[3], item[5]
+        if scan is None or self.defender.archive_limits is None or not is_archive(path, scan.head):
+            return 0
+        return st.st_size
+
+    # Act on the verdict of a fully hashed file and update the cycle's latency figures
+    # `rereads` is the size of an archive scanned for members here; that read waits for and is charged to the
+    # throttle like the hashing reads
+    def _record(self, item, stats, start, rereads=0):
+        negative_score, _, path, st, discovered, scan = item
+        result = scan.result() if scan is not None else None
+        if rereads:
+            throttle = self.throttle
+            if throttle is not None:
+                wait = throttle.delay(rereads)
+                if wait:
+                    time.sleep(wait)
+                    stats.throttled += wait
+            result = result._replace(archive=self.defender.inspect_archive(path))
+            if throttle is not None:
+                throttle.take(rereads)
+        verdict = self.defender.record_result(path, st, result)
+        now = time.perf_counter()
+        stats.hashed += 1
+        if verdict == 'malware':
+            stats.detections += 1
+            if stats.first_detection is None:
+                stats.first_detection = round(now - start, 6)
+                stats.detection_latency = round(now - discovered, 6)
+        elif verdict == 'suspicious':
+            stats.suspicious += 1
+        if -negative_score >= HIGH_RISK_SCORE:
+            stats.high_risk += 1
+            stats.high_risk_latency = round(max(stats.high_risk_latency or 0.0, now - discovered), 6)
+
+    # Hash one queued file from where it stopped, within the deadline, the bytes left and the throttle
+    # Returns (finished, bytes read); an unreadable file counts as finished with no ContentScan
+    def _hash(self, item, deadline, remaining, stats):
+        path, st, scan = item[2], item[3], item[5]
+        io = self.defender.io_options
+        try:
+            fd = open_for_scan(path, io.noatime)
+        except OSError:
+            item[5] = None
+            return True, 0
+        read = 0
+        try:
+            current = os.fstat(fd)
+            # A file changed since it was queued (or since a partial read) is hashed again from the start
+            if scan is None or (current.st_size, current.st_mtime_ns) != (st.st_size, st.st_mtime_ns):
+                scan = item[5] = ContentScan(self.defender.scan_algorithms(), self.defender.matcher)
+                item[3] = st = current
+            advise(fd, 'POSIX_FADV_SEQUENTIAL')
+            os.lseek(fd, scan.offset, os.SEEK_SET)
+            size = min(buffer_size_for(st.st_size), QUEUE_CHUNK)
+            throttle = self.throttle
+            clock = time.perf_counter
+            while True:
+                want = size if remaining is None else min(size, remaining - read)
+                if want <= 0:
+                    return False, read
+                if throttle is not None:
+                    wait = throttle.delay(want)
+                    if wait:
+                        if deadline is not None and clock() + wait >= deadline:
+                            return False, read
+                        time.sleep(wait)
+                        stats.throttled += wait
+                chunk = os.read(fd, want)
+                if not chunk:
+                    return True, read
+                if throttle is not None:
+                    throttle.take(len(chunk))
+                scan.feed(chunk)
+                read += len(chunk)
+                if deadline is not None and clock() >= deadline:
+                    return False, read
+        except OSError:
+            item[5] = None
+            return True, read
+        finally:
+            if io.drop_cache:
+                advise(fd, 'POSIX_FADV_DONTNEED')
+            os.close(fd)
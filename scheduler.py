@@ -0,0 +1,174 @@
+# Periodic task scheduler for the Intelligent Defence System
+# Runs each monitor as an independent periodic task with its own interval, jitter and priority,
+# skips ticks instead of piling them up when a task overruns, and keeps per-task timing counters
+# Developed for monitoring and threat response for the Indian Armed Forces
+
+import time  # Monotonic clock for deadlines and run times
+import heapq  # Queue of upcoming ticks ordered by due time and priority
+import random  # Jitter spreads ticks so tasks do not fire in lockstep
+from events import logger  # Records task failures
+from metrics import TASK_SECONDS, TASK_MISSED  # Task run-time and missed-tick metrics
+import threading  # Dispatcher thread, stop signalling and counter locking
+from concurrent.futures import ThreadPoolExecutor  # Workers that run task bodies
+
+
+# One periodic task and its counters
+#   interval: seconds between ticks; jitter: up to this many extra seconds added to each tick
+#             (ticks stay on the interval grid: jitter only delays a run, it never shifts the next tick)
+#   priority: when more tasks are due than there are free workers, higher priority runs first
+class PeriodicTask:
+    def __init__(self, name, func, interval, jitter=0.0, priority=0):
+        self.name = name
+        self.func = func
+        self.interval = float(interval)
+        self.jitter = float(jitter)
+        self.priority = priority
+        # Counters exposed through Scheduler.stats()
+        self.runs = 0
+        self.errors = 0
+        self.missed_ticks = 0
+        self.last_runtime = 0.0
+        self.max_runtime = 0.0
+        self.total_runtime = 0.0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        # True while a run of this task is in progress
+        self.running = False
+
+    # Snapshot of the counters as a plain dictionary
+    def stats(self):
+        return {
+            'interval': self.interval,
+            'priority': self.priority,
+            'runs': self.runs,
+            'errors': self.errors,
+            'missed_ticks': self.missed_ticks,
+            'last_runtime': self.last_runtime,
+            'max_runtime': self.max_runtime,
+            'mean_runtime': self.total_runtime / self.runs if self.runs else 0.0,
+            'last_lag': self.last_lag,
+            'max_lag': self.max_lag,
+        }
+
+
+# Scheduler running PeriodicTasks on a small worker pool
+#   workers: number of task bodies that may run at once (defaults to one per task)
+class Scheduler:
+    def __init__(self, tasks=(), workers=None):
+        self.tasks = list(tasks)
+        self.workers = workers
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        # Woken whenever a task finishes, so the dispatcher can start waiting tasks
+        self._changed = threading.Condition(self._lock)
+        self._active = 0
+
+    # Register a task before run() is called
+    def add(self, task):
+        self.tasks.append(task)
+        return task
+
+    # Ask the scheduler to stop; running task bodies are allowed to finish
+    def stop(self):
+        self._stop.set()
+        with self._changed:
+            self._changed.notify_all()
+
+    # Per-task counters keyed by task name
+    def stats(self):
+        with self._lock:
+            return {task.name: task.stats() for task in self.tasks}
+
+    # Time of the next tick after `due`, skipping ticks that have already passed
+    # Both are unjittered, so the ticks of a task stay `interval` apart however much jitter is drawn
+    def _next_due(self, task, due, now):
+        due += task.interval
+        if due <= now:
+            # Overran: count every tick that could not run instead of queueing them all
+            skipped = int((now - due) // task.interval) + 1
+            task.missed_ticks += skipped
+            due += skipped * task.interval
+        return due
+
+    # Time a tick due at `due` actually fires, with the task's jitter added
+    def _fire_time(self, task, due):
+        return due + (random.uniform(0, task.jitter) if task.jitter else 0.0)
+
+    # Body executed on a worker thread
+    def _execute(self, task, due):
+        start = time.monotonic()
+        lag = start - due
+        try:
+            task.func()
+        except Exception as e:
+            with self._lock:
+                task.errors += 1
+            logger.error(f"Task {task.name} failed: {e}")
+        runtime = time.monotonic() - start
+        with self._changed:
+            task.running = False
+            task.runs += 1
+            task.last_runtime = runtime
+            task.max_runtime = max(task.max_runtime, runtime)
+            task.total_runtime += runtime
+            task.last_lag = lag
+            task.max_lag = max(task.max_lag, lag)
+            missed = task.missed_ticks
+            self._active -= 1
+            self._changed.notify_all()
+        TASK_SECONDS.labels(task.name).observe(runtime)
+        TASK_MISSED.labels(task.name).set(missed)
+
+    # True once the run budget is used up
+    def _budget_spent(self, deadline, cycles):
+        if deadline is not None and time.monotonic() >= deadline:
+            return True
+        return cycles is not None and all(task.runs >= cycles for task in self.tasks)
+
+    # Run until stop() is called or the budget is spent
+    #   duration: stop after this many seconds
+    #   cycles: stop once every task has completed this many runs
+    # With neither, runs as a daemon until stop() is called
+    def run(self, duration=None, cycles=None):
+        self._stop.clear()
+        if not self.tasks:
+            return self.stats()
+        workers = self.workers or len(self.tasks)
+        deadline = time.monotonic() + duration if duration is not None else None
+        now = time.monotonic()
+        # Heap entries: (fire time, -priority, sequence, task, unjittered due time); every task fires at start-up
+        heap = [(now, -task.priority, i, task, now) for i, task in enumerate(self.tasks)]
+        heapq.heapify(heap)
+        sequence = len(heap)
+        pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='defence-task')
+        try:
+            while not self._stop.is_set() and not self._budget_spent(deadline, cycles):
+                with self._changed:
+                    now = time.monotonic()
+                    fire, _, _, task, due = heap[0]
+                    if fire > now:
+                        # Nothing due: sleep until the next tick, a finished task or stop()
+                        wait = fire - now
+                        if deadline is not None:
+                            wait = min(wait, max(0.0, deadline - now))
+                        self._changed.wait(min(wait, 0.5))
+                        continue
+                    if self._active >= workers and not task.running:
+                        # Every worker is busy: wait for one; the heap keeps higher priority tasks first
+                        self._changed.wait(0.5)
+                        continue
+                    heapq.heappop(heap)
+                    if task.running:
+                        # Still busy with the previous tick: skip this one rather than piling up
+                        task.missed_ticks += 1
+                    else:
+                        task.running = True
+                        self._active += 1
+                        pool.submit(self._execute, task, fire)
+                    next_due = self._next_due(task, due, now)
+                    heapq.heappush(heap, (self._fire_time(task, next_due), -task.priority, sequence, task, next_due))
+                    sequence += 1
+        finally:
+            # Graceful shutdown: wait for running task bodies to return
+            pool.shutdown(wait=True)
+        return self.stats()
@@ -0,0 +1,371 @@
+# Compact on-disk signature store for the Intelligent Defence System
+# Holds malware digests as a sorted array of raw bytes in a memory-mapped file
+# Lookups use a two-byte prefix bucket index followed by a binary search inside the bucket
+# Developed for monitoring and threat response for the Indian Armed Forces
+#
+# File layout (little endian):
+#   header   magic (8 bytes), digest size (uint16), reserved (uint16), count (uint64), content sha256 (32 bytes)
+#   index    65537 uint32 offsets; bucket p holds digests index[p]..index[p+1] whose first two bytes equal p
+#   digests  count * digest size bytes, sorted and unique
+
+import os  # File replacement, stat and descriptor handling
+import sys  # Byte order check for the index array
+import mmap  # Zero-copy read-only mapping of the digest array
+import heapq  # Merges sorted runs and base stores while compiling
+import struct  # Packs and unpacks the fixed-size header
+import hashlib  # Content checksum used as the store fingerprint
+import tempfile  # Temporary files for sorted runs and atomic replacement
+import argparse  # Command-line interface for compiling and inspecting stores
+from array import array  # Compact uint32 array for the bucket index
+import events  # Shared 'defender' logger for stores that fail to load
+
+# Magic bytes identifying a signature store file
+MAGIC = b'RAJSIG1\0'
+
+# Header: magic, digest size, reserved, count, content sha256
+HEADER = struct.Struct('<8sHHQ32s')
+
+# Number of prefix buckets (every possible value of the first two digest bytes) plus the end offset
+INDEX_ENTRIES = 65537
+
+# Byte offset of the digest array within the file
+DATA_OFFSET = HEADER.size + INDEX_ENTRIES * 4
+
+# Default location of the compiled SHA-256 signature database
+DEFAULT_SIGNATURE_PATH = 'signatures.sig'
+
+# Number of digests sorted in memory at once while compiling large feeds
+RUN_SIZE = 1000000
+
+
+# Raised when a signature store file is missing its header or is truncated
+class SignatureStoreError(ValueError):
+    pass
+
+
+# Convert a digest given as hex text or raw bytes into raw bytes of the expected size
+# Returns None when the value is not a valid digest
+def parse_digest(value, digest_size=32):
+    if isinstance(value, str):
+        value = value.strip()
+        if len(value) != digest_size * 2:
+            return None
+        try:
+            return bytes.fromhex(value)
+        except ValueError:
+            return None
+    value = bytes(value)
+    return value if len(value) == digest_size else None
+
+
+# Read-only sorted digest array with prefix-bucket lookups
+# Backed by an mmap when opened from a file, or by a bytes object when built in memory
+class SignatureStore:
+    # Wrap an already validated buffer; use open() or from_digests() instead of calling this directly
+    def __init__(self, buffer, path=None):
+        if len(buffer) < DATA_OFFSET:
+            raise SignatureStoreError('signature store is truncated')
+        magic, digest_size, _, count, checksum = HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC:
+            raise SignatureStoreError('not a signature store')
+        if len(buffer) < DATA_OFFSET + count * digest_size:
+            raise SignatureStoreError('signature store is truncated')
+        self._buffer = buffer
+        self.path = path
+        self.digest_size = digest_size
+        self.count = count
+        # The content checksum doubles as the fingerprint used to invalidate cached verdicts
+        self.fingerprint = checksum.hex()
+        # Copy the 256 KiB index into an array once; digests themselves stay in the mapping
+        self._index = array('I')
+        self._index.frombytes(buffer[HEADER.size:DATA_OFFSET])
+        if sys.byteorder != 'little':
+            self._index.byteswap()
+
+    # Map a compiled store file into memory
+    @classmethod
+    def open(cls, path):
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < DATA_OFFSET:
+                raise SignatureStoreError(f'{path}: signature store is truncated')
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(buffer, path)
+
+    # Build an in-memory store from hex strings or raw digests; invalid entries are skipped
+    @classmethod
+    def from_digests(cls, digests, digest_size=32):
+        unique = sorted({d for d in (parse_digest(v, digest_size) for v in digests) if d is not None})
+        out = bytearray(DATA_OFFSET)
+        index = _build_index(unique)
+        data = b''.join(unique)
+        out[HEADER.size:DATA_OFFSET] = index.tobytes()
+        HEADER.pack_into(out, 0, MAGIC, digest_size, 0, len(unique), hashlib.sha256(data).digest())
+        return cls(bytes(out) + data)
+
+    # Membership test by raw digest (hex strings are accepted and decoded for convenience)
+    def __contains__(self, digest):
+        if isinstance(digest, str):
+            digest = parse_digest(digest, self.digest_size)
+        if digest is None or len(digest) != self.digest_size:
+            return False
+        size = self.digest_size
+        bucket = (digest[0] << 8) | digest[1]
+        lo, hi = self._index[bucket], self._index[bucket + 1]
+        buffer = self._buffer
+        # Binary search inside the bucket, comparing raw digest slices
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = DATA_OFFSET + mid * size
+            probe = buffer[start:start + size]
+            if probe < digest:
+                lo = mid + 1
+            elif probe > digest:
+                hi = mid
+            else:
+                return True
+        return False
+
+    # Number of digests in the store
+    def __len__(self):
+        return self.count
+
+    # Iterate over all digests in sorted order
+    def __iter__(self):
+        size = self.digest_size
+        for i in range(self.count):
+            start = DATA_OFFSET + i * size
+            yield bytes(self._buffer[start:start + size])
+
+
+# Holder for the live signature store that can be swapped while scans are running
+# Readers always see either the old or the new store, never a partially written one
+class SignatureDatabase:
+    # Open the store at `path`; `fallback` is used while no compiled file exists (or path is None)
+    def __init__(self, path=DEFAULT_SIGNATURE_PATH, fallback=None):
+        self.path = path
+        self.fallback = fallback if fallback is not None else SignatureStore.from_digests(())
+        self.current = self.fallback
+        self._identity = None
+        self.reload()
+
+    # Reopen the store if the file was replaced since it was last loaded
+    # Returns True when a new store was swapped in
+    # A corrupt or half-copied file is logged and the store in use (or the fallback) is kept until the file
+    # changes again, so a bad feed update never stops the defender
+    def reload(self):
+        identity = None
+        if self.path is not None:
+            try:
+                st = os.stat(self.path)
+            except OSError:
+                pass
+            else:
+                identity = (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+        if identity == self._identity:
+            return False
+        if identity is None:
+            store = self.fallback
+        else:
+            try:
+                store = SignatureStore.open(self.path)
+            except (SignatureStoreError, OSError) as e:
+                events.logger.error(f"Cannot load signature store {self.path}: {e}; keeping the previous signatures")
+                self._identity = identity
+                return False
+        # A single attribute assignment is atomic; the old mapping is released once no scan uses it
+        self.current = store
+        self._identity = identity
+        return True
+
+    # Fingerprint of the store currently in use
+    @property
+    def fingerprint(self):
+        return self.current.fingerprint
+
+    # Digest size of the store currently in use
+    @property
+    def digest_size(self):
+        return self.current.digest_size
+
+    # Membership test against the store currently in use
+    def __contains__(self, digest):
+        return digest in self.current
+
+    # Number of digests in the store currently in use
+    def __len__(self):
+        return len(self.current)
+
+    # Iterate over the digests of the store currently in use
+    def __iter__(self):
+        return iter(self.current)
+
+
+# Build the prefix bucket index for a sorted sequence of digests
+def _build_index(digests):
+    counts = array('I', bytes(4 * INDEX_ENTRIES))
+    for d in digests:
+        counts[((d[0] << 8) | d[1]) + 1] += 1
+    for i in range(1, INDEX_ENTRIES):
+        counts[i] += counts[i - 1]
+    if sys.byteorder != 'little':
+        counts.byteswap()
+    return counts
+
+
+# Parse feed lines into raw digests, yielding (digest, removed) pairs as the lines are read
+# Lines hold one hex digest, optionally followed by a comment; '#' starts a comment line
+# Lines starting with '+' or '-' are delta additions or removals (removed is True for '-')
+# Invalid lines are appended to `errors` as (source, line number, text) and skipped
+def parse_feed(lines, digest_size=32, source='<feed>', errors=None):
+    for lineno, line in enumerate(lines, 1):
+        text = line.strip()
+        if not text or text.startswith('#'):
+            continue
+        removed = False
+        if text[0] in '+-':
+            removed = text[0] == '-'
+            text = text[1:].strip()
+        digest = parse_digest(text.split()[0] if text else '', digest_size)
+        if digest is None:
+            if errors is not None:
+                errors.append((source, lineno, line.rstrip('\n')))
+            continue
+        yield digest, removed
+
+
+# Write a sorted, possibly duplicated stream of digests to a temporary run file
+def _write_run(digests, directory):
+    digests.sort()
+    run = tempfile.TemporaryFile(dir=directory)
+    run.write(b''.join(digests))
+    run.seek(0)
+    return run
+
+
+# Read digests back from a run file in order
+def _read_run(run, digest_size):
+    while True:
+        chunk = run.read(digest_size * 4096)
+        if not chunk:
+            return
+        for i in range(0, len(chunk), digest_size):
+            yield chunk[i:i + digest_size]
+
+
+# Compile feed files into a store at `out_path`, replacing it atomically
+#   sources: paths of feed files (see parse_feed for the line format)
+#   base: optional existing store path to merge with, which makes the feeds an incremental delta
+#   remove: extra digests to drop from the result
+# Returns (digest count, list of invalid feed lines)
+def compile_signatures(sources, out_path, digest_size=32, base=None, remove=()):
+    errors = []
+    directory = os.path.dirname(os.path.abspath(out_path))
+    removals = {d for d in (parse_digest(v, digest_size) for v in remove) if d is not None}
+    runs, pending = [], []
+    # Sort feeds in runs of at most RUN_SIZE digests, spilled while the feed is read, so tens of millions of
+    # digests never sit in memory as objects however large a single feed file is
+    for source in sources:
+        with open(source, 'r', encoding='utf-8', errors='replace') as f:
+            for digest, removed in parse_feed(f, digest_size, source, errors):
+                if removed:
+                    removals.add(digest)
+                    continue
+                pending.append(digest)
+                if len(pending) >= RUN_SIZE:
+                    runs.append(_write_run(pending, directory))
+                    pending = []
+    if pending:
+        runs.append(_write_run(pending, directory))
+    streams = [_read_run(run, digest_size) for run in runs]
+    base_store = None
+    if base is not None and os.path.exists(base):
+        base_store = SignatureStore.open(base)
+        if base_store.digest_size != digest_size:
+            raise SignatureStoreError(f'{base}: digest size {base_store.digest_size} != {digest_size}')
+        streams.append(iter(base_store))
+    try:
+        count = _write_store(heapq.merge(*streams), out_path, digest_size, removals)
+    finally:
+        for run in runs:
+            run.close()
+    return count, errors
+
+
+# Write a sorted digest stream to `out_path` via a temporary file and an atomic rename
+# Duplicates and digests in `removals` are dropped; returns the number of digests written
+def _write_store(digests, out_path, digest_size, removals=frozenset()):
+    directory = os.path.dirname(os.path.abspath(out_path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.sig-')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            out.write(bytes(DATA_OFFSET))
+            counts = array('I', bytes(4 * INDEX_ENTRIES))
+            checksum = hashlib.sha256()
+            count, previous, batch = 0, None, []
+            for digest in digests:
+                if digest == previous or digest in removals:
+                    continue
+                previous = digest
+                counts[((digest[0] << 8) | digest[1]) + 1] += 1
+                batch.append(digest)
+                count += 1
+                if len(batch) >= 65536:
+                    data = b''.join(batch)
+                    checksum.update(data)
+                    out.write(data)
+                    batch = []
+            data = b''.join(batch)
+            checksum.update(data)
+            out.write(data)
+            for i in range(1, INDEX_ENTRIES):
+                counts[i] += counts[i - 1]
+            if sys.byteorder != 'little':
+                counts.byteswap()
+            out.seek(0)
+            out.write(HEADER.pack(MAGIC, digest_size, 0, count, checksum.digest()))
+            out.write(counts.tobytes())
+            out.flush()
+            os.fsync(out.fileno())
+        # Readers holding the old mapping keep working; new opens see the complete new file
+        os.replace(tmp_path, out_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return count
+
+
+# Command-line entry point: compile feeds, apply deltas and inspect stores
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compile and inspect malware signature stores')
+    sub = parser.add_subparsers(dest='command', required=True)
+    build = sub.add_parser('compile', help='compile feed files into a new store')
+    build.add_argument('output')
+    build.add_argument('feeds', nargs='+')
+    build.add_argument('--digest-size', type=int, default=32, help='digest size in bytes (32 for SHA-256)')
+    delta = sub.add_parser('delta', help='apply +/- delta feeds to an existing store in place')
+    delta.add_argument('store')
+    delta.add_argument('feeds', nargs='+')
+    info = sub.add_parser('info', help='show store details')
+    info.add_argument('store')
+    args = parser.parse_args(argv)
+
+    if args.command == 'info':
+        store = SignatureStore.open(args.store)
+        print(f'{args.store}: {len(store)} digests of {store.digest_size} bytes, fingerprint {store.fingerprint}')
+        return 0
+    if args.command == 'compile':
+        count, errors = compile_signatures(args.feeds, args.output, args.digest_size)
+        output = args.output
+    else:
+        digest_size = SignatureStore.open(args.store).digest_size
+        count, errors = compile_signatures(args.feeds, args.store, digest_size, base=args.store)
+        output = args.store
+    for source, lineno, text in errors:
+        print(f'{source}:{lineno}: invalid digest skipped: {text}', file=sys.stderr)
+    print(f'Wrote {count} digests to {output}')
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
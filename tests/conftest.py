@@ -0,0 +1,73 @@
+# Shared fixtures for the Intelligent Defence System tests
+# Developed for monitoring and threat response for the Indian Armed Forces
+
+import os  # Repository root on the import path
+import sys  # Import path of the flat top-level modules
+import hashlib  # Digests planted in the test signature store
+import pytest  # Fixtures
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import events  # noqa: E402  Event pipeline feeding the recording sink
+from signature_store import compile_signatures  # noqa: E402  Test signature store
+
+# Content whose SHA-256 digest is planted in the signature store of the `defender` fixture
+MALWARE = b'test malware payload\n'
+
+
+# Sink keeping every event it is given, for assertions on alerts and actions
+class RecordingSink:
+    def __init__(self):
+        self.events = []
+
+    def write_batch(self, batch):
+        self.events.extend(batch)
+
+    def close(self):
+        pass
+
+    def kinds(self):
+        return [event.kind for event in self.events]
+
+
+@pytest.fixture
+def signature_path(tmp_path):
+    feed = tmp_path / 'feed.txt'
+    feed.write_text(hashlib.sha256(MALWARE).hexdigest() + '\n')
+    path = tmp_path / 'signatures.sig'
+    compile_signatures([str(feed)], str(path))
+    return str(path)
+
+
+# Build a SystemDefender with an in-memory cache, the test signatures and a recording sink
+# Returns (defender, sink); the event pipeline is closed when the test ends
+@pytest.fixture
+def make_defender(tmp_path, signature_path):
+    from raj9 import SystemDefender
+    created = []
+
+    def make(**options):
+        sink = RecordingSink()
+        options.setdefault('cache_path', None)
+        options.setdefault('signature_path', signature_path)
+        options.setdefault('rules_path', str(tmp_path / 'no-rules.json'))
+        defender = SystemDefender(event_pipeline=events.EventPipeline([sink], dedup_window=0), **options)
+        created.append(defender)
+        return defender, sink
+
+    yield make
+    for defender in created:
+        defender.events.close()
+
+
+# Make every os.remove fail with PermissionError; yields the list of paths deletion was attempted on
+@pytest.fixture
+def failing_remove(monkeypatch):
+    attempts = []
+
+    def remove(path, *args, **kwargs):
+        attempts.append(path)
+        raise PermissionError(13, 'Permission denied', path)
+
+    monkeypatch.setattr(os, 'remove', remove)
+    return attempts
@@ -0,0 +1,144 @@
+# Tests for scanning inside archives, including archives that do not carry an archive extension
+# Developed for monitoring and threat response for the Indian Armed Forces
+
+import io  # In-memory tar members
+import os  # Incompressible member data
+import gzip  # Compressed single-file archives
+import lzma  # Nested xz member
+import hashlib  # Expected member digests
+import tarfile  # Tar archives
+import tempfile  # Spooling watched by the nested archive tests
+import zipfile  # Zip archives
+import pytest  # Fixtures and parametrisation
+import events  # Event kinds
+import archive_scan  # Spool patched by the nested archive tests
+from archive_scan import ArchiveLimits, is_archive, scan_archive  # Archive detection and member scanning
+from conftest import MALWARE  # Planted malware content
+
+
+def write_zip(path):
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as z:
+        z.writestr('readme.txt', 'harmless')
+        z.writestr('bin/tool.exe', MALWARE)
+
+
+def write_tar(path):
+    with tarfile.open(path, 'w') as t:
+        info = tarfile.TarInfo('tool.exe')
+        info.size = len(MALWARE)
+        t.addfile(info, io.BytesIO(MALWARE))
+
+
+def write_gzip(path):
+    with gzip.open(path, 'wb') as f:
+        f.write(MALWARE)
+
+
+WRITERS = {'zip': write_zip, 'tar': write_tar, 'gzip': write_gzip}
+
+
+def test_scan_archive_reports_member(tmp_path, make_defender):
+    path = tmp_path / 'bundle.zip'
+    write_zip(path)
+    defender, _ = make_defender()
+    report = scan_archive(str(path), detect=defender.detection_reason)
+    assert report.members == 2
+    assert [d[0] for d in report.detections] == [f'{path}!bin/tool.exe']
+
+
+# Archives renamed to an innocent or executable extension are recognised from their magic bytes
+@pytest.mark.parametrize('fmt', sorted(WRITERS))
+@pytest.mark.parametrize('name', ['invoice.pdf', 'setup.exe', 'noextension'])
+def test_renamed_archive_is_scanned(tmp_path, make_defender, fmt, name):
+    target = tmp_path / 'scan'
+    target.mkdir()
+    path = target / name
+    WRITERS[fmt](path)
+    assert is_archive(str(path))
+    defender, sink = make_defender(dry_run=True)
+    assert defender.scan_file(str(path)) == 'malware'
+    assert defender.scan_directory(str(target), jobs=2).detections == 1
+    defender.events.flush()
+    assert sink.kinds().count(events.MALWARE_DETECTED) == 2
+
+
+def test_plain_file_is_not_an_archive(tmp_path):
+    path = tmp_path / 'notes.txt'
+    path.write_bytes(b'PK but not a zip' * 100)
+    assert not is_archive(str(path))
+    assert not is_archive(str(tmp_path / 'missing.bin'))
+
+
+def tar_bytes(name, data, mode='w'):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode=mode) as t:
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        t.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+
+# Count the spools opened while scanning
+@pytest.fixture
+def spools(monkeypatch):
+    opened = []
+    spooled = tempfile.SpooledTemporaryFile
+
+    def spool(*args, **kwargs):
+        opened.append(kwargs)
+        return spooled(*args, **kwargs)
+
+    monkeypatch.setattr(archive_scan.tempfile, 'SpooledTemporaryFile', spool)
+    return opened
+
+
+# Nested tar, gzip and compressed tar archives are read straight from the member stream; only a nested zip is spooled
+def test_nested_archives_stream_except_zip(tmp_path, make_defender, spools):
+    inner_zip = io.BytesIO()
+    with zipfile.ZipFile(inner_zip, 'w') as z:
+        z.writestr('zipped.exe', MALWARE)
+    path = tmp_path / 'outer.tar'
+    with tarfile.open(path, 'w') as t:
+        for name, data in [('a.tar', tar_bytes('plain.exe', MALWARE)),
+                           ('b.tar.gz', tar_bytes('packed.exe', MALWARE, 'w:gz')),
+                           ('c.exe.xz', lzma.compress(MALWARE)),
+                           ('d.zip', inner_zip.getvalue())]:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            t.addfile(info, io.BytesIO(data))
+    defender, _ = make_defender()
+    report = scan_archive(str(path), detect=defender.detection_reason)
+    assert sorted(d[0] for d in report.detections) == [f'{path}!a.tar!plain.exe', f'{path}!b.tar.gz!packed.exe',
+                                                        f'{path}!c.exe.xz!c.exe', f'{path}!d.zip!zipped.exe']
+    assert (report.members, report.errors, report.limit) == (8, 0, None)
+    assert len(spools) == 1
+
+
+# Every byte of a streamed nested archive is still hashed, counted once, and held to the limits
+def test_streamed_nested_archive_digest_and_limits(tmp_path):
+    data = os.urandom(2 << 20)
+    nested = gzip.compress(data)
+    path = tmp_path / 'outer.zip'
+    with zipfile.ZipFile(path, 'w') as z:
+        z.writestr('random.bin.gz', nested)
+        z.writestr('zeros.bin.gz', gzip.compress(bytes(4 << 20)))
+    report = scan_archive(str(path), detect=lambda result: result.digests['sha256'])
+    digests = {member: digest for member, digest, _ in report.detections}
+    assert digests[f'{path}!random.bin.gz'] == hashlib.sha256(nested).digest()
+    assert digests[f'{path}!random.bin.gz!random.bin'] == hashlib.sha256(data).digest()
+    assert report.limit == 'compression ratio'
+    report = scan_archive(str(path), limits=ArchiveLimits(3, len(nested) + len(data) - 1, 100, 1000))
+    assert report.limit == 'decompressed size'
+
+
+# A corrupt nested archive is one error, and the member holding it is still hashed
+def test_corrupt_nested_archive(tmp_path):
+    broken = gzip.compress(MALWARE)[:20]
+    path = tmp_path / 'outer.zip'
+    with zipfile.ZipFile(path, 'w') as z:
+        z.writestr('broken.gz', broken)
+        z.writestr('tool.exe', MALWARE)
+    report = scan_archive(str(path), detect=lambda result: result.digests['sha256'])
+    assert [d[:2] for d in report.detections] == [(f'{path}!broken.gz', hashlib.sha256(broken).digest()),
+                                                  (f'{path}!tool.exe', hashlib.sha256(MALWARE).digest())]
+    assert (report.members, report.errors) == (2, 1)
@@ -0,0 +1,42 @@
+# Tests for the benchmark suite: per-benchmark peak RSS and baseline comparison
+# Developed for monitoring and threat response for the Indian Armed Forces
+
+import pytest  # Fixtures and raises
+from benchmark_suite import BenchmarkSuite, TreeSpec, find_regressions, parse_distribution  # Suite under test
+
+SPEC = TreeSpec(30, parse_distribution('1K:1'), 1, 2, 2, 2, 1)
+META = {'spec': SPEC._asdict(), 'cpu_count': 4, 'jobs': 4, 'processes': 20, 'connections': 2000,
+        'concurrency': 200}
+
+
+def document(results, **meta):
+    return {'meta': dict(META, **meta), 'results': results}
+
+
+# The RSS held by the process running the suite must not show up in a benchmark's peak
+def test_peak_rss_is_per_benchmark(tmp_path):
+    ballast = bytearray(300 << 20)
+    ballast[::4096] = b'\1' * len(range(0, len(ballast), 4096))
+    suite = BenchmarkSuite(SPEC, str(tmp_path))
+    suite.prepare()
+    results = suite.run(['calculate_hash', 'scan_file'])
+    assert results['calculate_hash']['items'] == 30
+    assert results['scan_file']['detections'] == 2
+    if results['scan_file']['peak_rss_mb'] is not None:
+        assert results['scan_file']['peak_rss_mb'] < 200
+    del ballast
+
+
+def test_regressions_are_reported():
+    baseline = document({'scan_file': {'items_per_second': 1000.0, 'p99_ms': 2.0}})
+    current = document({'scan_file': {'items_per_second': 800.0, 'p99_ms': 2.1}})
+    assert [r[:2] for r in find_regressions(current, baseline, 0.1)] == [('scan_file', 'items_per_second')]
+
+
+@pytest.mark.parametrize('changed', [{'cpu_count': 64}, {'spec': dict(SPEC._asdict(), files=31)}])
+def test_incomparable_baseline_is_refused(changed):
+    results = {'scan_file': {'items_per_second': 1000.0}}
+    with pytest.raises(ValueError, match=next(iter(changed))):
+        find_regressions(document(results, **changed), document(results))
+    with pytest.raises(ValueError):
+        find_regressions(document(results), {'results': results})
@@ -0,0 +1,54 @@
+# Tests for the headless subcommands of the CLI application
+# Developed for monitoring and threat response for the Indian Armed Forces
+
+import json  # JSON lines printed by the subcommands
+import shutil  # Test signatures copied to the default location
+import pytest  # Fixtures
+import events  # Logging set-up kept away from the working tree
+import defence_app  # CLI under test
+from conftest import MALWARE  # Planted malware content
+
+
+# Run from an empty directory holding the test signatures at their default path; defender.log is not written
+@pytest.fixture
+def workdir(tmp_path, signature_path, monkeypatch):
+    work = tmp_path / 'work'
+    work.mkdir()
+    shutil.copy(signature_path, work / 'signatures.sig')
+    monkeypatch.chdir(work)
+    monkeypatch.setattr(events, 'configure_logging', lambda *args, **kwargs: None)
+    target = work / 'scan'
+    target.mkdir()
+    (target / 'payload.bin').write_bytes(MALWARE)
+    for i in range(5):
+        (target / f'note{i}.txt').write_text(f'note {i}')
+    return work
+
+
+# Run the CLI and return (exit code, JSON records printed)
+def run(capsys, *argv):
+    code = defence_app.main(list(argv))
+    return code, [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+
+
+def test_scan_reports_detection(workdir, capsys):
+    code, records = run(capsys, 'scan', 'scan', 'missing', '--dry-run', '--jobs', '2', '--cache', 'cache.db')
+    assert code == defence_app.EXIT_DETECTED
+    summary = records[-1]
+    assert (summary['kind'], summary['files'], summary['detections'], summary['errors']) == ('summary', 6, 1, 1)
+    assert summary['events'][events.MALWARE_DETECTED] == 1
+    assert any(record.get('kind') == 'error' and record['path'] == 'missing' for record in records)
+    assert (workdir / 'scan' / 'payload.bin').exists()
+
+
+# stats only reads the cache, even when the scan used another detection fingerprint
+# Malware is not cached in a dry run, so it is the one file hashed again
+def test_stats_leaves_the_cache_intact(workdir, capsys):
+    scan = ('scan', 'scan', '--dry-run', '--no-archives', '--jobs', '1', '--cache', 'cache.db')
+    assert run(capsys, *scan)[1][-1]['hashed'] == 6
+    code, records = run(capsys, 'stats', '--cache', 'cache.db', '--log', 'defender.log')
+    assert code == defence_app.EXIT_CLEAN
+    assert records[-1]['cache_entries'] == 5
+    assert records[-1]['signatures']['sha256'] == 1
+    assert run(capsys, *scan)[1][-1]['hashed'] == 1
+    assert run(capsys, 'stats', '--cache', 'absent.db', '--log', 'defender.log')[1][-1]['cache_entries'] == 0
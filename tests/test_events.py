@@ -0,0 +1,100 @@
+# Tests for the structured event pipeline
+# Developed for monitoring and threat response for the Indian Armed Forces
+
+import gc  # Collecting a closed pipeline
+import time  # close() duration and the slow sink
+import weakref  # Watching a closed pipeline get collected
+import logging  # Event levels
+import threading  # Gate holding the writer thread
+import events  # Pipeline under test
+from conftest import RecordingSink  # Collects the written events
+
+
+def test_duplicates_suppressed_but_not_detections():
+    sink = RecordingSink()
+    pipeline = events.EventPipeline([sink], dedup_window=60)
+    for _ in range(3):
+        pipeline.emit(events.SUSPICIOUS_FILE, logging.INFO, 'Suspicious file: a.exe')
+        pipeline.emit(events.MALWARE_DETECTED, logging.WARNING, 'Malware detected: b.bin')
+        pipeline.emit(events.DELETE_FAILED, logging.ERROR, 'Failed to delete b.bin')
+    pipeline.close()
+    assert sink.kinds().count(events.SUSPICIOUS_FILE) == 1
+    assert sink.kinds().count(events.MALWARE_DETECTED) == 3
+    assert sink.kinds().count(events.DELETE_FAILED) == 3
+    assert pipeline.stats()['duplicates'] == 2
+
+
+# Sink that blocks its first write until released, so the queue fills up behind it
+class GatedSink(RecordingSink):
+    def __init__(self):
+        super().__init__()
+        self.gate = threading.Event()
+
+    def write_batch(self, batch):
+        self.gate.wait()
+        super().write_batch(batch)
+
+
+def test_full_queue_drops_only_low_severity_events():
+    sink = GatedSink()
+    pipeline = events.EventPipeline([sink], capacity=4, dedup_window=0, rate_limits=None)
+    for i in range(10):
+        pipeline.emit(events.SUSPICIOUS_FILE, logging.INFO, f'Suspicious file: {i}.exe')
+    assert pipeline.stats()['dropped'] > 0
+    done = threading.Event()
+
+    def detections():
+        for i in range(10):
+            pipeline.emit(events.MALWARE_DETECTED, logging.WARNING, f'Malware detected: {i}.bin')
+        done.set()
+
+    emitter = threading.Thread(target=detections, daemon=True)
+    emitter.start()
+    try:
+        # The detections wait for room rather than being dropped
+        assert not done.wait(0.3)
+    finally:
+        sink.gate.set()
+    emitter.join(10)
+    assert done.is_set()
+    pipeline.close()
+    assert sink.kinds().count(events.MALWARE_DETECTED) == 10
+
+
+def test_close_is_prompt_and_flushes():
+    sink = RecordingSink()
+    pipeline = events.EventPipeline([sink])
+    pipeline.emit(events.FILE_DELETED, logging.INFO, 'Deleted file: x')
+    start = time.monotonic()
+    pipeline.close()
+    assert time.monotonic() - start < 2.0
+    assert sink.kinds() == [events.FILE_DELETED]
+
+
+# A sink stuck for good costs a critical event CRITICAL_PUT_TIMEOUT and close() CLOSE_TIMEOUT, not a hung scanner
+def test_stuck_sink_bounds_critical_emits_and_close(monkeypatch):
+    monkeypatch.setattr(events, 'CRITICAL_PUT_TIMEOUT', 0.3)
+    monkeypatch.setattr(events, 'CLOSE_TIMEOUT', 0.3)
+    sink = GatedSink()
+    pipeline = events.EventPipeline([sink], capacity=2, dedup_window=0, rate_limits=None)
+    try:
+        start = time.monotonic()
+        for i in range(5):
+            pipeline.emit(events.MALWARE_DETECTED, logging.WARNING, f'Malware detected: {i}.bin')
+        assert pipeline.stats()['critical_dropped'] > 0
+        assert pipeline.stats()['dropped'] == pipeline.stats()['critical_dropped']
+        assert not pipeline.flush(timeout=0.2)
+        pipeline.close()
+        assert time.monotonic() - start < 5.0
+    finally:
+        sink.gate.set()
+
+
+# The exit hook holds closed pipelines weakly, so they and their sinks can be collected
+def test_closed_pipeline_is_released():
+    pipeline = events.EventPipeline([RecordingSink()])
+    pipeline.close()
+    ref = weakref.ref(pipeline)
+    del pipeline
+    gc.collect()
+    assert ref() is None
@@ -0,0 +1,238 @@
+# Tests for fleet mode: authentication, digest-keyed shared verdicts, agent-side tree splitting and the server
+# Developed for monitoring and threat response for the Indian Armed Forces
+
+import os  # Stat results
+import time  # Idle connections
+import socket  # Plain unix socket files and raw connections
+import hashlib  # Digests of the planted malware
+import zipfile  # Archive holding a malicious member
+import socketserver  # Stdlib server defaults
+import pytest  # Fixtures and raises
+import fleet  # Server limits patched for the connection tests
+from fleet import (Aggregator, AggregatorServer, FleetAgent, FleetClient, FleetError,  # Fleet under test
+                   load_key, remaining_units, split_tree)
+from conftest import MALWARE  # Planted malware content
+
+KEY = b'0123456789abcdef-test-fleet-key'
+
+
+@pytest.fixture
+def server():
+    running = AggregatorServer(Aggregator(), '127.0.0.1:0', KEY).start()
+    yield running
+    running.stop()
+
+
+@pytest.fixture
+def tree(tmp_path):
+    root = tmp_path / 'tree'
+    (root / 'sub').mkdir(parents=True)
+    for i in range(10):
+        (root / f'f{i}.txt').write_text(f'file {i}')
+        (root / 'sub' / f'g{i}.txt').write_text(f'other {i}')
+    return root
+
+
+def stats(server):
+    client = FleetClient(server.address, KEY)
+    try:
+        return client.request({'type': 'stats'})
+    finally:
+        client.close()
+
+
+def test_load_key(tmp_path, monkeypatch):
+    path = tmp_path / 'fleet.key'
+    path.write_bytes(KEY + b'\n')
+    assert load_key(str(path)) == KEY
+    monkeypatch.setenv('DEFENDER_FLEET_KEY', 'short')
+    with pytest.raises(FleetError):
+        load_key()
+
+
+# Verdicts from a client without the fleet key never reach the aggregator
+def test_unauthenticated_client_is_refused(server):
+    forger = FleetClient(server.address, b'not-the-fleet-key-at-all')
+    records = [['/bin/ls', 1, 1, hashlib.sha256(MALWARE).hexdigest(), 'clean', None]]
+    assert forger.request({'type': 'verdicts', 'host': 'evil', 'fingerprint': 'x', 'records': records}) is None
+    forger.close()
+    assert stats(server)['records'] == 0
+
+
+# A second host with the same content elsewhere skips pattern and archive scanning, and keeps nothing in its cache
+def test_clean_content_is_shared_by_digest(tmp_path, tree, server, make_defender):
+    first, _ = make_defender(cache_path=str(tmp_path / 'first.db'))
+    agent = FleetAgent(first, server.address, KEY, host='first')
+    assert agent.scan_directory(str(tree)).avoided == 0
+    agent.close()
+    copy = tmp_path / 'copy'
+    copy.mkdir()
+    for path in tree.rglob('*.txt'):
+        (copy / path.name).write_bytes(path.read_bytes())
+    second, _ = make_defender(cache_path=str(tmp_path / 'second.db'))
+    agent = FleetAgent(second, server.address, KEY, host='second')
+    result = agent.scan_directory(str(copy))
+    agent.close()
+    assert (result.files, result.hashed, result.avoided) == (20, 20, 20)
+    assert not any(second.cache.is_clean(os.stat(path)) for path in copy.iterdir())
+
+
+# A clean verdict for known malware, even from a key holder, never overrides the local signatures
+def test_local_signatures_win_over_fleet_clean(tmp_path, server, make_defender):
+    client = FleetClient(server.address, KEY)
+    defender, _ = make_defender(dry_run=True)
+    records = [['/elsewhere', 1, 1, hashlib.sha256(MALWARE).hexdigest(), 'clean', None]]
+    client.request({'type': 'verdicts', 'host': 'h', 'fingerprint': defender.detection_fingerprint(),
+                    'records': records})
+    client.close()
+    target = tmp_path / 'scan'
+    target.mkdir()
+    (target / 'payload.bin').write_bytes(MALWARE)
+    agent = FleetAgent(defender, server.address, KEY)
+    result = agent.scan_directory(str(target))
+    agent.close()
+    assert (result.detections, result.avoided) == (1, 0)
+
+
+# Malware found only inside an archive has no detection reason of its own
+def test_archive_member_detection(tmp_path, server, make_defender):
+    target = tmp_path / 'scan'
+    target.mkdir()
+    with zipfile.ZipFile(target / 'bundle.zip', 'w') as z:
+        z.writestr('tool.exe', MALWARE)
+    defender, _ = make_defender(dry_run=True)
+    agent = FleetAgent(defender, server.address, KEY)
+    result = agent.scan_directory(str(target))
+    agent.close()
+    assert (result.detections, result.shared_detections) == (1, 0)
+    assert stats(server)['bad_digests'] == 1
+
+
+# A host without the signature detects content another host reported as malware
+def test_shared_detection(tmp_path, server, make_defender):
+    target = tmp_path / 'scan'
+    target.mkdir()
+    (target / 'payload.bin').write_bytes(MALWARE)
+    reporter, _ = make_defender(dry_run=True)
+    agent = FleetAgent(reporter, server.address, KEY, host='reporter')
+    agent.scan_directory(str(target))
+    agent.close()
+    unaware, _ = make_defender(dry_run=True, signature_path=str(tmp_path / 'none.sig'))
+    agent = FleetAgent(unaware, server.address, KEY, host='unaware')
+    result = agent.scan_directory(str(target))
+    agent.close()
+    assert (result.detections, result.shared_detections) == (1, 1)
+
+
+# Agents split the tree themselves; between them every file is scanned exactly once
+# The second agent joins while the first is still on its first unit
+def test_sharded_scan_uses_agent_units(tree, server, make_defender, monkeypatch):
+    agents = [FleetAgent(make_defender()[0], server.address, KEY, host=host) for host in ('a', 'b')]
+    scan_directory = FleetAgent.scan_directory
+    joined = []
+
+    def scan_unit(agent, *args, **kwargs):
+        if agent is agents[0] and not joined:
+            joined.append(agents[1].scan_shards(str(tree), workers=2))
+        return scan_directory(agent, *args, **kwargs)
+
+    monkeypatch.setattr(FleetAgent, 'scan_directory', scan_unit)
+    first = agents[0].scan_shards(str(tree), workers=2)
+    assert (first.units, joined[0].units) == (1, 1)
+    assert first.files + joined[0].files == 20
+    for agent in agents:
+        agent.close()
+
+
+def test_lease_rejects_units_outside_the_root(tree):
+    aggregator = Aggregator()
+    root = str(tree)
+    with pytest.raises(ValueError):
+        aggregator.lease({'root': root, 'units': [['/etc', None]]})
+    with pytest.raises(ValueError):
+        aggregator.lease({'root': root, 'units': [[os.path.join(root, '..', 'elsewhere'), None]]})
+    units = [list(unit) for unit in split_tree(root, 4)]
+    assert aggregator.lease({'root': root, 'units': units})['path'] == units[0][0]
+    assert aggregator.lease({'root': '/never/offered'})['path'] is None
+
+
+def test_server_leaves_stdlib_and_foreign_files_alone(tmp_path, server):
+    assert socketserver.ThreadingTCPServer.allow_reuse_address is False
+    path = tmp_path / 'not-a-socket'
+    path.write_text('precious')
+    with pytest.raises(FleetError):
+        AggregatorServer(Aggregator(), f'unix:{path}', KEY)
+    assert path.read_text() == 'precious'
+
+
+def test_stale_socket_file_is_replaced(tmp_path):
+    path = os.path.join(str(tmp_path), 's.sock')
+    if len(path) > 100:
+        pytest.skip('temporary path too long for a unix socket')
+    stale = socket.socket(socket.AF_UNIX)
+    stale.bind(path)
+    stale.close()
+    AggregatorServer(Aggregator(), f'unix:{path}', KEY).start().stop()
+    assert not os.path.exists(path)
+
+
+# Every file outside the finished units is in exactly one remaining unit, whatever split the finished ones came from
+def test_remaining_units_cover_the_rest(tree):
+    root = str(tree)
+    assert remaining_units(root, []) == [(root, None)]
+    left = remaining_units(root, [[os.path.join(root, 'sub'), None]])
+    assert left == [(root, 0)]
+    left = remaining_units(root, [[root, 0]])
+    assert left == [(os.path.join(root, 'sub'), None)]
+    assert remaining_units(root, [[root, 0], [os.path.join(root, 'sub'), 0]]) == []
+
+
+# An aggregator lost after the first lease leaves the rest of the tree to the agent, not unscanned
+def test_lost_aggregator_falls_back_to_local_scan(tree, make_defender, monkeypatch):
+    running = AggregatorServer(Aggregator(), '127.0.0.1:0', KEY).start()
+    agent = FleetAgent(make_defender()[0], running.address, KEY, host='a')
+    scan_directory = FleetAgent.scan_directory
+    stopped = []
+
+    def scan_unit(self, *args, **kwargs):
+        stats = scan_directory(self, *args, **kwargs)
+        if not stopped:
+            stopped.append(running.stop())
+            self.client.close()
+        return stats
+
+    monkeypatch.setattr(FleetAgent, 'scan_directory', scan_unit)
+    result = agent.scan_shards(str(tree), workers=2)
+    assert (result.units, result.files) == (1, 20)
+    agent.close()
+
+
+# A peer that starts a message and stalls is cut off, and connections beyond the limit are refused
+def test_server_bounds_connections(monkeypatch):
+    monkeypatch.setattr(fleet, 'MESSAGE_TIMEOUT', 0.2)
+    monkeypatch.setattr(fleet, 'MAX_CONNECTIONS', 1)
+    running = AggregatorServer(Aggregator(), '127.0.0.1:0', KEY).start()
+    host, port = running.address.rsplit(':', 1)
+    try:
+        stalled = socket.create_connection((host, int(port)), timeout=5)
+        stalled.sendall(fleet.FRAME.pack(1000) + b'partial')
+        time.sleep(0.1)
+        refused = socket.create_connection((host, int(port)), timeout=5)
+        assert refused.recv(1) == b''
+        refused.close()
+        assert stalled.recv(1) == b''
+        stalled.close()
+        time.sleep(0.1)
+        assert stats(running)['records'] == 0
+    finally:
+        running.stop()
+
+
+# A kept-open connection closed by the aggregator for idling is replaced without losing the request
+def test_client_reconnects_after_idle_close(server, monkeypatch):
+    monkeypatch.setattr(fleet, 'IDLE_TIMEOUT', 0.2)
+    client = FleetClient(server.address, KEY)
+    assert client.request({'type': 'stats'}) is not None
+    time.sleep(0.5)
+    assert client.request({'type': 'stats'}) is not None
+    client.close()
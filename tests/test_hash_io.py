@@ -0,0 +1,54 @@
+# Tests for the hashing I/O strategies
+# Developed for monitoring and threat response for the Indian Armed Forces
+
+import os  # Test files
+import sys  # Interpreter for the isolated truncation run
+import hashlib  # Expected digests
+import subprocess  # Runs the truncation case in its own process, where a SIGBUS cannot kill the test run
+import pytest  # Parametrised tests
+from hash_io import DEFAULT_IO, IOOptions, STRATEGIES, digest_file, read_file  # Code under test
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.mark.parametrize('strategy', STRATEGIES)
+@pytest.mark.parametrize('size', [0, 1, 64 * 1024 + 3, 3 * 1024 * 1024])
+def test_strategies_agree(tmp_path, strategy, size):
+    path = tmp_path / 'f.bin'
+    data = os.urandom(size)
+    path.write_bytes(data)
+    assert digest_file(str(path), 'sha256', IOOptions(strategy, True, False)) == hashlib.sha256(data).digest()
+
+
+def test_default_does_not_map_files():
+    assert DEFAULT_IO.strategy == 'readinto'
+
+
+def test_unknown_strategy_is_refused(tmp_path):
+    path = tmp_path / 'f.bin'
+    path.write_bytes(b'data')
+    with pytest.raises(ValueError):
+        read_file(str(path), lambda chunk: None, IOOptions('sendfile', True, False))
+
+
+# A large file truncated while the default strategy reads it ends the read early instead of raising SIGBUS
+def test_truncation_during_default_read(tmp_path):
+    path = tmp_path / 'big.bin'
+    with open(path, 'wb') as f:
+        f.truncate(32 * 1024 * 1024)
+    code = (
+        'import os, sys\n'
+        f'sys.path.insert(0, {ROOT!r})\n'
+        'from hash_io import read_file\n'
+        'def consume(chunk):\n'
+        f'    os.truncate({str(path)!r}, 0)\n'
+        f'print(read_file({str(path)!r}, consume))\n'
+    )
+    run = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, timeout=60)
+    assert run.returncode == 0, run.stderr
+    assert int(run.stdout) < 32 * 1024 * 1024
+
+
+def test_unreadable_file_raises(tmp_path):
+    with pytest.raises(OSError):
+        read_file(str(tmp_path / 'missing'), lambda chunk: None)
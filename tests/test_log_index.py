@@ -0,0 +1,37 @@
+# Tests for the sidecar-indexed log queries
+# Developed for monitoring and threat response for the Indian Armed Forces
+
+import events  # Event kinds
+from log_index import LogIndex  # Index under test
+
+LINES = [
+    '2025-09-02 23:11:22,440 - INFO - System Defender AI started',
+    '2025-09-02 23:11:23,996 - WARNING - Malware detected: C:\\Users\\a\\evil.exe',
+    '2025-09-02 23:11:23,997 - INFO - Deleted file: C:\\Users\\a\\evil.exe',
+    '2025-09-02 23:12:01,000 - INFO - Suspicious file: C:\\Users\\a\\tool.bat',
+]
+
+
+def write_log(path, newline):
+    path.write_bytes(''.join(line + newline for line in LINES).encode('utf-8'))
+
+
+# defender.log written on Windows has CRLF line endings; entries must come back without the '\r'
+def test_crlf_log_entries(tmp_path):
+    log = tmp_path / 'defender.log'
+    write_log(log, '\r\n')
+    index = LogIndex(str(log))
+    entries = list(index.query())
+    assert [entry.text for entry in entries] == LINES
+    assert [entry.kind for entry in index.query(kinds=[events.MALWARE_DETECTED])] == [events.MALWARE_DETECTED]
+
+
+def test_index_follows_appends(tmp_path):
+    log = tmp_path / 'defender.log'
+    write_log(log, '\n')
+    index = LogIndex(str(log))
+    assert len(list(index.query())) == 4
+    with open(log, 'a') as f:
+        f.write('2025-09-02 23:13:00,000 - WARNING - Malware detected: /tmp/x\n')
+    assert [entry.text for entry in index.tail(1)] == ['2025-09-02 23:13:00,000 - WARNING - Malware detected: /tmp/x']
+    assert len(list(LogIndex(str(log)).query(levels=['WARNING']))) == 2
@@ -0,0 +1,68 @@
+# Tests for the metrics registry, its text exposition and the local endpoint
+# Developed for monitoring and threat response for the Indian Armed Forces
+
+import urllib.request  # Scrapes the metrics endpoint
+from metrics import Registry, MetricsServer, SnapshotWriter  # Code under test
+
+
+def test_counter_and_gauge_exposition():
+    registry = Registry()
+    counter = registry.counter('t_events_total', 'Events by kind', ['kind'])
+    counter.labels('malware').inc()
+    counter.labels('malware').inc(2)
+    counter.labels('say "hi"\n').inc()
+    gauge = registry.gauge('t_queue', 'Queued items')
+    gauge.set(5)
+    gauge.dec(2)
+    assert registry.counter('t_events_total', 'ignored') is counter
+    assert registry.render() == (
+        '# HELP t_events_total Events by kind\n'
+        '# TYPE t_events_total counter\n'
+        't_events_total{kind="malware"} 3\n'
+        't_events_total{kind="say \\"hi\\"\\n"} 1\n'
+        '# HELP t_queue Queued items\n'
+        '# TYPE t_queue gauge\n'
+        't_queue 3\n')
+
+
+def test_histogram_buckets_and_quantile():
+    registry = Registry()
+    histogram = registry.histogram('t_seconds', 'Latency', buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        histogram.observe(value)
+    assert registry.render().splitlines()[2:] == [
+        't_seconds_bucket{le="0.1"} 2',
+        't_seconds_bucket{le="1.0"} 3',
+        't_seconds_bucket{le="+Inf"} 4',
+        't_seconds_sum 2.65',
+        't_seconds_count 4',
+    ]
+    assert histogram.quantile(0.5) == 0.1
+    assert histogram.quantile(0.75) == 1.0
+    assert histogram.quantile(1.0) == float('inf')
+
+
+# Computed values are read at export time; a failing function exports NaN instead of breaking the scrape
+def test_function_gauge():
+    registry = Registry()
+    values = [7]
+    registry.gauge('t_hits', 'Hits', function=lambda: values[0])
+    registry.gauge('t_broken', 'Broken', function=lambda: 1 / 0)
+    values[0] = 9
+    lines = registry.render().splitlines()
+    assert 't_hits 9' in lines and 't_broken nan' in lines
+
+
+def test_endpoint_and_snapshot(tmp_path):
+    registry = Registry()
+    registry.counter('t_scrapes_total', 'Scrapes').inc()
+    server = MetricsServer(port=0, registry=registry).start()
+    try:
+        with urllib.request.urlopen(f'http://127.0.0.1:{server.port}/metrics', timeout=5) as response:
+            assert response.headers['Content-Type'].startswith('text/plain')
+            assert response.read().decode('utf-8') == registry.render()
+    finally:
+        server.stop()
+    path = tmp_path / 'metrics.prom'
+    SnapshotWriter(str(path), registry=registry).stop()
+    assert path.read_text() == registry.render()
@@ -0,0 +1,99 @@
+# Tests for the single-pass content scanner and the multi-pattern matcher
+# Developed for monitoring and threat response for the Indian Armed Forces
+
+import os  # Random test data
+import time  # Throughput bound on large rule sets
+import random  # Random patterns and buffer splits
+import hashlib  # Expected digests
+import tracemalloc  # Buffers must be searched without being copied
+import pytest  # Parametrised tests
+from multiscan import PatternMatcher, ContentScan, scan_file_once, SEARCH_MAX_RULES  # Code under test
+
+
+# Every (rule name, start offset) a naive search finds, keeping the first offset of each name
+def expected_matches(rules, data):
+    found = {}
+    for name, pattern in rules:
+        index = data.find(pattern)
+        if index >= 0 and (name not in found or index < found[name]):
+            found[name] = index
+    return found
+
+
+# Feed `data` to a matcher in random-sized buffers
+def feed_split(matcher, data, rng):
+    matches, state, offset = {}, matcher.initial, 0
+    while offset < len(data):
+        size = rng.randint(1, 40)
+        state = matcher.feed(data[offset:offset + size], offset, state, matches)
+        offset += size
+    return matches
+
+
+@pytest.mark.parametrize('count', [1, SEARCH_MAX_RULES, 50])
+def test_matches_across_buffers(count):
+    rng = random.Random(count)
+    for _ in range(50):
+        patterns = {bytes(rng.choice(b'ab') for _ in range(rng.randint(1, 6))) for _ in range(count * 3)}
+        rules = [(f'rule{i}', p) for i, p in enumerate(sorted(patterns)[:count])]
+        data = bytes(rng.choice(b'abc') for _ in range(300))
+        matcher = PatternMatcher(rules)
+        assert feed_split(matcher, data, rng) == expected_matches(rules, data)
+
+
+def test_automaton_overlapping_patterns():
+    rules = [('he', b'he'), ('she', b'she'), ('his', b'his'), ('hers', b'hers')] + \
+        [(f'filler{i}', bytes([200 + i]) * 4) for i in range(SEARCH_MAX_RULES)]
+    matcher = PatternMatcher(rules)
+    assert matcher.initial == 0
+    assert feed_split(matcher, b'ushers', random.Random(1)) == {'she': 1, 'he': 2, 'hers': 2}
+
+
+# Large rule sets must not slow down with the number of patterns the way one big alternation does
+def test_large_rule_set_throughput():
+    rng = random.Random(7)
+    rules = [(f'r{i}', bytes(rng.getrandbits(8) for _ in range(rng.randint(8, 16)))) for i in range(1000)]
+    matcher = PatternMatcher(rules)
+    data = os.urandom(512 * 1024) + rules[500][1]
+    start = time.perf_counter()
+    matches = {}
+    matcher.feed(data, 0, matcher.initial, matches)
+    assert time.perf_counter() - start < 5.0
+    assert matches['r500'] == 512 * 1024
+
+
+# Small rule sets are searched in C over the read buffer itself: a throughput floor, and no copy of the buffer
+@pytest.mark.parametrize('count, floor', [(1, 100.0), (SEARCH_MAX_RULES, 10.0)])
+def test_search_throughput_floor(count, floor):
+    rng = random.Random(count)
+    rules = [(f'r{i}', bytes(rng.getrandbits(8) for _ in range(12))) for i in range(count)]
+    matcher = PatternMatcher(rules)
+    size = 32 << 20
+    buffer = bytearray(os.urandom(size - 12)) + rules[-1][1]
+    view = memoryview(buffer)
+    matches = {}
+    tracemalloc.start()
+    start = time.perf_counter()
+    matcher.feed(view, 0, matcher.initial, matches)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    assert matches[rules[-1][0]] == size - 12
+    assert size / 1e6 / elapsed > floor
+    assert peak < 1 << 20
+
+
+def test_content_scan_and_file(tmp_path):
+    data = os.urandom(100000) + b'EVIL' + os.urandom(1000)
+    matcher = PatternMatcher([('evil', b'EVIL')])
+    scan = ContentScan(('sha256', 'md5'), matcher)
+    for i in range(0, len(data), 4096):
+        scan.feed(data[i:i + 4096])
+    result = scan.result()
+    assert result.digests['sha256'] == hashlib.sha256(data).digest()
+    assert result.digests['md5'] == hashlib.md5(data).digest()
+    assert result.matches == {'evil': 100000}
+    path = tmp_path / 'f.bin'
+    path.write_bytes(data)
+    assert scan_file_once(str(path), ('sha256',), matcher).matches == {'evil': 100000}
+    assert scan_file_once(str(tmp_path / 'missing')) is None
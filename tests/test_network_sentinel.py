@@ -0,0 +1,132 @@
+# Tests for the network sentinel's blocklist and connection handling
+# Developed for monitoring and threat response for the Indian Armed Forces
+
+import time  # Stress duration
+import socket  # Loopback client
+import asyncio  # Driving the connection handler directly
+import threading  # Concurrent blocklist access
+import events  # Event pipeline receiving the sentinel's events
+from network_sentinel import IPBlocklist, NetworkSentinel  # Code under test
+from conftest import RecordingSink  # Collects the emitted events
+
+
+def test_blocklist_networks_and_expiry():
+    blocklist = IPBlocklist()
+    blocklist.add('10.0.0.0/8')
+    blocklist.add('192.0.2.7', ttl=0)
+    blocklist.add('2001:db8::/32')
+    assert '10.1.2.3' in blocklist
+    assert '::ffff:10.1.2.3' in blocklist
+    assert '2001:db8::1' in blocklist
+    assert '11.0.0.1' not in blocklist and 'not an address' not in blocklist
+    assert '192.0.2.7' not in blocklist
+    assert blocklist.expire() == 1
+    blocklist.discard('10.0.0.0/8')
+    assert '10.1.2.3' not in blocklist and len(blocklist) == 1
+
+
+# Expiry on the defence loop must not race the sentinel adding and looking up entries
+def test_blocklist_concurrent_expire():
+    blocklist = IPBlocklist()
+    errors = []
+    stop = time.monotonic() + 0.5
+
+    def writer():
+        i = 0
+        try:
+            while time.monotonic() < stop:
+                blocklist.add(f'10.{i % 256}.{i // 256 % 256}.0/{8 + i % 25}', ttl=0)
+                f'10.{i % 256}.0.1' in blocklist
+                i += 1
+        except Exception as e:
+            errors.append(e)
+
+    def expirer():
+        try:
+            while time.monotonic() < stop:
+                blocklist.expire()
+                len(blocklist)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=writer), threading.Thread(target=expirer)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+
+
+def test_sentinel_blocks_malicious_sender():
+    sink = RecordingSink()
+    pipeline = events.EventPipeline([sink], dedup_window=0)
+    sentinel = NetworkSentinel('127.0.0.1', [0], block_ttl=None, read_timeout=1.0, event_pipeline=pipeline)
+    sentinel.start()
+    try:
+        with socket.create_connection(('127.0.0.1', sentinel.bound_ports[0])) as client:
+            client.sendall(b'hello malicious world')
+            client.shutdown(socket.SHUT_WR)
+            client.recv(1)
+        deadline = time.monotonic() + 5
+        while '127.0.0.1' not in sentinel.blocklist and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert '127.0.0.1' in sentinel.blocklist
+    finally:
+        sentinel.stop()
+        pipeline.close()
+    assert events.SUSPICIOUS_CONNECTION in sink.kinds()
+
+
+# A peer that keeps sending a byte at a time never goes idle, but still only gets read_timeout in total
+def test_trickling_sender_hits_the_connection_deadline():
+    sentinel = NetworkSentinel(ports=[0], read_timeout=0.5)
+    sentinel.start()
+    try:
+        assert sentinel.host == '127.0.0.1'
+        start = time.monotonic()
+        with socket.create_connection(('127.0.0.1', sentinel.bound_ports[0]), timeout=5) as client:
+            try:
+                while time.monotonic() - start < 5:
+                    client.sendall(b'x')
+                    time.sleep(0.1)
+            except OSError:
+                pass
+        assert time.monotonic() - start < 3
+    finally:
+        sentinel.stop()
+
+
+# Stream ends of a transport that reports no peer address, as unix sockets do
+class FakeReader:
+    def __init__(self, *chunks):
+        self.chunks = list(chunks)
+
+    async def read(self, size):
+        return self.chunks.pop(0) if self.chunks else b''
+
+
+class FakeWriter:
+    def get_extra_info(self, name):
+        return None
+
+    def close(self):
+        pass
+
+
+# A match from a peer without an address is reported without trying to block ''
+def test_match_without_peer_address_is_reported():
+    sink = RecordingSink()
+    pipeline = events.EventPipeline([sink], dedup_window=0)
+    sentinel = NetworkSentinel(ports=[0], event_pipeline=pipeline)
+    asyncio.run(sentinel._handle(FakeReader(b'malicious'), FakeWriter()))
+    pipeline.close()
+    assert sentinel.suspicious == 1 and len(sentinel.blocklist) == 0
+    assert sink.kinds() == [events.SUSPICIOUS_CONNECTION]
+
+
+# The sentinel started by the defender stays on loopback unless DEFENDER_SENTINEL_HOST says otherwise
+def test_defender_sentinel_host(make_defender, monkeypatch):
+    monkeypatch.delenv('DEFENDER_SENTINEL_HOST', raising=False)
+    assert make_defender()[0].sentinel.host == '127.0.0.1'
+    monkeypatch.setenv('DEFENDER_SENTINEL_HOST', '0.0.0.0')
+    assert make_defender()[0].sentinel.host == '0.0.0.0'
@@ -0,0 +1,89 @@
+# Tests for the incremental process monitor: snapshot diffs and batched termination
+# Developed for monitoring and threat response for the Indian Armed Forces
+
+import sys  # Interpreter for a disposable child process
+import subprocess  # Disposable child process to terminate
+import psutil  # Process handles and the patched process table
+import pytest  # Fixtures
+import events  # Event kinds
+from process_monitor import ProcessMonitor  # Monitor under test
+
+
+# Stand-in for a psutil.Process returned by process_iter, with the attributes the monitor reads
+class FakeProcess:
+    def __init__(self, pid, create_time, name):
+        self.pid = pid
+        self.info = {'pid': pid, 'create_time': create_time}
+        self._name = name
+
+    def as_dict(self, attrs):
+        return {'name': self._name, 'exe': None}
+
+
+# Monitor over a process table the test controls; returns (monitor, table, inspected pids, sink)
+@pytest.fixture
+def monitored(make_defender, monkeypatch):
+    defender, sink = make_defender(dry_run=True)
+    table = []
+    monkeypatch.setattr(psutil, 'process_iter', lambda attrs: [FakeProcess(*row) for row in table])
+    monitor = ProcessMonitor(defender, names=['evil.exe'])
+    inspected = []
+    inspect = monitor.inspect
+
+    def counting(proc):
+        inspected.append(proc.pid)
+        return inspect(proc)
+
+    monitor.inspect = counting
+    return monitor, table, inspected, sink
+
+
+def test_only_new_processes_are_inspected(monitored):
+    monitor, table, inspected, _ = monitored
+    table[:] = [(1, 10.0, 'init'), (2, 20.0, 'shell')]
+    monitor.scan()
+    monitor.scan()
+    assert inspected == [1, 2]
+    table.append((3, 30.0, 'editor'))
+    monitor.scan()
+    assert inspected == [1, 2, 3]
+
+
+# An exited process leaves the known set; a new process reusing its PID is a different process
+def test_exited_and_reused_pids(monitored):
+    monitor, table, inspected, _ = monitored
+    table[:] = [(1, 10.0, 'init'), (2, 20.0, 'shell')]
+    monitor.scan()
+    del table[1]
+    monitor.scan()
+    assert monitor._known == {(1, 10.0)}
+    table.append((2, 50.0, 'reused'))
+    monitor.scan()
+    assert inspected == [1, 2, 2]
+    assert monitor._known == {(1, 10.0), (2, 50.0)}
+
+
+# Offenders are reported every cycle they survive, since they stay out of the known set
+def test_offender_is_reinspected_while_it_survives(monitored):
+    monitor, table, inspected, sink = monitored
+    table[:] = [(1, 10.0, 'init'), (7, 70.0, 'EVIL.exe')]
+    assert [proc.pid for proc in monitor.scan()] == [7]
+    assert [proc.pid for proc in monitor.scan()] == [7]
+    assert inspected == [1, 7, 7]
+    monitor.defender.events.flush()
+    assert sink.kinds().count(events.SUSPICIOUS_PROCESS) == 2
+    assert sink.kinds().count(events.ACTION_SKIPPED) == 2
+
+
+def test_terminate_batch(make_defender):
+    defender, sink = make_defender()
+    child = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(60)'])
+    try:
+        ProcessMonitor(defender, grace=5.0).terminate([psutil.Process(child.pid)])
+        assert child.wait(timeout=5) is not None
+    finally:
+        if child.poll() is None:
+            child.kill()
+            child.wait()
+    defender.events.flush()
+    assert sink.kinds() == [events.PROCESS_TERMINATED]
@@ -0,0 +1,115 @@
+# Tests for the persistent verdict cache and how scans use it
+# Developed for monitoring and threat response for the Indian Armed Forces
+
+import os  # Stat results and the patched os.remove
+import zipfile  # Archive that exceeds the member limit
+import pytest  # Parametrisation
+import events  # Event kinds
+from archive_scan import ArchiveLimits  # Small limits for the archive bomb test
+from scan_cache import VerdictCache  # Cache under test
+from conftest import MALWARE  # Planted malware content
+
+
+def test_lookup_and_is_clean(tmp_path):
+    path = tmp_path / 'a.txt'
+    path.write_text('hello')
+    st = os.stat(path)
+    cache = VerdictCache(None)
+    assert cache.lookup(st) is None and not cache.is_clean(st)
+    cache.store(st, b'\0' * 32, 'malware')
+    assert cache.lookup(st) == (b'\0' * 32, 'malware')
+    assert not cache.is_clean(st)
+    cache.store(st, b'\0' * 32, 'clean')
+    assert cache.is_clean(st)
+    cache.store(st, b'\0' * 32, 'suspicious')
+    assert cache.is_settled(st) and not cache.is_clean(st)
+
+
+def test_signature_change_invalidates(tmp_path):
+    path = tmp_path / 'a.txt'
+    path.write_text('hello')
+    st = os.stat(path)
+    db = str(tmp_path / 'cache.db')
+    cache = VerdictCache(db, signatures='one')
+    cache.store(st, b'\0' * 32, 'clean')
+    cache.close()
+    cache = VerdictCache(db, signatures='one')
+    assert cache.is_clean(st)
+    cache.close()
+    cache = VerdictCache(db, signatures='two')
+    assert cache.lookup(st) is None
+    cache.close()
+
+
+# A file whose deletion failed stays cached as malware; later scans must alert and try to delete it again
+def test_cached_malware_is_rescanned_when_delete_fails(tmp_path, make_defender, failing_remove):
+    target = tmp_path / 'scan'
+    target.mkdir()
+    bad = target / 'payload.bin'
+    bad.write_bytes(MALWARE)
+    defender, sink = make_defender()
+    assert defender.scan_file(str(bad)) == 'malware'
+    assert defender.scan_file(str(bad)) == 'malware'
+    assert defender.scan_directory(str(target)).detections == 1
+    assert defender.scan_directory(str(target), jobs=2).detections == 1
+    defender.events.flush()
+    assert sink.kinds().count(events.MALWARE_DETECTED) == 4
+    assert sink.kinds().count(events.DELETE_FAILED) == 4
+    assert len(failing_remove) == 4
+    assert bad.exists()
+
+
+def test_clean_files_are_skipped(tmp_path, make_defender):
+    good = tmp_path / 'good.txt'
+    good.write_text('nothing to see')
+    defender, _ = make_defender()
+    assert defender.scan_file(str(good)) == 'clean'
+    assert defender.scan_file(str(good)) is None
+
+
+# LRU refreshes of disk hits are written out in batches, and still reach the database on flush
+def test_hits_refresh_lru_on_flush(tmp_path):
+    path = tmp_path / 'a.txt'
+    path.write_text('hello')
+    st = os.stat(path)
+    db = str(tmp_path / 'cache.db')
+    cache = VerdictCache(db, memory_entries=0)
+    cache.store(st, b'\0' * 32, 'clean')
+    cache.flush()
+    before = cache._db.execute('SELECT used FROM verdicts').fetchone()[0]
+    assert cache.is_clean(st) and cache.is_clean(st)
+    assert cache._db.execute('SELECT used FROM verdicts').fetchone()[0] == before
+    cache.flush()
+    assert cache._db.execute('SELECT used FROM verdicts').fetchone()[0] > before
+    cache.close()
+
+
+# Suspicious files are hashed and reported once; unchanged, later passes skip both the read and the alert
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_suspicious_files_are_reported_once(tmp_path, make_defender, jobs):
+    target = tmp_path / 'scan'
+    target.mkdir()
+    for i in range(50):
+        (target / f'lib{i}.dll').write_text(f'library {i}')
+        (target / f'note{i}.txt').write_text(f'note {i}')
+    defender, sink = make_defender()
+    assert [defender.scan_directory(str(target), jobs=jobs).hashed for _ in range(3)] == [100, 0, 0]
+    defender.events.flush()
+    assert sink.kinds().count(events.SUSPICIOUS_FILE) == 50
+    assert defender.scan_file(str(target / 'lib0.dll')) is None
+    (target / 'lib0.dll').write_text('changed')
+    assert defender.scan_file(str(target / 'lib0.dll')) == 'suspicious'
+
+
+# An archive that hits a limit is not decompressed again while it is unchanged
+def test_archive_limit_is_reported_once(tmp_path, make_defender):
+    target = tmp_path / 'scan'
+    target.mkdir()
+    with zipfile.ZipFile(target / 'bomb.zip', 'w') as z:
+        for i in range(5):
+            z.writestr(f'm{i}.txt', f'member {i}')
+    defender, sink = make_defender(archive_limits=ArchiveLimits(max_depth=3, max_bytes=1 << 20, max_members=2,
+                                                                max_ratio=100))
+    assert [defender.scan_directory(str(target)).hashed for _ in range(3)] == [1, 0, 0]
+    defender.events.flush()
+    assert sink.kinds().count(events.ARCHIVE_LIMIT) == 1
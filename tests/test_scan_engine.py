@@ -0,0 +1,95 @@
+# Tests for the parallel scanning engine: per-file failures and shutdown when threads die
+# Developed for monitoring and threat response for the Indian Armed Forces
+
+import json  # Rules file with a byte pattern
+import threading  # Leaked thread checks and the watchdog around hanging scans
+import pytest  # Fixtures and raises
+from scan_engine import ScanEngine  # Engine under test
+from conftest import MALWARE  # Planted malware content
+
+
+@pytest.fixture
+def tree(tmp_path):
+    root = tmp_path / 'tree'
+    root.mkdir()
+    for i in range(40):
+        (root / f'f{i}.txt').write_text(f'file {i}')
+    (root / 'payload.bin').write_bytes(MALWARE)
+    return root
+
+
+def scan_threads():
+    return [t for t in threading.enumerate() if t.name.startswith(('scan-producer', 'scan-worker'))]
+
+
+# Run a scan on a watchdog thread so a hang fails the test instead of blocking the run
+def run_with_timeout(function, timeout=10.0):
+    outcome = {}
+
+    def target():
+        try:
+            outcome['value'] = function()
+        except BaseException as e:
+            outcome['error'] = e
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), 'scan did not finish'
+    return outcome
+
+
+def test_parallel_scan_finds_malware(tree, make_defender):
+    defender, _ = make_defender(dry_run=True)
+    stats = ScanEngine(defender, jobs=4).scan(str(tree))
+    assert (stats.files, stats.hashed, stats.detections) == (41, 41, 1)
+
+
+# Process pool workers get the signatures' algorithms and the pattern rules once, through the pool initializer
+def test_process_backend_uses_rules(tree, tmp_path, make_defender):
+    rules = tmp_path / 'rules.json'
+    rules.write_text(json.dumps({'rules': [{'name': 'marker', 'text': 'file 7'}]}))
+    defender, _ = make_defender(dry_run=True, rules_path=str(rules))
+    stats = ScanEngine(defender, jobs=2, executor='process').scan(str(tree))
+    assert (stats.files, stats.hashed, stats.detections) == (41, 41, 2)
+
+
+def test_worker_exception_is_reported_per_file(tree, make_defender, monkeypatch):
+    defender, _ = make_defender(dry_run=True)
+    inspect = defender.inspect_file
+
+    def flaky(path):
+        if path.endswith('f3.txt'):
+            raise RuntimeError('disk on fire')
+        return inspect(path)
+
+    monkeypatch.setattr(defender, 'inspect_file', flaky)
+    stats = ScanEngine(defender, jobs=3).scan(str(tree))
+    assert (stats.files, stats.hashed, stats.detections) == (41, 41, 1)
+    assert not scan_threads()
+
+
+# Every worker dying must not leave the producer blocked on the full work queue
+@pytest.mark.filterwarnings('ignore::pytest.PytestUnhandledThreadExceptionWarning')
+def test_dead_workers_do_not_hang_the_producer(tree, make_defender, monkeypatch):
+    defender, _ = make_defender(dry_run=True)
+
+    def die(*args):
+        raise SystemExit
+
+    monkeypatch.setattr(ScanEngine, '_scan', die)
+    outcome = run_with_timeout(lambda: ScanEngine(defender, jobs=2, queue_size=1).scan(str(tree)))
+    assert 'value' in outcome
+    assert not scan_threads()
+
+
+def test_consumer_exception_stops_every_thread(tree, make_defender, monkeypatch):
+    defender, _ = make_defender(dry_run=True)
+
+    def broken(*args):
+        raise ValueError('bad verdict')
+
+    monkeypatch.setattr(defender, 'record_result', broken)
+    outcome = run_with_timeout(lambda: ScanEngine(defender, jobs=2, queue_size=1).scan(str(tree)))
+    assert isinstance(outcome.get('error'), ValueError)
+    assert not scan_threads()
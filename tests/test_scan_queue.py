@@ -0,0 +1,112 @@
+# Tests for the prioritized, budgeted scan queue
+# Developed for monitoring and threat response for the Indian Armed Forces
+
+import os  # Stat results for the risk score
+import time  # Slow verdicts
+import zipfile  # Archives read again for their members
+import pytest  # Fixtures
+import walker  # Windows path handling switched on for the location tests
+from scan_queue import ScanQueue, risk_score  # Queue under test
+from conftest import MALWARE  # Planted malware content
+
+
+@pytest.fixture
+def tree(tmp_path):
+    root = tmp_path / 'tree'
+    root.mkdir()
+    for i in range(20):
+        (root / f'f{i}.txt').write_text(f'file {i}' * 100)
+    (root / 'payload.exe').write_bytes(MALWARE)
+    return root
+
+
+def total_bytes(root):
+    return sum(path.stat().st_size for path in root.iterdir())
+
+
+def slow_verdicts(defender, monkeypatch, seconds):
+    record = defender.record_result
+
+    def slow(*args):
+        time.sleep(seconds)
+        return record(*args)
+
+    monkeypatch.setattr(defender, 'record_result', slow)
+
+
+def run_until_complete(queue, time_budget):
+    cycles = []
+    while not cycles or cycles[-1].stopped != 'complete':
+        cycles.append(queue.run_cycle(time_budget))
+        assert len(cycles) < 100
+    return cycles
+
+
+def test_riskiest_file_first(tree, make_defender):
+    defender, _ = make_defender(dry_run=True)
+    stats = ScanQueue(defender, str(tree), extensions=['.exe']).run_cycle()
+    assert (stats.files, stats.hashed, stats.detections, stats.stopped) == (21, 21, 1, 'complete')
+    assert stats.first_detection is not None and stats.detection_latency is not None
+
+
+# Walking a large tree must leave time for hashing in every cycle, not just fill the queue
+# The budget leaves room for a loaded machine; the point is that hashing starts before the walk ends
+def test_walk_leaves_time_for_hashing(tmp_path, make_defender):
+    root = tmp_path / 'big'
+    root.mkdir()
+    for i in range(3000):
+        (root / f'f{i}.txt').write_text(str(i))
+    defender, _ = make_defender(dry_run=True)
+    stats = ScanQueue(defender, str(root)).run_cycle(0.2)
+    assert stats.hashed > 1
+    assert stats.overrun < 0.1
+
+
+# A verdict that would end past the deadline waits for the next cycle, without the file being read again
+def test_slow_verdict_waits_for_next_cycle(tree, make_defender, monkeypatch):
+    defender, _ = make_defender(dry_run=True)
+    slow_verdicts(defender, monkeypatch, 0.02)
+    cycles = run_until_complete(ScanQueue(defender, str(tree)), 0.05)
+    assert all(cycle.overrun < 0.015 for cycle in cycles)
+    assert sum(cycle.hashed for cycle in cycles) == 21
+    assert sum(cycle.detections for cycle in cycles) == 1
+    assert sum(cycle.bytes for cycle in cycles) == total_bytes(tree)
+
+
+# One verdict longer than the whole budget is still recorded, and the overrun is reported
+def test_overrun_is_reported(tree, make_defender, monkeypatch):
+    defender, _ = make_defender(dry_run=True)
+    slow_verdicts(defender, monkeypatch, 0.08)
+    stats = ScanQueue(defender, str(tree)).run_cycle(0.05)
+    assert stats.hashed == 1
+    assert stats.overrun >= 0.03
+    assert stats.as_dict()['overrun_seconds'] == round(stats.overrun, 6)
+
+
+# Reading an archive again for its members counts against the cycle's bytes, the byte budget and the throttle
+def test_archive_rereads_are_budgeted(tmp_path, make_defender, monkeypatch):
+    root = tmp_path / 'archives'
+    root.mkdir()
+    for i in range(3):
+        with zipfile.ZipFile(root / f'a{i}.zip', 'w') as z:
+            z.writestr('data.bin', os.urandom(64 * 1024))
+    size = (root / 'a0.zip').stat().st_size
+    defender, _ = make_defender(dry_run=True)
+    queue = ScanQueue(defender, str(root))
+    stats = queue.run_cycle()
+    assert (stats.hashed, stats.bytes) == (3, 2 * total_bytes(root))
+    queue = ScanQueue(make_defender(dry_run=True)[0], str(root), io_rate=1 << 30)
+    taken = []
+    monkeypatch.setattr(queue.throttle, 'take', taken.append)
+    cycles = [queue.run_cycle(byte_budget=2 * size) for _ in range(3)]
+    assert [(cycle.hashed, cycle.stopped) for cycle in cycles] == [(1, 'bytes'), (1, 'bytes'), (1, 'complete')]
+    assert sum(taken) == 2 * total_bytes(root)
+
+
+def test_risk_locations_match_windows_paths(monkeypatch):
+    st = os.stat(__file__)
+    now = st.st_mtime + 30 * 86400
+    assert risk_score('/tmp/x.bin', st, now) - risk_score('/srv/x.bin', st, now) == 20
+    monkeypatch.setattr(walker, 'WINDOWS_PATHS', True)
+    assert risk_score(r'C:\Users\a\AppData\Local\Temp\x.bin', st, now) - risk_score(r'C:\x.bin', st, now) == 20
+    assert risk_score(r'C:\Users\a\downloads\x.bin', st, now) - risk_score(r'C:\x.bin', st, now) == 15
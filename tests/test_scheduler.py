@@ -0,0 +1,49 @@
+# Tests for the periodic task scheduler: skipped ticks and jitter that does not drift
+# Developed for monitoring and threat response for the Indian Armed Forces
+
+import time  # Run times of the scheduled task
+import random  # Jitter pinned to its maximum
+import pytest  # Approximate comparisons
+from scheduler import PeriodicTask, Scheduler  # Scheduler under test
+
+
+def test_next_due_counts_skipped_ticks():
+    task = PeriodicTask('t', lambda: None, interval=1.0)
+    scheduler = Scheduler([task])
+    assert scheduler._next_due(task, 0.0, 0.5) == 1.0
+    assert task.missed_ticks == 0
+    assert scheduler._next_due(task, 0.0, 3.5) == 4.0
+    assert task.missed_ticks == 3
+    assert scheduler._next_due(task, 4.0, 5.0) == 6.0
+    assert task.missed_ticks == 4
+
+
+# Jitter delays a run but the next tick is computed from the unjittered one
+def test_jitter_does_not_drift(monkeypatch):
+    monkeypatch.setattr(random, 'uniform', lambda low, high: high)
+    task = PeriodicTask('t', lambda: None, interval=1.0, jitter=0.5)
+    scheduler = Scheduler([task])
+    due = 0.0
+    for _ in range(10):
+        due = scheduler._next_due(task, due, due)
+        assert scheduler._fire_time(task, due) == due + 0.5
+    assert due == 10.0
+    assert task.missed_ticks == 0
+
+
+def test_runs_stay_on_the_interval_grid(monkeypatch):
+    monkeypatch.setattr(random, 'uniform', lambda low, high: high)
+    starts = []
+    task = PeriodicTask('t', lambda: starts.append(time.monotonic()), interval=0.05, jitter=0.04)
+    stats = Scheduler([task]).run(cycles=10)['t']
+    assert stats['runs'] == 10
+    # Ten runs span nine intervals plus one jitter, not nine intervals and nine jitters (0.81 s)
+    assert starts[-1] - starts[0] == pytest.approx(9 * 0.05, abs=0.15)
+
+
+# A task still running when its next tick comes skips that tick instead of queueing it
+def test_overrunning_task_misses_ticks():
+    task = PeriodicTask('slow', lambda: time.sleep(0.25), interval=0.05)
+    stats = Scheduler([task]).run(cycles=2)['slow']
+    assert stats['runs'] == 2
+    assert stats['missed_ticks'] >= 3
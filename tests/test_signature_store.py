@@ -0,0 +1,92 @@
+# Tests for the memory-mapped signature store and its live reloading
+# Developed for monitoring and threat response for the Indian Armed Forces
+
+import os  # File replacement
+import hashlib  # Test digests
+import signature_store  # Run size and run writer patched for the spill test
+from signature_store import SignatureStore, SignatureDatabase, compile_signatures, MAGIC  # Store under test
+from conftest import MALWARE  # Planted malware content
+
+DIGESTS = [hashlib.sha256(str(i).encode()).digest() for i in range(1000)]
+
+
+def compile_to(tmp_path, digests, name='signatures.sig'):
+    feed = tmp_path / f'{name}.txt'
+    feed.write_text(''.join(d.hex() + '\n' for d in digests))
+    path = tmp_path / name
+    compile_signatures([str(feed)], str(path))
+    return str(path)
+
+
+def test_lookup(tmp_path):
+    store = SignatureStore.open(compile_to(tmp_path, DIGESTS))
+    assert len(store) == 1000
+    assert all(d in store for d in DIGESTS)
+    assert DIGESTS[0].hex() in store
+    assert hashlib.sha256(b'other').digest() not in store
+    assert sorted(DIGESTS) == list(store)
+    assert SignatureStore.from_digests(DIGESTS).fingerprint == store.fingerprint
+
+
+# One feed larger than RUN_SIZE is sorted in several spilled runs; removals and bad lines are still honoured
+def test_large_feed_spills_runs(tmp_path, monkeypatch):
+    monkeypatch.setattr(signature_store, 'RUN_SIZE', 100)
+    write_run = signature_store._write_run
+    runs = []
+
+    def counting_write_run(digests, directory):
+        runs.append(len(digests))
+        return write_run(digests, directory)
+
+    monkeypatch.setattr(signature_store, '_write_run', counting_write_run)
+    feed = tmp_path / 'feed.txt'
+    feed.write_text(''.join(d.hex() + '\n' for d in DIGESTS) + 'not-a-digest\n-' + DIGESTS[0].hex() + '\n')
+    count, errors = compile_signatures([str(feed)], str(tmp_path / 'signatures.sig'))
+    assert (count, len(errors)) == (999, 1)
+    assert runs == [100] * 10
+    store = SignatureStore.open(str(tmp_path / 'signatures.sig'))
+    assert DIGESTS[0] not in store and DIGESTS[1] in store
+
+
+def write_corrupt(path, data):
+    # Replace the file (new inode) the way a feed update would
+    temporary = path + '.tmp'
+    with open(temporary, 'wb') as f:
+        f.write(data)
+    os.replace(temporary, path)
+
+
+def test_corrupt_store_falls_back(tmp_path):
+    path = str(tmp_path / 'signatures.sig')
+    write_corrupt(path, b'garbage')
+    fallback = SignatureStore.from_digests(DIGESTS[:1])
+    database = SignatureDatabase(path, fallback=fallback)
+    assert database.current is fallback
+    assert DIGESTS[0] in database
+
+
+# A half-copied update keeps the store already in use, and a later good copy is picked up
+def test_corrupt_update_keeps_previous_store(tmp_path):
+    path = compile_to(tmp_path, DIGESTS)
+    database = SignatureDatabase(path)
+    with open(path, 'rb') as f:
+        data = f.read()
+    write_corrupt(path, data[:len(data) // 2])
+    assert database.reload() is False
+    assert DIGESTS[5] in database
+    write_corrupt(path, MAGIC + b'\0' * 10)
+    assert database.reload() is False
+    assert DIGESTS[5] in database
+    compile_to(tmp_path, DIGESTS[:10])
+    assert database.reload() is True
+    assert len(database) == 10
+
+
+def test_defender_survives_corrupt_store(tmp_path, make_defender):
+    path = str(tmp_path / 'broken.sig')
+    write_corrupt(path, b'RAJSIG1\0 half written')
+    target = tmp_path / 'scan'
+    target.mkdir()
+    (target / 'a.txt').write_bytes(MALWARE)
+    defender, _ = make_defender(signature_path=path, dry_run=True)
+    assert defender.scan_directory(str(target)).files == 1
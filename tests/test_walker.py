@@ -0,0 +1,77 @@
+# Tests for the streaming directory walker
+# Developed for monitoring and threat response for the Indian Armed Forces
+
+import os  # Symlinks and stat results
+import pytest  # Fixtures and skips
+import walker  # Path convention patched for the Windows glob test
+from walker import walk_files  # Walker under test
+
+pytestmark = pytest.mark.skipif(not hasattr(os, 'symlink'), reason='needs symlinks')
+
+
+@pytest.fixture
+def tree(tmp_path):
+    root = tmp_path / 'root'
+    (root / 'sub').mkdir(parents=True)
+    (root / 'a.txt').write_text('a')
+    (root / 'sub' / 'b.exe').write_text('b')
+    outside = tmp_path / 'outside'
+    (outside / 'deep').mkdir(parents=True)
+    (outside / 'payload.exe').write_text('evil')
+    (outside / 'deep' / 'c.txt').write_text('c')
+    return root, outside
+
+
+def names(root, **options):
+    return sorted(os.path.relpath(entry.path, root) for entry in walk_files(str(root), **options))
+
+
+def test_filters(tree):
+    root, _ = tree
+    assert names(root) == ['a.txt', os.path.join('sub', 'b.exe')]
+    assert names(root, extensions=['.EXE']) == [os.path.join('sub', 'b.exe')]
+    assert names(root, max_depth=0) == ['a.txt']
+    assert names(root, exclude=['sub']) == ['a.txt']
+
+
+# Globs with a '/' match paths relative to the walk root, not just entry names
+def test_path_globs(tree):
+    root, _ = tree
+    assert names(root, exclude=['sub/*.exe']) == ['a.txt']
+    assert names(root, include=['sub/*']) == [os.path.join('sub', 'b.exe')]
+    assert names(root, exclude=['other/*.exe']) == ['a.txt', os.path.join('sub', 'b.exe')]
+
+
+# On Windows patterns fold case and may use either separator, like the paths they are matched against
+def test_windows_path_globs(tree, monkeypatch):
+    root, _ = tree
+    monkeypatch.setattr(walker, 'WINDOWS_PATHS', True)
+    assert names(root, exclude=['SUB\\*.EXE']) == ['a.txt']
+    assert names(root, exclude=['Sub/B.exe']) == ['a.txt']
+    assert names(root, include=['A.TXT']) == ['a.txt']
+
+
+# A symlink to a file outside the tree is scanned by default, once however many links point at it
+def test_file_symlinks_are_followed_once(tree):
+    root, outside = tree
+    os.symlink(outside / 'payload.exe', root / 'link.exe')
+    os.symlink(outside / 'payload.exe', root / 'sub' / 'again.exe')
+    entries = [e for e in walk_files(str(root)) if os.path.islink(e.path)]
+    assert len(entries) == 1
+    assert entries[0].stat.st_ino == os.stat(outside / 'payload.exe').st_ino
+
+
+def test_directory_symlinks_need_follow_symlinks(tree):
+    root, outside = tree
+    os.symlink(outside / 'deep', root / 'deep')
+    os.symlink(root, root / 'sub' / 'loop')
+    assert os.path.join('deep', 'c.txt') not in names(root)
+    followed = names(root, follow_symlinks=True)
+    assert os.path.join('deep', 'c.txt') in followed
+    assert len(followed) == len(set(followed)) == 3
+
+
+def test_dangling_symlink_is_ignored(tree):
+    root, _ = tree
+    os.symlink(root / 'missing', root / 'dangling')
+    assert names(root) == ['a.txt', os.path.join('sub', 'b.exe')]
@@ -0,0 +1,140 @@
+# Tests for real-time scanning: debouncing, queue overflow and directories that go away
+# Developed for monitoring and threat response for the Indian Armed Forces
+
+import os  # Pipes standing in for the inotify descriptor
+import sys  # Platform check
+import time  # Waiting for inotify events
+import shutil  # Deleting and moving watched directories
+import threading  # Stop event of the watch loop
+import pytest  # Fixtures and skips
+import watcher  # Event flags and kinds
+from watcher import Debouncer, DirectoryWatch, InotifyWatcher, EVENT_HEADER  # Code under test
+from conftest import MALWARE  # Planted malware content
+
+linux_only = pytest.mark.skipif(not sys.platform.startswith('linux'), reason='needs inotify')
+
+
+@pytest.fixture
+def tree(tmp_path):
+    root = tmp_path / 'tree'
+    (root / 'sub' / 'deeper').mkdir(parents=True)
+    (root / 'other').mkdir()
+    return root
+
+
+# Changes collected from the watcher until `condition(changes)` holds or a second passes
+def collect(inotify, condition=bool):
+    changes = []
+    deadline = time.monotonic() + 1.0
+    while time.monotonic() < deadline and not condition(changes):
+        changes.extend(inotify.read_events())
+        time.sleep(0.01)
+    return changes
+
+
+def test_debouncer_coalesces_bursts():
+    debouncer = Debouncer(delay=2, max_delay=10)
+    for now in range(5):
+        debouncer.add(watcher.FILE, '/a', now=now)
+    debouncer.add(watcher.FILE, '/b', now=0)
+    assert len(debouncer) == 2
+    assert debouncer.due(now=5) == [(watcher.FILE, '/b')]
+    assert debouncer.timeout(now=5) == 1
+    assert debouncer.due(now=5.5) == []
+    assert debouncer.due(now=6) == [(watcher.FILE, '/a')]
+    assert debouncer.timeout() is None
+
+
+# A constantly rewritten file is released after max_delay; a directory change overrides a file change
+def test_debouncer_bounds_delay_and_keeps_directories():
+    debouncer = Debouncer(delay=2, max_delay=10)
+    for now in range(10):
+        debouncer.add(watcher.FILE, '/hot', now=now)
+        assert debouncer.due(now=now) == []
+    debouncer.add(watcher.FILE, '/hot', now=10)
+    assert debouncer.due(now=10) == [(watcher.FILE, '/hot')]
+    debouncer.add(watcher.FILE, '/d', now=0)
+    debouncer.add(watcher.DIRECTORY, '/d', now=1)
+    debouncer.add(watcher.FILE, '/d', now=2)
+    assert debouncer.due(now=4) == [(watcher.DIRECTORY, '/d')]
+
+
+@linux_only
+def test_queue_overflow_is_reported_for_the_root(tree):
+    inotify = InotifyWatcher(str(tree))
+    read, write = os.pipe()
+    os.close(inotify.fd)
+    inotify.fd = read
+    try:
+        os.write(write, EVENT_HEADER.pack(-1, watcher.IN_Q_OVERFLOW, 0, 0))
+        os.close(write)
+        assert inotify.read_events() == [(watcher.OVERFLOW, str(tree))]
+    finally:
+        inotify.close()
+
+
+# After an overflow the whole tree is rescanned, so a file whose event was lost is still found
+@linux_only
+def test_overflow_rescans_the_tree(tree, make_defender, monkeypatch):
+    defender, _ = make_defender(dry_run=True)
+    watch = DirectoryWatch(defender, str(tree), debounce=0.01)
+    read_events = watch.watcher.read_events
+    lost = []
+
+    def overflowing():
+        changes = read_events()
+        if changes and not lost:
+            lost.append(changes)
+            return [(watcher.OVERFLOW, watch.watcher.root)]
+        return changes
+
+    monkeypatch.setattr(watch.watcher, 'read_events', overflowing)
+    scanned = []
+    scan_directory = defender.scan_directory
+    monkeypatch.setattr(defender, 'scan_directory',
+                        lambda path, **options: scanned.append(path) or scan_directory(path, **options))
+    stop = threading.Event()
+    thread = threading.Thread(target=watch.run, args=(stop, False))
+    thread.start()
+    try:
+        time.sleep(0.2)
+        (tree / 'sub' / 'payload.bin').write_bytes(MALWARE)
+        deadline = time.monotonic() + 5.0
+        while not scanned and time.monotonic() < deadline:
+            time.sleep(0.05)
+    finally:
+        stop.set()
+        thread.join()
+    assert lost and scanned == [str(tree)]
+
+
+# A deleted directory takes its own watch and every watch below it out of the map
+@linux_only
+def test_deleted_directory_drops_subtree(tree):
+    inotify = InotifyWatcher(str(tree))
+    try:
+        inotify.add_tree(str(tree))
+        assert len(inotify) == 4
+        shutil.rmtree(tree / 'sub')
+        collect(inotify, lambda _: len(inotify) == 2)
+        assert sorted(inotify._paths.values()) == [str(tree), str(tree / 'other')]
+    finally:
+        inotify.close()
+
+
+# A directory moved out of the tree stops reporting changes; one moved within it is reported for a rescan
+@linux_only
+def test_moved_directory_drops_subtree(tree, tmp_path):
+    inotify = InotifyWatcher(str(tree))
+    try:
+        inotify.add_tree(str(tree))
+        shutil.move(str(tree / 'sub'), str(tmp_path / 'gone'))
+        collect(inotify, lambda _: len(inotify) == 2)
+        assert sorted(inotify._paths.values()) == [str(tree), str(tree / 'other')]
+        (tmp_path / 'gone' / 'deeper' / 'late.txt').write_text('outside')
+        assert collect(inotify) == []
+        os.rename(tree / 'other', tree / 'renamed')
+        changes = collect(inotify, lambda _: len(inotify) == 1)
+        assert (watcher.DIRECTORY, str(tree / 'renamed')) in changes
+    finally:
+        inotify.close()
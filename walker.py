@@ -0,0 +1,177 @@
+# Streaming directory walker for the Intelligent Defence System
+# Built on os.scandir so each file is stat'ed once and the stat result travels with its path
+# Developed for monitoring and threat response for the Indian Armed Forces
+
+import os  # scandir, stat and path helpers
+import time  # Times directory listings and stat calls for the metrics
+import re  # Used to combine glob patterns into a single compiled matcher
+import fnmatch  # Translates shell-style globs into regular expressions
+from collections import namedtuple  # Lightweight record type for yielded entries
+from metrics import WALK_SECONDS, WALK_DIRECTORIES, STAT_SECONDS, LATENCY_SAMPLE_EVERY  # Walk instrumentation
+
+# One file produced by walk_files: its full path and the stat result gathered while walking
+WalkEntry = namedtuple('WalkEntry', ['path', 'stat'])
+
+# Filesystem types that never hold scannable files and can be huge or hang when read
+PSEUDO_FILESYSTEMS = {
+    'proc', 'sysfs', 'devtmpfs', 'devpts', 'cgroup', 'cgroup2', 'securityfs', 'debugfs', 'tracefs',
+    'pstore', 'bpf', 'configfs', 'fusectl', 'mqueue', 'hugetlbfs', 'autofs', 'binfmt_misc', 'efivarfs',
+}
+
+
+# Read the mount points of pseudo filesystems from /proc/self/mounts
+# Returns an empty set on platforms without procfs
+def pseudo_mount_points():
+    mounts = set()
+    try:
+        with open('/proc/self/mounts', 'r') as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) >= 3 and fields[2] in PSEUDO_FILESYSTEMS:
+                    # Spaces and tabs in mount points are octal-escaped in the mounts table
+                    mounts.add(re.sub(r'\\([0-7]{3})', lambda m: chr(int(m.group(1), 8)), fields[1]))
+    except OSError:
+        pass
+    return mounts
+
+
+# Windows paths compare case-insensitively and accept '\\' as well as '/' between components
+WINDOWS_PATHS = os.name == 'nt'
+
+
+# Normalise a glob pattern, entry name or relative path for matching: '/'-separated, and lower case on Windows
+# os.path.normcase is not used because it turns '/' into '\\' on Windows, while relative paths use '/'
+def normalize_glob_path(text):
+    if WINDOWS_PATHS:
+        return text.lower().replace('\\', '/')
+    return text
+
+
+# Compile a list of glob patterns into one regular expression, or None when the list is empty
+# Patterns are matched against both the entry name and its '/'-separated path relative to the walk root
+def compile_globs(patterns):
+    if not patterns:
+        return None
+    return re.compile('|'.join(fnmatch.translate(normalize_glob_path(p)) for p in patterns))
+
+
+# Walk `top` and yield a WalkEntry for every regular file that passes the filters
+#   include / exclude: glob patterns; excluded directories are pruned without being opened
+#   max_depth: 0 yields only files directly inside `top`, None means unlimited
+#   one_filesystem: do not cross into other mounted filesystems
+#   min_size / max_size: size bounds in bytes, checked from the cached stat result
+#   extensions: iterable of suffixes such as '.exe'; matched case-insensitively
+#   follow_symlinks: also follow directory symlinks, with (dev, inode) tracking to break loops
+#                    Symlinks to regular files are always followed, so a link to a payload is still scanned;
+#                    each link target is yielded once, however many links point at it
+#   skip_pseudo: skip procfs, sysfs and other pseudo filesystems
+#   on_error: optional callable receiving OSError instances raised while walking
+# Memory use is proportional to the depth of the tree, not the width of any directory
+def walk_files(top, include=None, exclude=None, max_depth=None, one_filesystem=False, min_size=None,
+               max_size=None, extensions=None, follow_symlinks=False, skip_pseudo=True, on_error=None):
+    include_re = compile_globs(include)
+    exclude_re = compile_globs(exclude)
+    extensions = {e.lower() for e in extensions} if extensions else None
+    pseudo = pseudo_mount_points() if skip_pseudo else set()
+    top = os.fspath(top)
+    try:
+        top_stat = os.stat(top)
+    except OSError as e:
+        if on_error is not None:
+            on_error(e)
+        return
+    # Directories already entered, only needed when symlinks can create cycles
+    visited = {(top_stat.st_dev, top_stat.st_ino)} if follow_symlinks else None
+    # (dev, inode) of the files already yielded through a symlink
+    linked = set()
+    prefix_len = len(top.rstrip(os.sep)) + 1
+
+    # Test a name / relative path pair against a compiled glob matcher
+    def matches(regex, name, rel):
+        return regex.match(normalize_glob_path(name)) is not None or \
+            regex.match(normalize_glob_path(rel.replace(os.sep, '/'))) is not None
+
+    clock = time.perf_counter
+    try:
+        stack = [(os.scandir(top), 0)]
+    except OSError as e:
+        if on_error is not None:
+            on_error(e)
+        return
+    # Seconds spent reading directory entries, added to the walk metric once per directory
+    listing = 0.0
+    # stat calls made so far; one in LATENCY_SAMPLE_EVERY is timed
+    stats = 0
+    try:
+        while stack:
+            iterator, depth = stack[-1]
+            start = clock()
+            try:
+                entry = next(iterator, None)
+            except OSError as e:
+                if on_error is not None:
+                    on_error(e)
+                entry = None
+            listing += clock() - start
+            # Finished with this directory: close it and resume the parent
+            if entry is None:
+                iterator.close()
+                stack.pop()
+                WALK_DIRECTORIES.inc()
+                WALK_SECONDS.inc(listing)
+                listing = 0.0
+                continue
+            rel = entry.path[prefix_len:]
+            try:
+                if entry.is_dir(follow_symlinks=follow_symlinks):
+                    if exclude_re is not None and matches(exclude_re, entry.name, rel):
+                        continue
+                    if max_depth is not None and depth >= max_depth:
+                        continue
+                    # Mount points are absolute, so a relative walk root still finds them
+                    if pseudo and os.path.abspath(entry.path) in pseudo:
+                        continue
+                    if one_filesystem or visited is not None:
+                        st = entry.stat(follow_symlinks=follow_symlinks)
+                        if one_filesystem and st.st_dev != top_stat.st_dev:
+                            continue
+                        if visited is not None:
+                            key = (st.st_dev, st.st_ino)
+                            if key in visited:
+                                continue
+                            visited.add(key)
+                    stack.append((os.scandir(entry.path), depth + 1))
+                elif entry.is_file(follow_symlinks=True):
+                    # Cheap name-based filters run before the stat call
+                    if extensions is not None and os.path.splitext(entry.name)[1].lower() not in extensions:
+                        continue
+                    if include_re is not None and not matches(include_re, entry.name, rel):
+                        continue
+                    if exclude_re is not None and matches(exclude_re, entry.name, rel):
+                        continue
+                    stats += 1
+                    if stats % LATENCY_SAMPLE_EVERY:
+                        st = entry.stat()
+                    else:
+                        start = clock()
+                        st = entry.stat()
+                        STAT_SECONDS.observe(clock() - start)
+                    if min_size is not None and st.st_size < min_size:
+                        continue
+                    if max_size is not None and st.st_size > max_size:
+                        continue
+                    if one_filesystem and st.st_dev != top_stat.st_dev:
+                        continue
+                    if entry.is_symlink():
+                        key = (st.st_dev, st.st_ino)
+                        if key in linked:
+                            continue
+                        linked.add(key)
+                    yield WalkEntry(entry.path, st)
+            except OSError as e:
+                if on_error is not None:
+                    on_error(e)
+    finally:
+        # Close any directories left open if the consumer stopped early
+        for iterator, _ in stack:
+            iterator.close()
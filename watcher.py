@@ -0,0 +1,276 @@
+# Event-driven real-time scanning for the Intelligent Defence System
+# Uses Linux inotify (through ctypes) so only files that were created, moved in or closed after writing
+# are scanned, instead of re-walking the whole tree on every defence cycle
+# Developed for monitoring and threat response for the Indian Armed Forces
+
+import os  # Paths, directory listing and descriptor reads
+import sys  # Platform check
+import time  # Debounce deadlines and fallback rescan timing
+import errno  # Distinguishes watch-limit exhaustion from other failures
+import struct  # Decodes inotify event headers
+import select  # Waits for events without busy polling
+import ctypes  # Calls the inotify system calls in libc
+import ctypes.util  # Locates libc
+from events import logger  # Reports watch-limit exhaustion and queue overflows
+import threading  # Stop event for the watch loop
+from walker import compile_globs, normalize_glob_path  # Same exclusion globs as the directory walker
+
+# inotify event flags (from <sys/inotify.h>)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+IN_EXCL_UNLINK = 0x04000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+# Events watched on every directory of the tree
+WATCH_MASK = (IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF | IN_MOVE_SELF |
+              IN_ONLYDIR | IN_DONT_FOLLOW | IN_EXCL_UNLINK)
+
+# Header of each inotify event: watch descriptor, mask, cookie, name length
+EVENT_HEADER = struct.Struct('iIII')
+
+# Kinds of change reported by the watcher
+FILE, DIRECTORY, OVERFLOW = 'file', 'dir', 'overflow'
+
+
+# Thin wrapper over an inotify instance watching every directory below a root
+class InotifyWatcher:
+    # Create the inotify instance; raises OSError when inotify is unavailable
+    def __init__(self, root, exclude=None):
+        if not sys.platform.startswith('linux'):
+            raise OSError(errno.ENOSYS, 'inotify is only available on Linux')
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c') or None, use_errno=True)
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, f'inotify_init1: {os.strerror(err)}')
+        self.root = os.path.abspath(root)
+        self._exclude = compile_globs(exclude)
+        # Watch descriptor -> directory path
+        self._paths = {}
+        # Directories that could not be watched because the per-user watch limit was reached
+        self.unwatched = set()
+
+    # Descriptor to wait on with select
+    def fileno(self):
+        return self.fd
+
+    # Close the inotify instance, dropping every watch
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+    # True if a directory matches the exclusion globs
+    def _excluded(self, path):
+        if self._exclude is None:
+            return False
+        rel = os.path.relpath(path, self.root).replace(os.sep, '/')
+        name = os.path.basename(path)
+        return self._exclude.match(normalize_glob_path(name)) is not None or \
+            self._exclude.match(normalize_glob_path(rel)) is not None
+
+    # Add a watch on one directory; returns False when the watch limit is exhausted
+    def _add_watch(self, path):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd >= 0:
+            # Re-adding a moved directory returns its existing descriptor, so this also updates its path
+            self._paths[wd] = path
+            self.unwatched.discard(path)
+            return True
+        err = ctypes.get_errno()
+        if err == errno.ENOSPC:
+            if path not in self.unwatched:
+                logger.warning(f"inotify watch limit reached; {path} will be rescanned periodically")
+            self.unwatched.add(path)
+            return False
+        # Directories that vanished or cannot be read are simply skipped
+        if err in (errno.ENOENT, errno.ENOTDIR, errno.EACCES):
+            return True
+        raise OSError(err, f'inotify_add_watch {path}: {os.strerror(err)}')
+
+    # Forget a directory that was deleted or moved away, with every watch below it
+    # A moved directory that is still inside the tree is reported by IN_MOVED_TO on its new parent and watched
+    # again under its new path when that change is scanned
+    def _drop_tree(self, wd, mask):
+        path = self._paths.pop(wd, None)
+        if path is None:
+            return
+        if mask & IN_MOVE_SELF:
+            # Deleted directories lose their watch in the kernel; a moved one keeps reporting until removed
+            self._libc.inotify_rm_watch(self.fd, wd)
+        below = path.rstrip(os.sep) + os.sep
+        for other, other_path in list(self._paths.items()):
+            if other_path.startswith(below):
+                del self._paths[other]
+                self._libc.inotify_rm_watch(self.fd, other)
+        self.unwatched = {u for u in self.unwatched if u != path and not u.startswith(below)}
+        if path == self.root:
+            logger.warning(f"Watched directory {path} was deleted or moved; no longer watching it")
+
+    # Number of directories currently watched
+    def __len__(self):
+        return len(self._paths)
+
+    # Watch `top` and every directory below it
+    # Subtrees below a directory that hit the watch limit are left to the fallback rescan
+    def add_tree(self, top):
+        stack = [os.path.abspath(top)]
+        while stack:
+            path = stack.pop()
+            if self._excluded(path) and path != self.root:
+                continue
+            if not self._add_watch(path):
+                continue
+            try:
+                with os.scandir(path) as it:
+                    for entry in it:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+            except OSError:
+                continue
+
+    # Drain pending events and return a list of (kind, path) changes
+    def read_events(self):
+        changes = []
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return changes
+            if not data:
+                return changes
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size
+                name = data[offset:offset + length].rstrip(b'\0')
+                offset += length
+                if mask & IN_Q_OVERFLOW:
+                    changes.append((OVERFLOW, self.root))
+                    continue
+                if mask & IN_IGNORED:
+                    self._paths.pop(wd, None)
+                    continue
+                if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                    self._drop_tree(wd, mask)
+                    continue
+                directory = self._paths.get(wd)
+                if directory is None or not name:
+                    continue
+                path = os.path.join(directory, os.fsdecode(name))
+                if mask & IN_ISDIR:
+                    if mask & (IN_CREATE | IN_MOVED_TO) and not self._excluded(path):
+                        changes.append((DIRECTORY, path))
+                elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE):
+                    changes.append((FILE, path))
+
+
+# Coalesces bursts of events per path and releases them once they have been quiet for `delay` seconds
+# A path is never held back longer than `max_delay`, so a constantly rewritten file is still scanned
+class Debouncer:
+    def __init__(self, delay=0.2, max_delay=2.0):
+        self.delay = delay
+        self.max_delay = max_delay
+        # path -> [kind, first seen, due]
+        self._pending = {}
+
+    # Record a change; directory changes take precedence over file changes on the same path
+    def add(self, kind, path, now=None):
+        now = time.monotonic() if now is None else now
+        entry = self._pending.get(path)
+        if entry is None:
+            self._pending[path] = [kind, now, now + self.delay]
+            return
+        if kind != FILE:
+            entry[0] = kind
+        entry[2] = min(now + self.delay, entry[1] + self.max_delay)
+
+    # Seconds until the next change is due, or None if nothing is pending
+    def timeout(self, now=None):
+        if not self._pending:
+            return None
+        now = time.monotonic() if now is None else now
+        return max(0.0, min(entry[2] for entry in self._pending.values()) - now)
+
+    # Remove and return the (kind, path) changes that are due
+    def due(self, now=None):
+        now = time.monotonic() if now is None else now
+        ready = [(entry[0], path) for path, entry in self._pending.items() if entry[2] <= now]
+        for _, path in ready:
+            del self._pending[path]
+        return ready
+
+    # Number of changes waiting
+    def __len__(self):
+        return len(self._pending)
+
+
+# Real-time watch of one directory tree, scanning changes with a SystemDefender
+#   debounce / max_delay: quiet period and upper bound before a changed file is scanned
+#   fallback_interval: how often directories that could not be watched are rescanned
+#   exclude: glob patterns of directories to leave out, as for the walker
+# Creating the watch raises OSError when inotify is not available, so callers can fall back to periodic scans
+class DirectoryWatch:
+    def __init__(self, defender, directory, debounce=0.2, max_delay=2.0, fallback_interval=30.0, exclude=None):
+        self.defender = defender
+        self.directory = directory
+        self.fallback_interval = fallback_interval
+        self.exclude = exclude
+        self.watcher = InotifyWatcher(directory, exclude=exclude)
+        self.debouncer = Debouncer(debounce, max_delay)
+
+    # Scan a whole subtree, adding watches first so nothing written during the scan is missed
+    def _scan_tree(self, path):
+        self.watcher.add_tree(path)
+        self.defender.scan_directory(path, exclude=self.exclude)
+
+    # Run until `stop_event` is set; `baseline` runs one full scan once the watches are in place
+    def run(self, stop_event=None, baseline=True):
+        stop_event = stop_event or threading.Event()
+        watcher, debouncer = self.watcher, self.debouncer
+        try:
+            watcher.add_tree(self.directory)
+            if baseline:
+                self.defender.scan_directory(self.directory, exclude=self.exclude)
+            next_fallback = time.monotonic() + self.fallback_interval
+            while not stop_event.is_set():
+                # Sleep until an event arrives, a change is due, or it is time to check the stop flag
+                timeout = debouncer.timeout()
+                timeout = 0.5 if timeout is None else min(timeout, 0.5)
+                readable, _, _ = select.select([watcher], [], [], timeout)
+                if readable:
+                    for kind, path in watcher.read_events():
+                        debouncer.add(kind, path)
+                for kind, path in debouncer.due():
+                    if kind == OVERFLOW:
+                        # Events were lost: rescan the tree; unchanged files only cost a stat thanks to the cache
+                        logger.warning(f"inotify queue overflow; rescanning {path}")
+                        self._scan_tree(path)
+                    elif kind == DIRECTORY:
+                        # New or moved-in directory: scan what is already inside it
+                        self._scan_tree(path)
+                    else:
+                        self.defender.scan_file(path)
+                # Targeted rescan of the directories left unwatched by the watch limit
+                if time.monotonic() >= next_fallback:
+                    for path in list(watcher.unwatched):
+                        self._scan_tree(path)
+                    next_fallback = time.monotonic() + self.fallback_interval
+        finally:
+            watcher.close()
+
+
+# Watch `directory` with `defender` until `stop_event` is set (see DirectoryWatch for the options)
+def watch_directory(defender, directory, stop_event=None, baseline=True, **options):
+    DirectoryWatch(defender, directory, **options).run(stop_event, baseline)